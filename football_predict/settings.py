@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/3.1/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,6 +44,13 @@ INSTALLED_APPS = [
  #   'rest_framework',
 ]
 
+# The channels app makes runserver serve HTTP and the WebSockets of the live push (ASGI), daphne serves asgi.py without it
+# It loads daphne and twisted (and numpy) at startup, which exceeds the startup budget of the WSGI workers and the other commands (bench_startup),
+# therefore it is only installed with the environment variable LIVE_PUSH_RUNSERVER=1 - without it runserver serves the pages with the refresh button
+LIVE_PUSH_RUNSERVER = os.environ.get('LIVE_PUSH_RUNSERVER') == '1'
+if LIVE_PUSH_RUNSERVER:
+    INSTALLED_APPS.append('channels')
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -51,6 +59,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'game.middleware.InstrumentationMiddleware',
 ]
 
 ROOT_URLCONF = 'football_predict.urls'
@@ -72,6 +81,24 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'football_predict.wsgi.application'
+ASGI_APPLICATION = 'football_predict.asgi.application' # runserver (with LIVE_PUSH_RUNSERVER) and daphne serve HTTP and the WebSockets of the live push
+
+# Cache of the rendered fragments (game/fragments.py), the keys contain the data version, so every process can have its own cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+}
+
+# Channel layer of the live push (game/live.py), the in-memory layer only reaches the pages served by the same process,
+# i.e. updates started with today/refresh - updates of manage.py run_updates in its own process arrive with the
+# data version poll of the hub (LIVE_POLL_INTERVAL), use channels_redis to push them immediately
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
 
 
 # Database
@@ -79,8 +106,14 @@ WSGI_APPLICATION = 'football_predict.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'game.sqlite_backend', # the SQLite backend of Django with transaction_mode
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': 20, # seconds a connection waits for a lock (busy timeout), WAL mode is set in game/db.py
+            'transaction_mode': 'IMMEDIATE', # transactions take the write lock when they begin
+        },
+        'CONN_MAX_AGE': 60, # connections are reused by the requests of a thread
+        'TEST': {'NAME': os.path.join(tempfile.gettempdir(), 'football_predict_test.sqlite3')}, # a file, the in-memory database of the tests has no WAL and locks tables between threads
     }
 }
 
@@ -134,9 +167,25 @@ MESSAGE_TAGS = {
     messages.ERROR: 'danger',
 }
 
+# Log messages of the game app (API updates, scoring) are written to the console
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'game': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
 # Crispy template pack for bootstrap 4
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
+# Settings of the game app (API_*, SYNC_*, UPDATE_*, FIXTURE_BATCH_SIZE, SERIALIZED_WRITES, FRAGMENT_CACHE_TTL, STARTUP_*, ...):
+# the defaults are defined once in the modules which use them (game/api_client.py, game/api_data.py, game/db.py, game/fragments.py,
+# game/middleware.py and the management commands), only values which differ from these defaults are set here or in local_settings.py
+
 try:
     from .local_settings import *
 except ImportError:
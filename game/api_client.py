@@ -0,0 +1,423 @@
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import urlencode
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .secret import api_headers
+from .models import ApiResponse, ApiQuota
+from .db import serialized_write
+
+# Default values, can be overwritten in settings.py (or local_settings.py)
+API_FOOTBALL_URL = 'https://api-football-v1.p.rapidapi.com/v2/'
+API_MAX_CONCURRENCY = 8 # maximum number of API calls running at the same time
+API_TIMEOUT = 30 # seconds
+API_CACHE_MAX_ENTRIES = 5000 # least recently used responses are removed above this size
+API_CACHE_TTL = { # seconds a cached response is used without asking the API again, per endpoint class
+    'live': 15, # fixtures/live and fixtures/id (fixtures which have just left the live endpoint)
+    'today': 60, # fixtures of the current day
+    'fixtures': 3600, # fixtures of other days and of whole leagues
+    'odds': 3600,
+    'reference': 86400, # countries, leagues and teams
+}
+API_RATE_PER_MINUTE = 30 # calls per minute until the API has sent X-RateLimit-Limit, None: no limit
+API_PRIORITY = {'live': 0, 'today': 1, 'odds': 2, 'fixtures': 3, 'reference': 3} # per endpoint class, calls with a lower number are made first
+API_QUOTA_RESERVE = { # share of the per minute bucket and of the daily quota the calls of an endpoint class leave for the classes with a higher priority
+    'live': 0,
+    'today': 0.1,
+    'odds': 0.2,
+    'fixtures': 0.3,
+    'reference': 0.3,
+}
+API_MAX_RETRIES = 3 # calls are repeated after 429, 5xx or a connection error
+API_BACKOFF_BASE = 1 # seconds, the wait before the n-th retry is random between 0 and API_BACKOFF_BASE * 2 ** n (at most API_BACKOFF_MAX)
+API_BACKOFF_MAX = 30
+
+# requests sessions keep the connection to the API open, but they should not be shared between threads
+_local = threading.local()
+
+# Hit and miss counters of the response cache (per process)
+_stats_lock = threading.Lock()
+_cache_stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stale': 0}
+
+# Functions called with (path, status_code, seconds) after every call to the API, in the thread which called api_get_many (e.g. game/middleware.py)
+call_hooks = list()
+
+
+def get_session():
+    if not hasattr(_local, 'session'):
+        import requests # loaded with the first call to the API, the web workers import this module for call_hooks (game/middleware.py)
+        _local.session = requests.Session()
+    return _local.session
+
+
+def api_url(path):
+    # Returns the full url for a path of the API, e.g. 'fixtures/date/2021-02-06'
+    return getattr(settings, 'API_FOOTBALL_URL', API_FOOTBALL_URL) + path
+
+
+def cache_key(path, params=None):
+    # The key of the cache is the url and the sorted query string
+    if params:
+        return path + '?' + urlencode(sorted(params.items()))
+    return path
+
+
+def endpoint_class(path):
+    # Groups the paths of the API into classes with the same caching behaviour
+    if path.startswith('fixtures/live') or path.startswith('fixtures/id/'):
+        return 'live'
+    if path.startswith('fixtures/date/'):
+        if path[len('fixtures/date/'):][:10] == date.today().strftime('%Y-%m-%d'):
+            return 'today'
+        return 'fixtures'
+    if path.startswith('fixtures/league/') and path.count('/') == 3:
+        # fixtures of a league on a day (fixtures/league/<id>/<date>, see api_data.sync_plan)
+        if path.rsplit('/', 1)[1][:10] == date.today().strftime('%Y-%m-%d'):
+            return 'today'
+        return 'fixtures'
+    if path.startswith('fixtures/'):
+        return 'fixtures'
+    if path.startswith('odds/'):
+        return 'odds'
+    return 'reference'
+
+
+def cache_ttl(path):
+    ttl = dict(API_CACHE_TTL)
+    ttl.update(getattr(settings, 'API_CACHE_TTL', {}))
+    return ttl[endpoint_class(path)]
+
+
+def priority(path):
+    priorities = dict(API_PRIORITY)
+    priorities.update(getattr(settings, 'API_PRIORITY', {}))
+    return priorities[endpoint_class(path)]
+
+
+def quota_reserve(path):
+    reserve = dict(API_QUOTA_RESERVE)
+    reserve.update(getattr(settings, 'API_QUOTA_RESERVE', {}))
+    return reserve[endpoint_class(path)]
+
+
+def cache_stats():
+    # Returns a copy of the hit and miss counters
+    with _stats_lock:
+        return dict(_cache_stats)
+
+
+def count(counter, n=1):
+    with _stats_lock:
+        _cache_stats[counter] += n
+
+
+def api_request(path, params=None, cached=None):
+    # Single call to the API - if an expired cache entry is available, the call is conditional (ETag / Last-Modified)
+    headers = dict(api_headers)
+    if cached is not None:
+        if cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+
+    return get_session().get(api_url(path), headers=headers, params=params, timeout=getattr(settings, 'API_TIMEOUT', API_TIMEOUT))
+
+
+def timed_request(path, params=None, cached=None):
+    # api_request, returns the response and the duration of the call in seconds
+    # A connection error or timeout (requests.RequestException is an OSError) is returned instead of the response, so the call can be repeated
+    start = time.perf_counter()
+    try:
+        response = api_request(path, params, cached)
+    except OSError as e:
+        response = e
+    return response, time.perf_counter() - start
+
+
+def retryable(response):
+    # Too many requests, errors of the server and connection errors are worth another try, other responses are final
+    if isinstance(response, Exception):
+        return True
+    return response.status_code == 429 or response.status_code >= 500
+
+
+def backoff(attempt, responses):
+    # Exponential backoff with full jitter (the calls of several processes do not come back at the same time),
+    # but at least the Retry-After of the responses - never longer than API_BACKOFF_MAX
+    backoff_max = getattr(settings, 'API_BACKOFF_MAX', API_BACKOFF_MAX)
+    wait = random.uniform(0, min(backoff_max, getattr(settings, 'API_BACKOFF_BASE', API_BACKOFF_BASE) * 2 ** attempt))
+    for response in responses:
+        retry_after = '' if isinstance(response, Exception) else response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            wait = max(wait, int(retry_after))
+    return min(wait, backoff_max)
+
+
+def api_get(path, params=None):
+    # Single call to the API, returns the parsed json
+    return api_get_many([path], params, max_workers=1)[0]
+
+
+def api_get_many(paths, params=None, max_workers=None):
+    # Calls the API for all paths concurrently, at most max_workers (default API_MAX_CONCURRENCY from the settings) calls run at the same time
+    # The results are returned in the same order as the paths, so the callers can build their DataFrames as before
+    # Responses are taken from the cache (ApiResponse) as long as they are not expired. The database is only used in the calling thread (the writes by update_cache).
+    # params are the same for all paths, or a list with the params of every path (e.g. for the pages of a result)
+    paths = list(paths)
+    params_list = params if isinstance(params, list) else [params] * len(paths)
+    keys = [cache_key(path, path_params) for path, path_params in zip(paths, params_list)]
+    now = timezone.now()
+
+    cached = {entry.url: entry for entry in ApiResponse.objects.filter(url__in=set(keys))}
+    results = [None] * len(paths)
+    hits = set()
+    to_fetch = list()
+    for i, key in enumerate(keys):
+        entry = cached.get(key)
+        if entry is not None and entry.expires_at > now:
+            results[i] = json.loads(entry.body)
+            hits.add(key)
+        else:
+            to_fetch.append(i)
+
+    if hits:
+        count('hits', len(paths) - len(to_fetch))
+
+    if not to_fetch:
+        if hits:
+            update_cache(hits, [], [])
+        return results
+
+    if max_workers is None:
+        max_workers = getattr(settings, 'API_MAX_CONCURRENCY', API_MAX_CONCURRENCY)
+
+    # The calls take their tokens of the quota in batches (see take_tokens), the calls of the highest priority first
+    # A granted call is started at once, while it runs the next tokens are taken (after waiting for the bucket if none is left)
+    # A call refused because the rest of the daily quota is reserved for higher priorities gets the expired response from the cache, if there is one
+    # Calls which failed with 429, 5xx or a connection error are repeated after a backoff, the last response (or error) is used
+    fetch = lambda i: timed_request(paths[i], params_list[i], cached.get(keys[i]))
+    pending = sorted(to_fetch, key=lambda i: priority(paths[i]))
+    workers = max(1, min(max_workers, len(pending)))
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    received = dict()
+    stale = list()
+    attempt = 0
+    try:
+        while pending:
+            started = dict()
+            waiting = pending
+            waited = False
+            while waiting:
+                granted, refused, wait = take_tokens([paths[i] for i in waiting], waited)
+                for n in granted:
+                    i = waiting[n]
+                    started[i] = fetch(i) if executor is None else executor.submit(fetch, i)
+                for n in refused:
+                    i = waiting[n]
+                    if keys[i] not in cached:
+                        raise QuotaExceeded('%s: the calls left today are reserved for calls of a higher priority' % paths[i])
+                    stale.append(i)
+                waiting = [i for n, i in enumerate(waiting) if n not in granted and n not in refused]
+                if waiting:
+                    waited = True
+                    time.sleep(wait)
+
+            ready = [i for i in pending if i in started]
+            timed = [started[i] if executor is None else started[i].result() for i in ready]
+            for i, (response, seconds) in zip(ready, timed):
+                for hook in call_hooks:
+                    hook(paths[i], getattr(response, 'status_code', None), seconds)
+
+            retry = [(i, response) for i, (response, seconds) in zip(ready, timed) if retryable(response) and attempt < getattr(settings, 'API_MAX_RETRIES', API_MAX_RETRIES)]
+            record_limits([rate_limits(response) for response, seconds in timed if not isinstance(response, Exception)], len(retry))
+            received.update((i, response) for i, (response, seconds) in zip(ready, timed))
+            if retry:
+                time.sleep(backoff(attempt, [response for i, response in retry]))
+                attempt += 1
+            pending = [i for i, response in retry]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    for i in stale:
+        results[i] = json.loads(cached[keys[i]].body)
+        count('stale')
+    to_fetch = [i for i in to_fetch if i in received and i not in stale]
+    for i in to_fetch:
+        if isinstance(received[i], Exception):
+            raise received[i]
+    responses = [received[i] for i in to_fetch]
+
+    # Store the responses in the cache
+    now = timezone.now()
+    revalidated = list()
+    fetched = list()
+    for i, response in zip(to_fetch, responses):
+        key = keys[i]
+        expires_at = now + timedelta(seconds=cache_ttl(paths[i]))
+        entry = cached.get(key)
+        if response.status_code == 304 and entry is not None:
+            # Not modified - the cached response is valid for another ttl
+            revalidated.append((entry.id, expires_at))
+            results[i] = json.loads(entry.body)
+            count('revalidated')
+        else:
+            results[i] = response.json()
+            count('misses')
+            if response.status_code == 200:
+                fetched.append((key, {'body': response.text, 'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified'),
+                    'fetched_at': now, 'expires_at': expires_at, 'last_used': now, 'hits': 0}))
+
+    update_cache(hits, revalidated, fetched)
+
+    return results
+
+
+def api_get_stream(paths, params=None, chunk_size=None):
+    # Generator version of api_get_many: the paths are requested in chunks of chunk_size (default API_MAX_CONCURRENCY) concurrent calls
+    # The results are yielded in the order of the paths as soon as their chunk is complete, so only one chunk of responses is held in memory
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'API_MAX_CONCURRENCY', API_MAX_CONCURRENCY)
+    paths = list(paths)
+    for i in range(0, len(paths), chunk_size):
+        chunk_params = params[i:i + chunk_size] if isinstance(params, list) else params
+        yield from api_get_many(paths[i:i + chunk_size], chunk_params, max_workers=chunk_size)
+
+
+class QuotaExceeded(Exception):
+    # The rest of the daily quota is reserved for calls of a higher priority, or the quota is used up
+    pass
+
+
+def int_header(headers, name):
+    value = headers.get(name)
+    return int(value) if value is not None and value.strip().isdigit() else None
+
+
+def rate_limits(response):
+    # The rate limit headers of a response: calls per day of the plan (RapidAPI) and per minute (API-Football), None if the header is missing
+    return {'day_limit': int_header(response.headers, 'X-RateLimit-requests-Limit'), 'day_remaining': int_header(response.headers, 'X-RateLimit-requests-Remaining'),
+        'day_reset': int_header(response.headers, 'X-RateLimit-requests-Reset'), 'minute_limit': int_header(response.headers, 'X-RateLimit-Limit'),
+        'minute_remaining': int_header(response.headers, 'X-RateLimit-Remaining')}
+
+
+def start_day(quota, now):
+    # Counters per day (UTC), the daily quota is full again after its reset
+    if quota.day != now.date():
+        quota.day = now.date()
+        quota.calls = quota.waits = quota.refused = quota.retries = 0
+    if quota.day_reset_at is not None and now >= quota.day_reset_at:
+        quota.day_remaining = quota.day_limit
+        quota.day_reset_at = None
+
+
+@serialized_write
+def take_tokens(paths, waited=False):
+    # Takes the tokens for the calls of paths (in the order of their priority) from the quota shared by all processes (ApiQuota), one transaction for all of them
+    # The tokens are granted in the order of paths until the bucket is empty, the rest of the calls waits (nothing is taken for them, the caller asks again)
+    # The calls of an endpoint class leave API_QUOTA_RESERVE of the bucket and of the daily quota to the classes with a higher priority,
+    # so a leagues update or the odds can not use up the calls needed for the live scores
+    # Returns the positions in paths of the granted calls and of the calls refused because the daily quota left is reserved for higher priorities,
+    # and the seconds until the next token for the waiting calls are available (waited: the waiting calls have already been counted in waits)
+    now = timezone.now()
+    clock = time.time()
+    granted = list()
+    refused = list()
+    wait = 0
+    with transaction.atomic():
+        quota = ApiQuota.objects.get_or_create(id=1)[0]
+        start_day(quota, now)
+        capacity = quota.minute_limit or getattr(settings, 'API_RATE_PER_MINUTE', API_RATE_PER_MINUTE)
+        if capacity:
+            rate = capacity / 60
+            tokens = min(capacity, quota.tokens + max(0, clock - quota.tokens_at) * rate)
+        for n, path in enumerate(paths):
+            reserve = quota_reserve(path)
+            if quota.day_remaining is not None and quota.day_remaining - 1 < reserve * (quota.day_limit or 0):
+                quota.refused += 1
+                refused.append(n)
+                continue
+            if capacity:
+                if tokens - 1 < reserve * capacity:
+                    wait = (reserve * capacity + 1 - tokens) / rate
+                    break
+                tokens -= 1
+            granted.append(n)
+            quota.calls += 1
+            if quota.day_remaining is not None:
+                quota.day_remaining -= 1
+        if capacity:
+            quota.tokens, quota.tokens_at = tokens, clock
+        if not waited:
+            quota.waits += len(paths) - len(granted) - len(refused)
+        quota.save()
+
+    return granted, refused, wait
+
+
+@serialized_write
+def record_limits(limits, retries=0):
+    # Updates the quota with the rate limit headers of the responses of one round of calls (see rate_limits) and counts the retries
+    # The calls ran concurrently, the lowest remaining values are the latest
+    now = timezone.now()
+    with transaction.atomic():
+        quota = ApiQuota.objects.get_or_create(id=1)[0]
+        start_day(quota, now)
+        quota.retries += retries
+        for name in ['day_limit', 'minute_limit']:
+            values = [limit[name] for limit in limits if limit[name] is not None]
+            if values:
+                setattr(quota, name, values[-1])
+                quota.headers_at = now
+        day_remaining = [limit['day_remaining'] for limit in limits if limit['day_remaining'] is not None]
+        if day_remaining:
+            quota.day_remaining = min(day_remaining)
+        day_reset = [limit['day_reset'] for limit in limits if limit['day_reset'] is not None]
+        if day_reset:
+            quota.day_reset_at = now + timedelta(seconds=min(day_reset))
+        minute_remaining = [limit['minute_remaining'] for limit in limits if limit['minute_remaining'] is not None]
+        if minute_remaining:
+            # the API knows best how many calls are left in this minute (e.g. calls of other clients with the same key)
+            quota.tokens, quota.tokens_at = min(minute_remaining), time.time()
+        quota.save()
+
+
+def quota_status():
+    # The quota as shown on the test_api page: limits, used and remaining calls, tokens in the bucket and the counters of today
+    quota = ApiQuota.objects.filter(id=1).first() or ApiQuota()
+    now = timezone.now()
+    start_day(quota, now)
+    capacity = quota.minute_limit or getattr(settings, 'API_RATE_PER_MINUTE', API_RATE_PER_MINUTE)
+    tokens = min(capacity, quota.tokens + max(0, time.time() - quota.tokens_at) * capacity / 60) if capacity else None
+    used = quota.day_limit - quota.day_remaining if quota.day_limit is not None and quota.day_remaining is not None else None
+    return {'day_limit': quota.day_limit, 'day_remaining': quota.day_remaining, 'day_used': used, 'day_reset_at': quota.day_reset_at,
+        'minute_limit': capacity, 'tokens': tokens, 'headers_at': quota.headers_at, 'calls': quota.calls, 'waits': quota.waits,
+        'refused': quota.refused, 'retries': quota.retries, 'cache': cache_stats()}
+
+
+@serialized_write
+def update_cache(hits, revalidated, fetched):
+    # All writes of the cache for one api_get_many: urls of the hits, (id, expires_at) of the revalidated entries and (url, fields) of the fetched responses
+    now = timezone.now()
+    if hits:
+        ApiResponse.objects.filter(url__in=hits).update(hits=F('hits') + 1, last_used=now)
+    for id, expires_at in revalidated:
+        ApiResponse.objects.filter(id=id).update(fetched_at=now, expires_at=expires_at, last_used=now, hits=F('hits') + 1)
+    for url, fields in fetched:
+        ApiResponse.objects.update_or_create(url=url, defaults=fields)
+    if fetched:
+        evict()
+
+
+def evict():
+    # Removes the least recently used responses if the cache holds more than API_CACHE_MAX_ENTRIES
+    max_entries = getattr(settings, 'API_CACHE_MAX_ENTRIES', API_CACHE_MAX_ENTRIES)
+    if ApiResponse.objects.count() > max_entries:
+        evicted = list(ApiResponse.objects.order_by('-last_used', '-id').values_list('id', flat=True)[max_entries:])
+        ApiResponse.objects.filter(id__in=evicted).delete()
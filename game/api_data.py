@@ -1,50 +1,97 @@
-import requests
+import math
+import logging
+import hashlib
+import pytz
 import pandas as pd
 from datetime import datetime, date, timedelta, time
 from django.utils.timezone import make_aware
-import sqlite3
-from .secret import api_headers, db_name
-from .models import UpdateSchedule, Fixture, Team, League, AvailableLeague
-from .data_utilities import UpdateGameScores
-
-def update_countries():
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import UpdateSchedule, Fixture, League, AvailableLeague, SyncWatermark
+from .data_utilities import UpdateGameScores, DataChanged
+from .api_client import api_get, api_get_many, api_get_stream
+from .db import serialized_write
+from .identity import IdentityMap
+from .live import publish_changes
+
+logger = logging.getLogger(__name__)
+
+FIXTURE_BATCH_SIZE = 500 # fixtures written per transaction by update_fixtures, can be overwritten in settings.py
+UPDATE_LOCK_TIMEOUT = 1800 # seconds, an update which crashed without releasing the lock blocks updates for at most this long, can be overwritten in settings.py
+LIVE_REFRESH_MIN_AGE = 30 # seconds, today/refresh does not call the API if the fixtures are younger, can be overwritten in settings.py
+LIVE_LEAGUES_PER_CALL = 20 # leagues per call of the live endpoint (fixtures/live/<id>-<id>-...), can be overwritten in settings.py
+SYNC_TTL = {'past' : 3600, 'today' : 900, 'upcoming' : 6 * 3600} # seconds until the fixtures of a league on a day are fetched again (days mode), can be overwritten in settings.py
+SYNC_LOOKBACK_DAYS = 14 # past days which are fetched again while they have unfinished fixtures, can be overwritten in settings.py
+SYNC_MAX_LEAGUE_CALLS = 3 # more stale leagues on a day are fetched with one call of fixtures/date/<day> instead of fixtures/league/<id>/<day>, can be overwritten in settings.py
+
+FIXTURE_TIMEZONE = 'Europe/Vienna' # time zone of the fixture calls, the days of the watermarks are dates in this time zone
+
+# status_short of fixtures which are being played, a fixture with one of these is fetched by id when it has left the live endpoint
+LIVE_STATUS = ['1H', 'HT', '2H', 'ET', 'P', 'BT', 'LIVE', 'SUSP', 'INT']
+# status_short of fixtures which will not change any more, a past day whose fixtures all have one of these is settled and never fetched again
+# (a postponed fixture gets a new date and is fetched with the fixtures of that day)
+SETTLED_STATUS = ['FT', 'AET', 'PEN', 'ABD', 'AWD', 'WO', 'PST', 'CANC']
+
+def content_hash(values):
+    # Hash of the normalized values of an API record, it is stored with the row and a record with the same hash is not written again
+    # None and NaN are the same missing value, floats are rounded (odds are averages) and integral floats are ints (pandas turns int columns with gaps into floats)
+    normalized = list()
+    for value in values:
+        if isinstance(value, float):
+            if math.isnan(value):
+                value = None
+            else:
+                value = round(value, 6)
+                if value.is_integer():
+                    value = int(value)
+        normalized.append(None if value is None else str(value))
+    return hashlib.blake2b(repr(normalized).encode(), digest_size=16).hexdigest()
+
+def update_countries(ids=None):
     # Fill Country table - only run once, or update very rarely
-    headers = api_headers
-    conn = sqlite3.connect(db_name)
-
-    response = requests.get('https://api-football-v1.p.rapidapi.com/v2/countries', headers=headers)
-    countries = response.json()
+    # ids: IdentityMap of the run, a new one is loaded if no map is passed
+    if ids is None:
+        ids = IdentityMap()
+    countries = api_get('countries')
     countries = countries['api']['countries']
 
-    df_countries = pd.DataFrame(countries)
+    df_countries = pd.DataFrame(countries, columns=['country', 'code', 'flag'])
+
+    write_countries(df_countries, ids)
 
-    cur = conn.cursor()
+@serialized_write
+def write_countries(df_countries, ids):
+    # Countries are identified by name, all countries are written in one transaction
+    # Existing countries are found in the identity map, the updates and the inserts are each one statement executed for all rows
+    known = ids.countries
+    updates = list()
+    inserts = dict() # name => row, a country which is twice in the response is inserted once
     for country in df_countries.itertuples(index=False):
-        cur.execute('SELECT name FROM game_country WHERE name = ?', (country.country,))
-        try:
-            id = cur.fetchone()[0]
+        if country.country in known:
             # Country exists - update
-            cur.execute(''' UPDATE game_country SET name = ?, code = ?, flag = ?
-                WHERE api_id = ?''', (country.country, country.code, country.flag, id ))
-            conn.commit()
-        except:
+            updates.append((country.code, country.flag, known[country.country]))
+        else:
             # New counry - insert
-            cur.execute('INSERT INTO game_country (name, code, flag) VALUES (?,?,?)', (country.country, country.code, country.flag) )
-            conn.commit()
-    cur.close()
-
-def update_leagues():
-    # The Leagues update is called once a week
+            inserts[country.country] = (country.country, country.code, country.flag)
 
-    headers = api_headers
-    conn = sqlite3.connect(db_name)
+    with transaction.atomic(), connection.cursor() as cur:
+        if updates:
+            cur.executemany('UPDATE game_country SET code = %s, flag = %s WHERE id = %s', updates)
+        if inserts:
+            cur.executemany('INSERT INTO game_country (name, code, flag) VALUES (%s,%s,%s)', list(inserts.values()))
+    ids.add_inserted('countries', inserts)
 
-    # Read countries from database
-    df_db_countries = pd.read_sql('SELECT id AS my_country_id, name as country FROM game_country', con=conn)
+def update_leagues(ids=None):
+    # The Leagues update is called once a week
+    # ids: IdentityMap of the run, a new one is loaded if no map is passed
+    if ids is None:
+        ids = IdentityMap()
 
     # Update Leagues, only "current" leagues are requested from the API (current in the API is the latest available season)
-    response = requests.get('https://api-football-v1.p.rapidapi.com/v2/leagues/current',headers=headers)
-    leagues = response.json()
+    leagues = api_get('leagues/current')
     leagues = leagues['api']['leagues']
 
     df_leagues = pd.DataFrame(leagues, columns=['league_id', 'name', 'type', 'country', 'season', 'season_start', 'season_end', 'logo']) # Convert the leagues data to pandas dataframe
@@ -53,297 +100,568 @@ def update_leagues():
     leagues_list = list(AvailableLeague.objects.values_list('api_id', flat=True)) # gets the list of available leagues from the database and converts to a list
     df_leagues = df_leagues[df_leagues.league_id.isin(leagues_list)]
 
-    # Join Data to get internal country ID
-    df_leagues = pd.merge(df_leagues,df_db_countries,on='country')
-
-    # insert leagues in database
-    new_leagues = 0
-    cur = conn.cursor()
+    # Get the internal country ID, leagues of countries which are not in the database are dropped
+    df_leagues = df_leagues.assign(my_country_id=df_leagues.country.map(ids.countries)).dropna(subset=['my_country_id'])
+
+    written = write_leagues(df_leagues, ids)
+    if written['inserted'] or written['updated']:
+        DataChanged() # names and logos of the leagues are shown on the pages
+    logger.info('update_leagues: %d inserted, %d updated, %d unchanged', written['inserted'], written['updated'], written['skipped'])
+    return written
+
+@serialized_write
+def write_leagues(df_leagues, ids):
+    # insert leagues in database, all leagues are written in one transaction
+    # Existing leagues are found in the identity map, the updates and the inserts are each one statement executed for all rows
+    # A league whose record has the same content hash as the row in the database is skipped
+    # Returns the number of new, updated and skipped leagues - if new leagues are inserted, teams and fixtures for these leagues have to be updated
+    known = ids.leagues
+    hashes = ids.hashes('leagues')
+    updates = dict() # api id => row, a league which is twice in the response is written once
+    inserts = dict()
+    new_hashes = dict()
+    skipped = set()
     for league in df_leagues.itertuples(index=False):# itertuples have to be used to loop through dataframe
-        cur.execute('SELECT id FROM game_league WHERE api_id = ?', (league.league_id,))
-        try:
-            id = cur.fetchone()[0]
+        league_id = int(league.league_id)
+        league_hash = content_hash([league.name, league.season, league.season_start, league.season_end, league.logo, int(league.my_country_id)])
+        if league_id in known:
+            if hashes.get(league_id) == league_hash:
+                skipped.add(league_id)
+                continue
             # League exists - update
-            cur.execute(''' UPDATE game_league SET name = ?, season = ?, season_start = ?, season_end = ?, logo = ?, country_id = ?
-                WHERE api_id = ?''', (league.name, league.season, league.season_start, league.season_end, league.logo, league.my_country_id, id ))
-            conn.commit()
-        except:
+            updates[league_id] = (league.name, league.season, league.season_start, league.season_end, league.logo, int(league.my_country_id), league_hash, known[league_id])
+        else:
             # League does not exist - insert
-            cur.execute('''INSERT INTO game_league (api_id, name, is_current, season, season_start, season_end, logo, country_id )
-                VALUES (?,?,?,?,?,?,?,?)''', (league.league_id, league.name, 1, league.season, league.season_start, league.season_end, league.logo, league.my_country_id))
-            conn.commit()
-            new_leagues += 1 # New leagues are counted, if new leagues are inserted, teams and fixtures for these leagues have to be updated
-    cur.close()
-
-    return new_leagues
-
-def update_teams():
-    headers = api_headers
-    conn = sqlite3.connect(db_name)
-
-    # Read countries from database
-    df_db_countries = pd.read_sql('SELECT id AS my_country_id, name as country FROM game_country', con=conn)
+            inserts[league_id] = (league_id, league.name, 1, league.season, league.season_start, league.season_end, league.logo, int(league.my_country_id), league_hash)
+        new_hashes[league_id] = league_hash
+
+    with transaction.atomic(), connection.cursor() as cur:
+        if updates:
+            cur.executemany(''' UPDATE game_league SET name = %s, season = %s, season_start = %s, season_end = %s, logo = %s, country_id = %s, content_hash = %s
+                WHERE id = %s''', list(updates.values()))
+        if inserts:
+            cur.executemany('''INSERT INTO game_league (api_id, name, is_current, season, season_start, season_end, logo, country_id, content_hash)
+                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)''', list(inserts.values()))
+    ids.add_inserted('leagues', inserts)
+    hashes.update(new_hashes)
+
+    return {'inserted' : len(inserts), 'updated' : len(updates), 'skipped' : len(skipped - set(updates))}
+
+def update_teams(ids=None):
+    # ids: IdentityMap of the run, a new one is loaded if no map is passed
+    if ids is None:
+        ids = IdentityMap()
 
     # Filter only relevant leagues
     leagues_list = list(AvailableLeague.objects.values_list('api_id', flat=True)) # gets the list of available leagues from the database and converts to a list
 
     # Fill teams table in database for all leagues
-    # First initialise the dataframe holding all the data
-    df_teams = pd.DataFrame(columns=['team_id','name','logo', 'country'])
-    for league in leagues_list:
-        # Teams are retrieved from API per league
-        teams_url = 'https://api-football-v1.p.rapidapi.com/v2/teams/league/' + str(league)
-        response = requests.get(teams_url, headers=headers)
-        teams = response.json()
-        teams = teams['api']['teams']
-
-        # temporary dataframe to merge with df_teams
-        df_temp = pd.DataFrame(teams, columns=['team_id','name','logo','country'])
-        df_teams = df_teams.append(df_temp) # append the dataframe
-
-    # Drop duplicate values (teams can play in more than one league / competition)
-    df_teams = df_teams.drop_duplicates()
-
-    # Join with countries to get internal country id
-    df_teams = pd.merge(df_teams,df_db_countries,on='country')
-
-    # Insert into Database
-    cur = conn.cursor()
+    # Teams are retrieved from API per league, the calls run concurrently in chunks and every response is written before the next chunk is requested
+    teams_paths = ['teams/league/' + str(league) for league in leagues_list]
+    seen = set() # teams can play in more than one league / competition, every team is only written once
+    summary = {'inserted' : 0, 'updated' : 0, 'skipped' : 0}
+    for teams in api_get_stream(teams_paths):
+        teams = [team for team in teams['api']['teams'] if team['team_id'] not in seen]
+        seen.update(team['team_id'] for team in teams)
+        df_teams = pd.DataFrame(teams, columns=['team_id','name','logo','country'])
+
+        # Get the internal country id, teams of countries which are not in the database are dropped
+        df_teams = df_teams.assign(my_country_id=df_teams.country.map(ids.countries)).dropna(subset=['my_country_id'])
+
+        written = write_teams(df_teams, ids)
+        for key in summary:
+            summary[key] += written[key]
+    if summary['inserted'] or summary['updated']:
+        DataChanged()
+    logger.info('update_teams: %d inserted, %d updated, %d unchanged', summary['inserted'], summary['updated'], summary['skipped'])
+    return summary
+
+@serialized_write
+def write_teams(df_teams, ids):
+    # Insert into Database, the teams of one response are written in one transaction
+    # Existing teams are found in the identity map, the updates and the inserts are each one statement executed for all rows
+    # A team whose record has the same content hash as the row in the database is skipped
+    # Returns the number of new, updated and skipped teams
+    known = ids.teams
+    hashes = ids.hashes('teams')
+    updates = list()
+    inserts = dict() # api id => row
+    new_hashes = dict()
+    skipped = 0
     for team in df_teams.itertuples(index=False):
-        cur.execute('SELECT id FROM game_team WHERE api_id = ?', (team.team_id,))
-        try:
-            id = cur.fetchone()[0]
+        team_id = int(team.team_id)
+        team_hash = content_hash([team.name, team.logo, int(team.my_country_id)])
+        if team_id in known:
+            if hashes.get(team_id) == team_hash:
+                skipped += 1
+                continue
             # Team exists - update
-            cur.execute('''UPDATE game_team SET name = ?, logo = ?, country_id = ?
-                WHERE id = ?''', (team.name, team.logo, team.my_country_id, id))
-            conn.commit()
-        except:
+            updates.append((team.name, team.logo, int(team.my_country_id), team_hash, known[team_id]))
+        else:
             # Team does not exist - insert
-            cur.execute('''INSERT INTO game_team (api_id, name, logo, country_id)
-                VALUES (?,?,?,?)''', (team.team_id, team.name, team.logo, team.my_country_id))
-            conn.commit()
-    cur.close()
-
-def api_fixtures(api_url):
-    # API Call and parsing of fixtures data
-    headers = api_headers
-    querystring = {"timezone":"Europe/Vienna"}
-
-    response = requests.get(api_url, headers=headers,params=querystring)
-    fixtures = response.json()
-    fixtures = fixtures['api']['fixtures']
-
+            inserts[team_id] = (team_id, team.name, team.logo, int(team.my_country_id), team_hash)
+        new_hashes[team_id] = team_hash
+
+    with transaction.atomic(), connection.cursor() as cur:
+        if updates:
+            cur.executemany('''UPDATE game_team SET name = %s, logo = %s, country_id = %s, content_hash = %s
+                WHERE id = %s''', updates)
+        if inserts:
+            cur.executemany('''INSERT INTO game_team (api_id, name, logo, country_id, content_hash)
+                VALUES (%s,%s,%s,%s,%s)''', list(inserts.values()))
+    ids.add_inserted('teams', inserts)
+    hashes.update(new_hashes)
+
+    return {'inserted' : len(inserts), 'updated' : len(updates), 'skipped' : skipped}
+
+# Ingestion of fixtures as a pipeline of generators: fetch_fixtures => normalize_fixtures => resolve_ids => batches (=> add_odds) => write_fixtures
+# Only one chunk of API responses and one batch of fixtures are held in memory, independent of the number of leagues
+
+def fetch_fixtures(api_paths):
+    # API Calls, yields the fixtures of one response after the other - the calls run concurrently in chunks (see api_get_stream)
+    querystring = {"timezone":FIXTURE_TIMEZONE}
+
+    for fixtures in api_get_stream(api_paths, querystring):
+        yield from fixtures['api']['fixtures']
+
+def fetch_live_fixtures(in_play):
+    # API Calls of the live update, yields the fixtures like fetch_fixtures
+    # in_play: (api_id, league api_id, status_short) of the fixtures which are in play according to the database (see live_fixtures)
+    # Only the live endpoint of the leagues with fixtures in play is called, a finished fixture is no longer returned there:
+    # the fixtures which were being played at the last poll and are missing now are fetched by id to get their final result
+    league_ids = sorted({league_id for api_id, league_id, status_short in in_play})
+    per_call = getattr(settings, 'LIVE_LEAGUES_PER_CALL', LIVE_LEAGUES_PER_CALL)
+    live_paths = ['fixtures/live/' + '-'.join(str(league_id) for league_id in league_ids[i:i + per_call]) for i in range(0, len(league_ids), per_call)]
+
+    seen = set()
+    for fixture in fetch_fixtures(live_paths):
+        seen.add(int(fixture['fixture_id']))
+        yield fixture
+
+    gone = [api_id for api_id, league_id, status_short in in_play if api_id not in seen and status_short in LIVE_STATUS]
+    yield from fetch_fixtures(['fixtures/id/' + str(api_id) for api_id in gone])
+
+def normalize_fixtures(fixtures):
+    # Parsing of the fixtures data returned by the API into flat rows
+    # Duplicates are not removed here (this would need all ids in memory), write_fixtures writes a fixture which is twice in a batch only once
     for fixture in fixtures:
-        fixture['homeTeam_id'] = fixture['homeTeam']['team_id']
-        fixture['homeTeam_name'] = fixture['homeTeam']['team_name']
-        fixture['awayTeam_id'] = fixture['awayTeam']['team_id']
-        fixture['awayTeam_name'] = fixture['awayTeam']['team_name']
-
-    return fixtures
-
-def get_fixtures(df_fixtures, **kwargs):
-    # **kwargs allows to pass flexible parameters as key-value pairs
-
-    if kwargs['mode'] == 'leagues':
-        # fixtures for all leagues in leagues list are updated
-        for league in kwargs['leagues_list']:
-            fixtures_url = 'https://api-football-v1.p.rapidapi.com/v2/fixtures/league/' + str(league)
-            fixtures = api_fixtures(fixtures_url)
-            df_temp = pd.DataFrame(fixtures, columns=list(df_fixtures.columns))
-            df_fixtures = df_fixtures.append(df_temp)
-
-    elif kwargs['mode'] == 'days':
-        # fixtures for today + 2 days are updated
-        for matchday in kwargs['matchdays']:
-            fixtures_url = 'https://api-football-v1.p.rapidapi.com/v2/fixtures/date/' + matchday
-            fixtures = api_fixtures(fixtures_url)
-            df_temp = pd.DataFrame(fixtures, columns=list(df_fixtures.columns))
-            df_fixtures = df_fixtures.append(df_temp)
+        yield {'fixture_id' : int(fixture['fixture_id']), 'league_id' : fixture['league_id'], 'event_date' : fixture['event_date'],
+            'dt_event_date' : parse_datetime(fixture['event_date']), # convert starttime to datetime object to avoid problems in database
+            'status' : fixture['status'], 'statusShort' : fixture['statusShort'], 'homeTeam_id' : fixture['homeTeam']['team_id'], 'awayTeam_id' : fixture['awayTeam']['team_id'],
+            'goalsHomeTeam' : fixture['goalsHomeTeam'], 'goalsAwayTeam' : fixture['goalsAwayTeam']}
+
+def resolve_ids(rows, ids):
+    # Adds the internal ids of league and teams from the identity map, fixtures of leagues which are not in the database are dropped
+    # The team ids are only needed for new fixtures, they are None if the team is not (yet) in the database
+    leagues = ids.leagues
+    teams = ids.teams
+    for row in rows:
+        row['my_league_id'] = leagues.get(row['league_id'])
+        if row['my_league_id'] is None:
+            continue
+        row['my_homeTeam_id'] = teams.get(row['homeTeam_id'])
+        row['my_awayTeam_id'] = teams.get(row['awayTeam_id'])
+        yield row
+
+def batches(rows, size):
+    # Groups the rows in lists of size rows
+    batch = list()
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = list()
+    if batch:
+        yield batch
+
+def odds_by_date(days, querystring):
+    # Odds of all fixtures of the days (strings 'YYYY-MM-DD'), label = 1 is the Match Winner Bet
+    # The API returns the odds of a day in pages of ten fixtures, the first pages of all days and then all other pages are requested concurrently
+    # Returns the list of responses and the list of days which could not be loaded (e.g. the endpoint returned an error)
+    paths = ['odds/date/' + day + '/label/1' for day in days]
+    first_pages = api_get_many(paths, querystring)
+    responses = list()
+    failed = list()
+    more_pages = list()
+    for day, path, odds in zip(days, paths, first_pages):
+        if 'odds' not in odds.get('api', {}):
+            failed.append(day)
+            continue
+        responses.append(odds)
+        total = odds['api'].get('paging', {}).get('total', 1)
+        more_pages += [(path, page) for page in range(2, total + 1)]
+
+    if more_pages:
+        responses += api_get_many([path for path, page in more_pages], [dict(querystring, page=page) for path, page in more_pages])
+
+    return responses, failed
+
+def parse_odds(responses):
+    # Flattens the bets of all responses into columns (fixture, value, odd) and returns the average "Match Winner" odds per fixture of all available bookmakers
+    # Odds which are not a number are ignored, if no bookmaker has a valid odd for a value it is NaN (and not written to the database)
+    fixture_ids, values, odds = list(), list(), list()
+    for response in responses:
+        for o in response.get('api', {}).get('odds', []):
+            for bookmaker in o['bookmakers']:
+                for bet in bookmaker['bets']:
+                    if bet['label_name'] == 'Match Winner':
+                        for bet_value in bet['values']:
+                            fixture_ids.append(o['fixture']['fixture_id'])
+                            values.append(bet_value['value'])
+                            odds.append(bet_value['odd'])
+
+    df_bets = pd.DataFrame({'fixture_id' : pd.Series(fixture_ids, dtype='int64'), 'value' : values, 'odd' : pd.to_numeric(pd.Series(odds, dtype='object'), errors='coerce')})
+    df_odds = df_bets.groupby(['fixture_id', 'value'])['odd'].mean().unstack()
+    df_odds = df_odds.reindex(columns=['Home', 'Draw', 'Away']).rename(columns={'Home' : 'home_win', 'Draw' : 'draw', 'Away' : 'away_win'})
+    df_odds.columns.name = None
+
+    return df_odds.reset_index()
+
+def get_odds(days=(), fixtures=()):
+    # Get odds from API for all fixtures of the days (strings 'YYYY-MM-DD') and for the fixtures (api ids)
+    # The average of "Match Winner" Odds for a fixture of all available bookmakers is returned as dict fixture_id => {'home_win', 'draw', 'away_win'}
+    # together with the list of days which could not be loaded
 
-    else:
-        # live games are updated - all from current day
-        td = date.today()
-        fixtures_url = 'https://api-football-v1.p.rapidapi.com/v2/fixtures/date/' + td.strftime('%Y-%m-%d')
-        fixtures = api_fixtures(fixtures_url)
-        df_fixtures = pd.DataFrame(fixtures, columns=list(df_fixtures.columns))
+    querystring = {"timezone":"Europe/Vienna"}
 
-    return df_fixtures
+    responses, failed = odds_by_date(days, querystring)
+    responses += api_get_many(['odds/fixture/' + str(fixture) + '/label/1' for fixture in fixtures], querystring)
+
+    df_odds = parse_odds(responses)
+    odds = {int(o.fixture_id) : {'home_win' : o.home_win, 'draw' : o.draw, 'away_win' : o.away_win} for o in df_odds.itertuples(index=False)}
+
+    return odds, failed
+
+def add_odds(fixture_batches, days):
+    # Adds the odds to the fixtures played on the days (strings 'YYYY-MM-DD'), the odds of all days are requested before the first batch
+    # Only the fixtures of days which could not be loaded are requested per fixture
+    odds, failed = get_odds(days=days)
+    for batch in fixture_batches:
+        batch_days = [row['dt_event_date'].strftime('%Y-%m-%d') for row in batch] # Only date part is compared
+        fallback = [row['fixture_id'] for row, day in zip(batch, batch_days) if day in failed and row['fixture_id'] not in odds]
+        if fallback:
+            odds.update(get_odds(fixtures=fallback)[0])
+        for row, day in zip(batch, batch_days):
+            if day in days:
+                row.update(odds.get(row['fixture_id'], {}))
+        yield batch
+
+def fixture_hash(row):
+    # Content hash of a fixture record (see content_hash) over the values write_fixtures writes in every mode
+    return content_hash([row['dt_event_date'], row['status'], row['statusShort'], row['goalsHomeTeam'], row['goalsAwayTeam']])
+
+def odds_hash(row):
+    # Content hash of the odds of a fixture record, kept apart from fixture_hash as the odds are only written in mode 'days'
+    return content_hash([row.get('home_win'), row.get('draw'), row.get('away_win')])
+
+@serialized_write
+def write_fixtures(rows, mode):
+    # Writes a batch of fixtures (rows from resolve_ids) to the database: existing fixtures are loaded with one query,
+    # new fixtures are inserted with a bulk insert and existing fixtures are changed with one update statement, all in one transaction
+    # Goals and odds are only changed if the API returned a value, odds of existing fixtures only in mode 'days'
+    # An existing fixture whose record has the same content hash as the row (and the same odds hash, if the odds are written) is skipped, it is not written again
+    # Mode 'live' only writes the existing fixtures whose goals or status changed
+    # Returns the number of inserted, updated and skipped fixtures and the ids of the existing fixtures whose goals or status changed (only their tipps have to be scored again)
+
+    existing = Fixture.objects.in_bulk([int(row['fixture_id']) for row in rows], field_name='api_id')
+    before = {api_id : (fo.home_goals, fo.away_goals, fo.status_short) for api_id, fo in existing.items()}
+    new_fixtures = dict()
+    different = set() # api ids of the existing fixtures whose hash differs
+    for row in rows:
+        api_id = int(row['fixture_id'])
+        fo = existing.get(api_id) or new_fixtures.get(api_id)
+        if fo is None:
+            # Fixture does not yet exist in database => add
+            if pd.isna(row['my_homeTeam_id']) or pd.isna(row['my_awayTeam_id']):
+                continue # the teams are not (yet) in the database
+            fo = Fixture(api_id=api_id, league_id=int(row['my_league_id']), home_team_id=int(row['my_homeTeam_id']), away_team_id=int(row['my_awayTeam_id']))
+            new_fixtures[api_id] = fo
+
+        with_odds = mode == 'days' or api_id in new_fixtures # Odds are only updated in the daily update, but not for live games or league updates
+        row_hash = fixture_hash(row)
+        row_odds_hash = odds_hash(row) if with_odds else fo.odds_hash
+        if fo.content_hash == row_hash and fo.odds_hash == row_odds_hash:
+            continue # nothing changed since the last write of the fixture
+        fo.content_hash, fo.odds_hash = row_hash, row_odds_hash
+        if api_id in existing:
+            different.add(api_id)
+
+        fo.match_start = row['dt_event_date']
+        fo.status = row['status']
+        fo.status_short = row['statusShort']
+        if not pd.isna(row['goalsHomeTeam']):
+            fo.home_goals = int(row['goalsHomeTeam'])
+        if not pd.isna(row['goalsAwayTeam']):
+            fo.away_goals = int(row['goalsAwayTeam'])
+
+        if with_odds:
+            if not pd.isna(row.get('home_win')):
+                fo.home_odds = row['home_win']
+            if not pd.isna(row.get('draw')):
+                fo.draw_odds = row['draw']
+            if not pd.isna(row.get('away_win')):
+                fo.away_odds = row['away_win']
+
+    changed = {fo.id for api_id, fo in existing.items() if before[api_id] != (fo.home_goals, fo.away_goals, fo.status_short)}
+    to_update = [fo for api_id, fo in existing.items() if api_id in different and (mode != 'live' or fo.id in changed)]
+
+    update_fields = ['match_start', 'status', 'status_short', 'home_goals', 'away_goals', 'content_hash']
+    if mode == 'days':
+        update_fields += ['home_odds', 'draw_odds', 'away_odds', 'odds_hash']
 
-def is_float(test_string):
-    # returns true if a string can be converted to a float, and false otherwise
-    try:
-        float(test_string)
-        return True
-    except:
-        return False
+    # The update is one statement executed for all rows (Fixture.objects.bulk_update builds a huge CASE expression, which is much slower)
+    fields = [Fixture._meta.get_field(name) for name in update_fields]
+    sql_update = 'UPDATE game_fixture SET ' + ', '.join(field.column + ' = %s' for field in fields) + ' WHERE id = %s'
+    update_params = [[field.get_db_prep_save(getattr(fo, field.attname), connection) for field in fields] + [fo.id] for fo in to_update]
 
-def get_odds(fixtures):
-    # Get odds from API for all fixtures in the dataframe
-    # Every odd is per fixture as the api only returns ten results if all odds per day are requested
-    # The average of "Match Winner" Odds for a fixture of all available bookmakers is returned
+    with transaction.atomic():
+        Fixture.objects.bulk_create(new_fixtures.values())
+        if update_params:
+            with connection.cursor() as cursor:
+                cursor.executemany(sql_update, update_params)
 
-    headers = api_headers
-    querystring = {"timezone":"Europe/Vienna"}
+    return {'inserted' : len(new_fixtures), 'updated' : len(to_update), 'skipped' : len(existing) - len(to_update), 'changed' : changed}
 
-    df_odds = pd.DataFrame(columns=['fixture_id', 'home_win', 'draw', 'away_win'])
-    # Odds for a date
-    for fixture in fixtures:
-        # label = 1 is the Match Winner Bet
-        odds_url = 'https://api-football-v1.p.rapidapi.com/v2/odds/fixture/' + str(fixture) + '/label/1'
-        response = requests.get(odds_url, headers=headers,params=querystring)
-        odds = response.json()
-        if 'api' in odds:
-            if 'odds' in odds['api']:
-                odds = odds['api']['odds']
-
-                for o in odds:
-                    o['fixture_id'] = o['fixture']['fixture_id']
-                    o['bookmaker_home'] = 0 # counter for each value as sometimes not all are available
-                    o['home_win'] = 0
-                    o['bookmaker_draw'] = 0
-                    o['draw'] = 0
-                    o['bookmaker_away'] = 0
-                    o['away_win'] = 0
-                    for bookmaker in o['bookmakers']:
-                        for bet in bookmaker['bets']:
-                            if bet['label_name'] == 'Match Winner':
-                                for bet_value in bet['values']:
-                                    if bet_value['value'] == 'Home' and is_float(bet_value['odd']):
-                                        o['bookmaker_home'] += 1
-                                        o['home_win'] += float(bet_value['odd'])
-                                    elif bet_value['value'] == 'Draw' and is_float(bet_value['odd']):
-                                        o['bookmaker_draw'] += 1
-                                        o['draw'] += float(bet_value['odd'])
-                                    elif bet_value['value'] == 'Away' and is_float(bet_value['odd']):
-                                        o['bookmaker_away'] += 1
-                                        o['away_win'] += float(bet_value['odd'])
-
-                    if o['bookmaker_home'] > 0:
-                        o['home_win'] = o['home_win'] / o['bookmaker_home']
-                    if o['bookmaker_draw'] > 0:
-                        o['draw'] = o['draw'] / o['bookmaker_draw']
-                    if o['bookmaker_away'] > 0:
-                        o['away_win'] = o['away_win'] / o['bookmaker_away']
-
-                df_temp = pd.DataFrame(odds, columns=['fixture_id', 'home_win', 'draw', 'away_win'])
-                df_odds = df_odds.append(df_temp)
-
-    return df_odds
-
-
-def update_fixtures(mode):
+
+def update_fixtures(mode, ids=None):
     # Load Fixtures for Database - different modes are possible
     # 'leagues' => update all fixtures for all leagues in leagues_list
-    # 'days' => update all fixtures since the last update until today + 2 days into the future
-    # 'live' => update all fixtures of current day
-
-    conn = sqlite3.connect(db_name)
-    df_fixtures = pd.DataFrame(columns=['fixture_id', 'league_id', 'event_date', 'round', 'status', 'statusShort', 'homeTeam_id','awayTeam_id','goalsHomeTeam','goalsAwayTeam'])
+    # 'days' => update the fixtures since the last update until today + 2 days into the future and of past days with unfinished fixtures,
+    #           only the leagues and days whose sync watermark is stale are fetched (see sync_plan)
+    # 'live' => update the fixtures in play, only the live endpoint of their leagues is called (see fetch_live_fixtures)
+    # The fixtures are written in batches of FIXTURE_BATCH_SIZE (one transaction per batch) while the remaining API calls are still to be made
+    # ids: IdentityMap of the run (league and team ids), a new one is loaded if no map is passed
+    if ids is None:
+        ids = IdentityMap()
 
     # Depending on mode - get data from API
     if mode == 'leagues':
         leagues_list = list(AvailableLeague.objects.values_list('api_id', flat=True)) # gets the list of available leagues from the database and converts to a list
-        df_fixtures = get_fixtures(df_fixtures, mode=mode, leagues_list = leagues_list)
+        fixtures_paths = ['fixtures/league/' + str(league) for league in leagues_list]
+        fixtures = fetch_fixtures(fixtures_paths)
     elif mode == 'days':
-        last_update = UpdateSchedule.objects.all().get()
-        matchday = last_update.last_fixture_update.date()
-        matchday = datetime.combine(matchday, time())
-        matchdays = list()
-        last_day = datetime.today()+timedelta(days=2)
-        # create list of relevant match days
-        while matchday <= last_day:
-            matchdays.append(matchday.strftime('%Y-%m-%d'))
-            matchday = matchday+timedelta(days=1)
-
-        df_fixtures = get_fixtures(df_fixtures, mode=mode, matchdays = matchdays)
+        # only the leagues and days whose watermark is stale are fetched (see sync_plan)
+        sync_start = timezone.now()
+        plan = sync_plan(sync_start)
+        fixtures_paths = [path for path, pairs in plan]
+        fixtures = fetch_fixtures(fixtures_paths)
     else:
-        # live games
-        df_fixtures = get_fixtures(df_fixtures, mode=mode)
-
-    # Remove duplicates - just in case
-    df_fixtures = df_fixtures.drop_duplicates()
-
-    # convert starttime to datetime object to avoid problems in database
-    df_fixtures['dt_event_date'] = pd.to_datetime(df_fixtures.event_date)
-
-    # internal ids for teams and league have to be added
-    # Read from database into pandas dataframe
-    df_db_leagues = pd.read_sql('SELECT id AS my_league_id, api_id AS league_id FROM game_league', con=conn)
+        # live games are updated - nothing is fetched if no fixture is in play
+        fixtures = fetch_live_fixtures(list(live_fixtures().values_list('api_id', 'league__api_id', 'status_short')))
 
-    # Join Data to get my internal IDs
-    # first the leagues, as this is an inner join it also get's rid of fixtures which are not in a relevant league
-    df_fixtures = pd.merge(df_fixtures,df_db_leagues,on='league_id')
+    rows = resolve_ids(normalize_fixtures(fixtures), ids)
+    fixture_batches = batches(rows, getattr(settings, 'FIXTURE_BATCH_SIZE', FIXTURE_BATCH_SIZE))
 
-    # Update odds only for relevant fixtures and only in mode 'days'
+    # Update odds only for relevant fixtures and only in mode 'days' - odds are only updated for current day + two days, but not for live games
     if mode == 'days':
-        df_fixtures_today = df_fixtures[df_fixtures['dt_event_date'].dt.date == date.today()] # Only date part is compared
-        df_odds = get_odds(df_fixtures_today['fixture_id'].tolist()) # odds are only updated for current day + two days, but not for live games
-        # Join odds data with fixtures data - not all fixtures have odds available - therefore a left outer join has to be used
-        df_fixtures = pd.merge(df_fixtures, df_odds, how='left', on='fixture_id')
-    else:
-        df_fixtures = df_fixtures.reindex(df_fixtures.columns.tolist() + ['home_win','draw','away_win'], axis = 1)  # add the columns which usually come from odds
-
-    # with Fixture object
-    for tu_fixture in df_fixtures.itertuples(index=False):
-        fo = Fixture.objects.all().filter(api_id = tu_fixture.fixture_id)
-        if fo.count() == 0:
-            # Fixture does not yet exist in database => add
-            league = League.objects.all().filter(id = tu_fixture.my_league_id).first()
-            h_team = Team.objects.all().filter(id=tu_fixture.my_homeTeam_id).first()
-            a_team = Team.objects.all().filter(id=tu_fixture.my_awayTeam_id).first()
-            fnew = Fixture(api_id=tu_fixture.fixture_id, league=league, match_start=tu_fixture.dt_event_date, status=tu_fixture.status, status_short=tu_fixture.statusShort, home_team=h_team, away_team=a_team)
-            if not pd.isna(tu_fixture.goalsHomeTeam):
-                fnew.home_goals = int(tu_fixture.goalsHomeTeam)
-            if not pd.isna(tu_fixture.goalsAwayTeam):
-                fnew.away_goals = int(tu_fixture.goalsAwayTeam)
-            if not pd.isna(tu_fixture.home_win):
-                fnew.home_odds = tu_fixture.home_win
-            if not pd.isna(tu_fixture.draw):
-                fnew.draw_odds = tu_fixture.draw
-            if not pd.isna(tu_fixture.away_win):
-                fnew.away_odds = tu_fixture.away_win
-
-            fnew.save()
-        else:
-            # Fixture exists, update relevant fields
-            fo.update(match_start=tu_fixture.dt_event_date, status=tu_fixture.status, status_short=tu_fixture.statusShort)
-            if not pd.isna(tu_fixture.goalsHomeTeam):
-                fo.update(home_goals = int(tu_fixture.goalsHomeTeam))
-            if not pd.isna(tu_fixture.goalsAwayTeam):
-                fo.update(away_goals = int(tu_fixture.goalsAwayTeam))
-
-            if mode == 'days': # Odds are only updated in the daily update, but not for live games or league updates
-                if not pd.isna(tu_fixture.home_win):
-                    fo.update(home_odds = tu_fixture.home_win)
-                if not pd.isna(tu_fixture.draw):
-                    fo.update(draw_odds = tu_fixture.draw)
-                if not pd.isna(tu_fixture.away_win):
-                    fo.update(away_odds = tu_fixture.away_win)
+        # the odds of a day are only requested if fixtures of the day are fetched
+        today = local_day(sync_start)
+        synced_days = {day for path, pairs in plan for league_id, day in pairs}
+        fixture_batches = add_odds(fixture_batches, [(today + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(3) if today + timedelta(days=i) in synced_days])
+
+    summary = {'inserted' : 0, 'updated' : 0, 'skipped' : 0, 'changed' : set()}
+    for batch in fixture_batches:
+        written = write_fixtures(batch, mode)
+        summary['inserted'] += written['inserted']
+        summary['updated'] += written['updated']
+        summary['skipped'] += written['skipped']
+        summary['changed'] |= written['changed']
+
+    # the watermarks are only moved after all fixtures of the plan are written, an update which failed fetches the same days again
+    if mode == 'days':
+        summary['synced'] = write_watermarks([pair for path, pairs in plan for pair in pairs], sync_start)
+        summary['calls'] = len(fixtures_paths)
 
     # Save last update time to database
-    fixture_update = UpdateSchedule.objects.all()
-    fixture_update.update(last_fixture_update=make_aware(datetime.now())) # Make aware is neccesary because the field is timezone aware
-
-    # after the fixture data is updated, the game scores are updated as well
-    UpdateGameScores()
+    update_schedule(last_fixture_update=make_aware(datetime.now())) # Make aware is neccesary because the field is timezone aware
+
+    # after the fixture data is updated, the game scores are updated as well - only for fixtures with changed goals or status,
+    # the days update scores all tipps which are not final: tipps missed by a run which failed after writing its fixtures
+    # (the next run skips these fixtures, their hashes are unchanged) are scored at the latest by the next days update
+    summary['rescored'] = UpdateGameScores(fixture_ids=None if mode == 'days' else summary['changed'])
+    if summary['inserted'] or summary['updated'] or summary['rescored']:
+        DataChanged() # only now, after the scoring, pages rendered from the new data can be cached
+    # the open today and gamedetail pages get the new goals, status and scores
+    summary['pushed'] = publish_changes(summary['changed'])
+    logger.info('update_fixtures(%s): %d inserted, %d updated, %d unchanged, %d changed fixtures, %d tipps rescored, %d fixtures pushed',
+        mode, summary['inserted'], summary['updated'], summary['skipped'], len(summary['changed']), summary['rescored'], summary['pushed'])
+    if mode == 'days':
+        logger.info('update_fixtures(days): %d calls, %d league days synced, %d settled', summary['calls'], len(summary['synced']), sum(summary['synced'].values()))
+
+    return summary
+
+
+def local_day(dt):
+    # Date of a datetime in the time zone of the fixture calls
+    return dt.astimezone(pytz.timezone(FIXTURE_TIMEZONE)).date()
+
+
+def unfinished_fixtures(league_ids, first_day, last_day):
+    # (league id, day) of the fixtures from first_day to last_day (dates in FIXTURE_TIMEZONE, last_day excluded) which are not settled
+    zone = pytz.timezone(FIXTURE_TIMEZONE)
+    start = zone.localize(datetime.combine(first_day, time()))
+    end = zone.localize(datetime.combine(last_day, time()))
+    fixtures = Fixture.objects.filter(league_id__in=league_ids, match_start__gte=start, match_start__lt=end).exclude(status_short__in=SETTLED_STATUS)
+    return {(league_id, local_day(match_start)) for league_id, match_start in fixtures.values_list('league_id', 'match_start')}
+
+
+def sync_plan(now):
+    # Calls of the days mode: the fixtures of a league on a day are fetched if the (league, day) has no watermark yet
+    # or is not settled and was synced longer than its SYNC_TTL ago ('past', 'today' or 'upcoming' day)
+    # The days are the days since the last fixture update until today + 2 days, and the past days within SYNC_LOOKBACK_DAYS
+    # which have unfinished fixtures or an unsettled watermark. Settled days are never fetched again.
+    # Returns a list of (api path, [(league id, day)]) - the (league, day) pairs which are synced by the call
+    ttl = dict(SYNC_TTL)
+    ttl.update(getattr(settings, 'SYNC_TTL', {}))
+    max_league_calls = getattr(settings, 'SYNC_MAX_LEAGUE_CALLS', SYNC_MAX_LEAGUE_CALLS)
+    today = local_day(now)
+    lookback = today - timedelta(days=getattr(settings, 'SYNC_LOOKBACK_DAYS', SYNC_LOOKBACK_DAYS))
+
+    # leagues of the fixtures: league id => api id
+    leagues = dict(League.objects.filter(api_id__in=AvailableLeague.objects.values('api_id')).values_list('id', 'api_id'))
+
+    first_day = min(local_day(UpdateSchedule.objects.all().get().last_fixture_update), today)
+    candidates = {(league_id, first_day + timedelta(days=i)) for league_id in leagues for i in range((today - first_day).days + 3)}
+    candidates |= unfinished_fixtures(leagues, lookback, today)
+    watermarks = {(wm.league_id, wm.date) : wm for wm in SyncWatermark.objects.filter(league_id__in=leagues, date__gte=min(first_day, lookback))}
+    candidates |= {pair for pair, wm in watermarks.items() if not wm.settled and pair[1] < today}
+
+    stale = dict() # day => league ids
+    for league_id, day in candidates:
+        wm = watermarks.get((league_id, day))
+        if wm is not None:
+            if wm.settled:
+                continue
+            age = ttl['past'] if day < today else ttl['today'] if day == today else ttl['upcoming']
+            if (now - wm.synced_at).total_seconds() < age:
+                continue
+        stale.setdefault(day, list()).append(league_id)
+
+    plan = list()
+    for day in sorted(stale):
+        league_ids = sorted(stale[day])
+        if len(league_ids) > max_league_calls:
+            # one call for all leagues of the day, all leagues are synced with it
+            plan.append(('fixtures/date/' + day.strftime('%Y-%m-%d'), [(league_id, day) for league_id in leagues]))
+        else:
+            plan += [('fixtures/league/%d/%s' % (leagues[league_id], day.strftime('%Y-%m-%d')), [(league_id, day)]) for league_id in league_ids]
+    return plan
+
+
+@serialized_write
+def write_watermarks(pairs, synced_at):
+    # Saves the watermarks of the synced (league id, day) pairs, a past day is settled if the league has no unfinished fixture on it
+    # synced_at is the start of the update, a fixture changed by the API while the update was running is fetched again with the next update
+    # Returns dict (league id, day) => settled
+    if not pairs:
+        return dict()
+    today = local_day(synced_at)
+    days = [day for league_id, day in pairs]
+    unfinished = unfinished_fixtures({league_id for league_id, day in pairs}, min(days), today)
+    synced = {(league_id, day) : day < today and (league_id, day) not in unfinished for league_id, day in pairs}
+    prep_date = SyncWatermark._meta.get_field('date').get_db_prep_save
+    synced_at = SyncWatermark._meta.get_field('synced_at').get_db_prep_save(synced_at, connection)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.executemany('''INSERT INTO game_syncwatermark (league_id, date, synced_at, settled) VALUES (%s, %s, %s, %s)
+                ON CONFLICT (league_id, date) DO UPDATE SET synced_at = excluded.synced_at, settled = excluded.settled''',
+                [(league_id, prep_date(day, connection), synced_at, settled) for (league_id, day), settled in synced.items()])
+    return synced
 
 
 def scheduled_update():
     # This function should be called daily to update data from the API as required
 
+    # The ids of countries, leagues and teams are loaded once for all updates of the run
+    ids = IdentityMap()
+
     # Check if Leagues need to be updated
     schedule = UpdateSchedule.objects.all()
     lupdate = schedule.get() # Get data  from Queryset
     if date.today() >= lupdate.next_league_update:
-        if update_leagues() > 0:
+        if update_leagues(ids)['inserted'] > 0:
             # If a league as been added, teams need to be updated
-            update_teams()
-            update_fixtures(mode='leagues')
-        schedule.update(next_league_update=date.today()+timedelta(days=7)) # schedule next update in a week
+            update_teams(ids)
+            update_fixtures(mode='leagues', ids=ids)
+        update_schedule(next_league_update=date.today()+timedelta(days=7)) # schedule next update in a week
 
     # Check if fixtures need to be update (daily update)
     if date.today() >= lupdate.next_fixture_update:
-        update_fixtures(mode='days')
-        schedule.update(next_fixture_update=date.today()+timedelta(days=1)) # fixtures are updated daily
+        update_fixtures(mode='days', ids=ids)
+        update_schedule(next_fixture_update=date.today()+timedelta(days=1)) # fixtures are updated daily
+
+
+@serialized_write
+def update_schedule(**fields):
+    # Changes the fields of the row of UpdateSchedule, like all writes of the ingestion in the writer thread
+    return UpdateSchedule.objects.update(**fields)
+
 
+@serialized_write
+def acquire_update_lock():
+    # Sets the lock in UpdateSchedule if it is free or expired - this is one UPDATE statement, so only one process can get the lock
+    # Returns True if the lock was acquired
+    now = timezone.now()
+    timeout = getattr(settings, 'UPDATE_LOCK_TIMEOUT', UPDATE_LOCK_TIMEOUT)
+    locked = UpdateSchedule.objects.filter(Q(lock_until__isnull=True) | Q(lock_until__lt=now)).update(lock_until=now + timedelta(seconds=timeout))
+    return locked > 0
 
+
+def run_update(mode):
+    # Runs an update with the database lock, mode 'scheduled' runs the leagues and days updates (if due), mode 'live' the live update
+    # and mode 'days' the days update (test_api page, whether it is due or not)
+    # Start, end and duration of the run are saved in UpdateSchedule
+    # Returns False if another update is already running
+    if not acquire_update_lock():
+        return False
+
+    start = timezone.now()
+    update_schedule(last_run_start=start)
+    try:
+        if mode in ('live', 'days'):
+            update_fixtures(mode=mode)
+        else:
+            scheduled_update()
+    finally:
+        end = timezone.now()
+        update_schedule(lock_until=None, last_run_end=end, last_run_duration=(end - start).total_seconds())
+        logger.info('run_update(%s) finished in %.1f seconds', mode, (end - start).total_seconds())
+
+    return True
+
+
+def refresh_live():
+    # Live update requested by a user (today/refresh), many users pressing refresh at the same time should only cause one update:
+    # - if the fixtures have been updated within the last LIVE_REFRESH_MIN_AGE seconds, the data is fresh enough and nothing is done
+    # - if another update is running, no second update is started, the user gets the data as it is (the running update will be shown with the next page view)
+    # Returns a tuple: True if this request ran the update, and the age of the data in seconds
+    min_age = getattr(settings, 'LIVE_REFRESH_MIN_AGE', LIVE_REFRESH_MIN_AGE)
+    schedule = UpdateSchedule.objects.all().get()
+    age = (timezone.now() - schedule.last_fixture_update).total_seconds()
+    if age < min_age:
+        return False, age
+
+    updated = run_update('live')
+    schedule = UpdateSchedule.objects.all().get()
+    return updated, (timezone.now() - schedule.last_fixture_update).total_seconds()
+
+
+def live_fixtures():
+    # Fixtures which have started within the last three hours and are not finished
+    now = timezone.now()
+    li_status = ['FT','AET','PEN', 'ABD', 'AWD', 'PST', 'CANC']
+    return Fixture.objects.filter(match_start__lte=now, match_start__gte=now - timedelta(hours=3)).exclude(status_short__in=li_status)
+
+
+def fixtures_in_play():
+    # Returns True if a fixture is in play, the live update is only needed then
+    return live_fixtures().exists()
+
+
+def seconds_to_next_kickoff():
+    # Returns the seconds until the start of the next fixture which is still to be played, None if no fixture is scheduled
+    li_status = ['PST', 'CANC', 'ABD', 'AWD', 'WO']
+    next_start = Fixture.objects.filter(match_start__gt=timezone.now()).exclude(status_short__in=li_status).order_by('match_start').values_list('match_start', flat=True).first()
+    if next_start is None:
+        return None
+    return (next_start - timezone.now()).total_seconds()
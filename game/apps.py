@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class GameConfig(AppConfig):
     name = 'game'
+
+    def ready(self):
+        # WAL, synchronous and busy timeout for every SQLite connection (see game/db.py)
+        from .db import configure_sqlite
+        connection_created.connect(configure_sqlite, dispatch_uid='game.configure_sqlite')
@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import random
+import tempfile
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import override_settings
+from django.utils import timezone
+from .models import Country, League, Team, Fixture, Game, Game_Leagues, Player, PlayerStatus, Player_Games, Tipp, UpdateSchedule, AvailableLeague
+from .data_utilities import UpdateGameScores, UpdateLeaderboard, DataChanged
+
+# Helpers for the benchmark commands in game/management/commands/bench_*.py and for the tests (game/tests.py)
+
+
+@contextmanager
+def benchmark_database():
+    # Creates a throwaway database file with all migrations applied, so the benchmarks never touch the real database
+    # The writes run in the calling thread (SERIALIZED_WRITES = False), so measure counts all SQL statements
+    # The fragment cache is cleared before and after, every database starts with data version 0
+    tmpdir = tempfile.mkdtemp()
+    cache.clear()
+    connection.settings_dict['TEST']['NAME'] = os.path.join(tmpdir, 'benchmark.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with override_settings(SERIALIZED_WRITES=False):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        os.rmdir(tmpdir)
+        cache.clear()
+
+
+@contextmanager
+def measure(results, name, **info):
+    # Measures wall-clock time and number of SQL statements of the block and appends the result to the list results
+    queries = list()
+    def count_queries(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_queries):
+        start = time.perf_counter()
+        yield
+        duration = time.perf_counter() - start
+    result = {'name' : name, 'seconds' : duration, 'queries' : len(queries)}
+    result.update(info)
+    results.append(result)
+
+
+def print_results(stdout, results):
+    stdout.write('%-40s %10s %10s' % ('benchmark', 'seconds', 'queries'))
+    for result in results:
+        stdout.write('%-40s %10.3f %10d' % (result['name'], result['seconds'], result['queries']))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Answers every request like the API would, after a fixed delay to simulate the latency of RapidAPI
+    # responses maps paths of the API (e.g. 'fixtures/league/2') to the json returned, other paths get an empty result
+    delay = 0.1
+    responses = dict()
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        path = self.path.split('?')[0][len('/v2/'):]
+        body = json.dumps(self.responses.get(path, {'api': {'results': 0, 'fixtures': []}})).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def stub_api(delay=0.1, responses=None):
+    # Runs a local stub server of the API and points API_FOOTBALL_URL to it
+    StubHandler.delay = delay
+    StubHandler.responses = responses or dict()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        # the stub has no quota (the calls are not limited per minute)
+        with override_settings(API_FOOTBALL_URL='http://127.0.0.1:%d/v2/' % server.server_address[1], API_RATE_PER_MINUTE=None):
+            yield
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def api_fixture(fixture, league, home_team, away_team):
+    # A fixture of the database in the format of the API (fixtures/league and fixtures/date), league and teams as objects of the database
+    return {'fixture_id' : fixture.api_id, 'league_id' : league.api_id, 'event_date' : fixture.match_start.isoformat(), 'round' : 'Regular Season',
+        'status' : fixture.status, 'statusShort' : fixture.status_short, 'homeTeam' : {'team_id' : home_team.api_id, 'team_name' : home_team.name},
+        'awayTeam' : {'team_id' : away_team.api_id, 'team_name' : away_team.name}, 'goalsHomeTeam' : fixture.home_goals, 'goalsAwayTeam' : fixture.away_goals}
+
+
+def fixture_responses():
+    # The responses of fixtures/league/<api_id> for all leagues of the database, as the API would return them
+    leagues = League.objects.in_bulk()
+    teams = Team.objects.in_bulk()
+    responses = dict()
+    for fixture in Fixture.objects.all().order_by('id'):
+        league = leagues[fixture.league_id]
+        data = responses.setdefault('fixtures/league/%d' % league.api_id, {'api': {'results': 0, 'fixtures': []}})
+        data['api']['fixtures'].append(api_fixture(fixture, league, teams[fixture.home_team_id], teams[fixture.away_team_id]))
+        data['api']['results'] += 1
+    return responses
+
+
+def change_goals(responses, rnd):
+    # Changes the goals of the finished fixtures in the responses of fixture_responses, so every ingestion run writes and scores again
+    for data in responses.values():
+        for fixture in data['api']['fixtures']:
+            if fixture['goalsHomeTeam'] is not None:
+                fixture['goalsHomeTeam'] = rnd.randint(0, 4)
+
+
+def reference_responses():
+    # The responses of countries, leagues/current and teams/league/<api_id> for the data of the database, as the API would return them
+    countries = Country.objects.in_bulk()
+    responses = {'countries' : {'api' : {'countries' : [{'country' : country.name, 'code' : country.code, 'flag' : country.flag} for country in countries.values()]}}}
+    leagues = list()
+    for league in League.objects.all().order_by('id'):
+        leagues.append({'league_id' : league.api_id, 'name' : league.name, 'type' : 'League', 'country' : countries[league.country_id].name if league.country_id else None,
+            'season' : league.season, 'season_start' : league.season_start.isoformat() if league.season_start else None,
+            'season_end' : league.season_end.isoformat() if league.season_end else None, 'logo' : league.logo})
+        teams = Team.objects.filter(Q(hometeam__league=league) | Q(awayteam__league=league)).distinct().order_by('id')
+        responses['teams/league/%d' % league.api_id] = {'api' : {'teams' : [{'team_id' : team.api_id, 'name' : team.name, 'logo' : team.logo,
+            'country' : countries[team.country_id].name if team.country_id else None} for team in teams]}}
+    responses['leagues/current'] = {'api' : {'leagues' : leagues}}
+    return responses
+
+
+# Distribution of goals per team and match, and of the tipps (roughly like real football results)
+GOALS = [0, 1, 2, 3, 4, 5, 6]
+GOALS_WEIGHTS = [25, 33, 23, 12, 5, 1.5, 0.5]
+TIPPS = [(1, 0), (2, 1), (1, 1), (2, 0), (0, 1), (1, 2), (0, 0), (2, 2), (3, 1), (0, 2)]
+TIPPS_WEIGHTS = [14, 16, 15, 10, 8, 10, 6, 7, 8, 6]
+# Status of past fixtures: mostly finished, some after extra time or penalties, few postponed or cancelled
+PAST_STATUS = [('FT', 'Match Finished'), ('AET', 'Match Finished After Extra Time'), ('PEN', 'Match Finished After Penalty'), ('PST', 'Match Postponed'), ('CANC', 'Match Cancelled')]
+PAST_STATUS_WEIGHTS = [93, 3, 2, 1.5, 0.5]
+LIVE_STATUS = [('1H', 'First Half'), ('HT', 'Halftime'), ('2H', 'Second Half')]
+
+
+def generate_data(countries=5, leagues=10, teams=18, fixtures=306, games=20, players=200, games_per_player=3, tipp_ratio=0.8, seed=None):
+    # Fills the database with synthetic data, the numbers of teams and fixtures are per league
+    # Fixtures are spread over a season from 200 days ago to 100 days ahead, finished fixtures have goals, live fixtures have the current score
+    # Every player is active in games_per_player games and tipps tipp_ratio of the fixtures of the leagues of these games
+    # Scores and standings are calculated with UpdateGameScores and UpdateLeaderboard, like after an update from the API
+    rnd = random.Random(seed)
+    now = timezone.now()
+
+    with transaction.atomic():
+        for status_id, name in enumerate(['Creator', 'Active', 'Invited', 'Declined'], 1):
+            PlayerStatus.objects.get_or_create(id=status_id, defaults={'name' : name})
+        if not UpdateSchedule.objects.exists():
+            UpdateSchedule.objects.create(next_league_update=now.date() + timedelta(days=7), next_fixture_update=now.date() + timedelta(days=1), last_fixture_update=now)
+
+        Country.objects.bulk_create([Country(name='Country %d' % i, code='C%d' % i) for i in range(countries)])
+        country_objs = list(Country.objects.order_by('-id')[:countries])
+        first_api_id = (League.objects.order_by('-api_id').values_list('api_id', flat=True).first() or 0) + 1
+        League.objects.bulk_create([League(api_id=first_api_id + i, name='League %d' % i, season=now.year, is_current=True, country=country_objs[i % countries]) for i in range(leagues)])
+        league_objs = list(League.objects.filter(api_id__gte=first_api_id))
+        AvailableLeague.objects.bulk_create([AvailableLeague(api_id=league.api_id) for league in league_objs])
+
+        first_api_id = (Team.objects.order_by('-api_id').values_list('api_id', flat=True).first() or 0) + 1
+        Team.objects.bulk_create([Team(api_id=first_api_id + i, name='Team %d' % i, country=country_objs[i % countries]) for i in range(leagues * teams)])
+        team_ids = list(Team.objects.filter(api_id__gte=first_api_id).values_list('id', flat=True))
+
+        first_api_id = (Fixture.objects.order_by('-api_id').values_list('api_id', flat=True).first() or 0) + 1
+        fixture_objs = list()
+        for league_no, league in enumerate(league_objs):
+            league_teams = team_ids[league_no * teams:(league_no + 1) * teams]
+            for i in range(fixtures):
+                match_start = now - timedelta(days=200) + timedelta(minutes=rnd.randrange(300 * 24 * 60 // 15) * 15)
+                home, away = rnd.sample(league_teams, 2)
+                fixture = Fixture(api_id=first_api_id + len(fixture_objs), league=league, match_start=match_start, home_team_id=home, away_team_id=away, status_short='NS', status='Not Started',
+                    home_odds=round(rnd.uniform(1.2, 6), 2), draw_odds=round(rnd.uniform(2.8, 4.5), 2), away_odds=round(rnd.uniform(1.2, 8), 2))
+                if match_start < now - timedelta(hours=2):
+                    fixture.status_short, fixture.status = rnd.choices(PAST_STATUS, PAST_STATUS_WEIGHTS)[0]
+                elif match_start < now:
+                    fixture.status_short, fixture.status = rnd.choice(LIVE_STATUS)
+                if fixture.status_short not in ('NS', 'PST', 'CANC'):
+                    fixture.home_goals, fixture.away_goals = rnd.choices(GOALS, GOALS_WEIGHTS, k=2)
+                fixture_objs.append(fixture)
+        Fixture.objects.bulk_create(fixture_objs, batch_size=1000)
+        fixtures_per_league = dict()
+        for fixture_id, league_id in Fixture.objects.filter(api_id__gte=first_api_id).values_list('id', 'league_id'):
+            fixtures_per_league.setdefault(league_id, list()).append(fixture_id)
+
+        first_user = User.objects.count()
+        User.objects.bulk_create([User(username='player%d' % (first_user + i), password='!') for i in range(players)])
+        users = User.objects.filter(username__in=['player%d' % (first_user + i) for i in range(players)])
+        Player.objects.bulk_create([Player(user=user, pic='') for user in users])
+        player_ids = list(Player.objects.filter(user__in=users).values_list('id', flat=True))
+
+        Game.objects.bulk_create([Game(name='Game %d' % i, pts_exact=rnd.choice([3, 4, 5]), pts_difference=rnd.choice([2, 3]), pts_winner=rnd.choice([1, 2]), pts_wrong=0,
+            creator_id=rnd.choice(player_ids)) for i in range(games)])
+        game_objs = list(Game.objects.order_by('-id')[:games])
+        game_leagues = {game.id : rnd.sample([league.id for league in league_objs], min(leagues, rnd.randint(1, 3))) for game in game_objs}
+        Game_Leagues.objects.bulk_create([Game_Leagues(game_id=game_id, league_id=league_id) for game_id, league_ids in game_leagues.items() for league_id in league_ids])
+
+        player_games = list()
+        tipp_rows = list()
+        for player_id in player_ids:
+            for game in rnd.sample(game_objs, min(games, games_per_player)):
+                status = 1 if game.creator_id == player_id else rnd.choices([2, 3, 4], [90, 7, 3])[0]
+                player_games.append(Player_Games(game=game, player_id=player_id, status_id=status))
+                if status > 2:
+                    continue
+                for league_id in game_leagues[game.id]:
+                    for fixture_id in fixtures_per_league[league_id]:
+                        if rnd.random() < tipp_ratio:
+                            tipp_rows.append(rnd.choices(TIPPS, TIPPS_WEIGHTS)[0] + (fixture_id, player_id, game.id))
+        Player_Games.objects.bulk_create(player_games, batch_size=1000)
+
+        with connection.cursor() as cursor:
+            for i in range(0, len(tipp_rows), 10000):
+                cursor.executemany('INSERT INTO game_tipp (tipp_home, tipp_away, fixture_id, player_id, game_id, yn_final) VALUES (%s, %s, %s, %s, %s, 0)', tipp_rows[i:i + 10000])
+
+    UpdateGameScores()
+    UpdateLeaderboard()
+    DataChanged()
+
+    return {'fixtures' : len(fixture_objs), 'players' : len(player_ids), 'games' : len(game_objs), 'tipps' : len(tipp_rows)}
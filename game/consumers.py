@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from channels.layers import get_channel_layer
+from django.conf import settings
+from .models import Player
+from .live import LIVE_GROUP, LIVE_MAX_FIXTURES, LIVE_POLL_INTERVAL, fixture_changes
+from .data_utilities import GetDataVersion
+
+logger = logging.getLogger(__name__)
+
+
+@database_sync_to_async
+def get_player_id(user):
+    return Player.objects.filter(user=user).values_list('id', flat=True).first()
+
+
+get_data_version = database_sync_to_async(GetDataVersion)
+get_fixture_changes = database_sync_to_async(fixture_changes)
+
+
+class LiveHub:
+    # The member of the web process in LIVE_GROUP: receives the changes once per process and passes them to the open pages of this process
+    # The pages are registered here per fixture and per player, so a message only costs a dictionary lookup per fixture and player
+    # (a channel and group memberships per page would make the in-memory channel layer scan all of them for every message)
+    # While pages are open the hub also polls the data version, for the updates of other processes (see live.py)
+    # Only values which differ from the last values sent are passed to the pages, a change received by both ways is sent once
+    def __init__(self):
+        self.by_fixture = dict() # fixture_id => set of consumers
+        self.by_player = dict() # player_id => set of consumers
+        self.sent_fixtures = dict() # fixture_id => fixture last sent
+        self.sent_tipps = dict() # player_id => {(game_id, fixture_id) : tipp last sent}
+        self.channel_name = None
+        self.task = None
+        self.poll_task = None
+        self.version = None
+
+    async def subscribe(self, consumer, player_id, fixture_ids):
+        if self.task is None or self.task.done():
+            channel_layer = get_channel_layer()
+            self.channel_name = await channel_layer.new_channel()
+            self.task = asyncio.ensure_future(self.listen(channel_layer))
+        # joined again with every page, memberships of groups expire in the channel layers (group_expiry, one day by default)
+        await get_channel_layer().group_add(LIVE_GROUP, self.channel_name)
+        self.by_player.setdefault(player_id, set()).add(consumer)
+        for fixture_id in fixture_ids:
+            self.by_fixture.setdefault(fixture_id, set()).add(consumer)
+        if self.poll_task is None or self.poll_task.done():
+            self.version = await get_data_version()
+            self.poll_task = asyncio.ensure_future(self.poll())
+
+    def unsubscribe(self, consumer, player_id, fixture_ids):
+        for registry, key in [(self.by_player, player_id)] + [(self.by_fixture, fixture_id) for fixture_id in fixture_ids]:
+            consumers = registry.get(key)
+            if consumers is not None:
+                consumers.discard(consumer)
+                if not consumers:
+                    del registry[key]
+                    (self.sent_tipps if registry is self.by_player else self.sent_fixtures).pop(key, None)
+
+    async def listen(self, channel_layer):
+        while True:
+            message = await channel_layer.receive(self.channel_name)
+            try:
+                await self.dispatch(message)
+            except Exception:
+                logger.exception('Live push to the pages failed')
+
+    async def poll(self):
+        # Ends when the last page is closed, it is started again with the next page
+        while self.by_fixture:
+            await asyncio.sleep(getattr(settings, 'LIVE_POLL_INTERVAL', LIVE_POLL_INTERVAL))
+            try:
+                version = await get_data_version()
+                if version != self.version:
+                    self.version = version
+                    await self.dispatch(await get_fixture_changes(list(self.by_fixture)))
+            except Exception:
+                logger.exception('Live poll of the data version failed')
+
+    async def dispatch(self, message):
+        for fixture in message['fixtures']:
+            consumers = self.by_fixture.get(fixture['id'])
+            if not consumers or self.sent_fixtures.get(fixture['id']) == fixture:
+                continue
+            self.sent_fixtures[fixture['id']] = fixture
+            for consumer in list(consumers):
+                await consumer.send_json({'fixture' : fixture})
+        for player_id, tipps in message['players']:
+            consumers = self.by_player.get(player_id)
+            if not consumers:
+                continue
+            sent = self.sent_tipps.setdefault(player_id, dict())
+            tipps = [tipp for tipp in tipps if sent.get((tipp['game_id'], tipp['fixture_id'])) != tipp]
+            if not tipps:
+                continue
+            sent.update(((tipp['game_id'], tipp['fixture_id']), tipp) for tipp in tipps)
+            for consumer in list(consumers):
+                await consumer.send_json({'tipps' : tipps})
+
+
+hub = LiveHub()
+
+
+class LiveConsumer(AsyncJsonWebsocketConsumer):
+    # WebSocket of the today and gamedetail pages (ws/live?fixtures=1,2,3), receives the changes published by live.publish_changes through the hub
+    # The consumer is asynchronous: an idle connection is only a task waiting for messages, no thread and no database connection
+    channel_layer_alias = None # no channel per page, the hub is the only member of the channel layer
+
+    async def connect(self):
+        self.player_id = None
+        user = self.scope['user']
+        if not user.is_authenticated:
+            await self.close()
+            return
+        player_id = await get_player_id(user)
+        if player_id is None:
+            await self.close()
+            return
+
+        query = parse_qs(self.scope['query_string'].decode())
+        fixture_ids = set()
+        for value in query.get('fixtures', [''])[0].split(','):
+            if value.isdigit():
+                fixture_ids.add(int(value))
+        self.player_id = player_id
+        self.fixture_ids = sorted(fixture_ids)[:LIVE_MAX_FIXTURES]
+        await hub.subscribe(self, self.player_id, self.fixture_ids)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if self.player_id is not None:
+            hub.unsubscribe(self, self.player_id, self.fixture_ids)
+
+    async def receive_json(self, content, **kwargs):
+        # the pages only listen, messages from the browser are ignored
+        pass
@@ -1,101 +1,212 @@
-import sqlite3
-import pandas as pd
-from game.secret import db_name 
-from game.models import Tipp, Fixture
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from game.models import Fixture, UpdateSchedule
+from game.db import serialized_write
 from datetime import datetime, date
+import threading
 
+_scoring_lock = threading.Lock()
+_scoring_stats = {'passes' : 0, 'tipps_rescored' : 0, 'last_pass' : 0}
 
-def GetTippList(game_id, player_id, **kwargs):
-    # Helper function to get a list of all relevant games - I could not get this done via the Django ORM - can be replaced with the TippQuery function
-    # **filterkw can be used to pass some optional filter values
-    # ms_from: date
-    # ms_to: date
-    # match_status: list of status elements
-    # match_status_short: list of status_short elements
+# Outcome of the tipp t compared with the goals of its fixture f, in the order exact result, goal difference, winner, wrong
+# Used for the points of the tipps (UpdateGameScores) and for the counts of the standings (UpdateLeaderboard)
+SQL_OUTCOME = '''CASE
+    WHEN {t}.tipp_home = f.home_goals AND {t}.tipp_away = f.away_goals THEN {exact}
+    WHEN {t}.tipp_home - {t}.tipp_away = f.home_goals - f.away_goals THEN {difference}
+    WHEN ({t}.tipp_home > {t}.tipp_away AND f.home_goals > f.away_goals)
+        OR ({t}.tipp_home < {t}.tipp_away AND f.home_goals < f.away_goals) THEN {winner}
+    ELSE {wrong} END'''
 
-    conn = sqlite3.connect(db_name)
-    sql = 'SELECT * FROM view_tipps WHERE game_id = ? AND player_id = ? '
+# Standings of the players from their tipps, {where} restricts the tipps t (games, players) - also used by the migrations which fill game_leaderboard
+SQL_LEADERBOARD = '''INSERT INTO game_leaderboard (game_id, player_id, score, tipps, exact, difference, winner, wrong, rank)
+    SELECT game_id, player_id, SUM(score), COUNT(id), COUNT(CASE WHEN outcome = 'exact' THEN 1 END), COUNT(CASE WHEN outcome = 'difference' THEN 1 END),
+        COUNT(CASE WHEN outcome = 'winner' THEN 1 END), COUNT(CASE WHEN outcome = 'wrong' THEN 1 END), 1
+    FROM (SELECT t.game_id, t.player_id, t.id, t.score, CASE WHEN t.score IS NULL THEN NULL ELSE ''' + SQL_OUTCOME.format(t='t', exact="'exact'", difference="'difference'", winner="'winner'", wrong="'wrong'") + ''' END AS outcome
+        FROM game_tipp AS t
+        JOIN game_fixture AS f ON f.id = t.fixture_id
+        WHERE 1 = 1 {where})
+    GROUP BY game_id, player_id
+    ON CONFLICT (game_id, player_id) DO UPDATE SET score = excluded.score, tipps = excluded.tipps, exact = excluded.exact,
+        difference = excluded.difference, winner = excluded.winner, wrong = excluded.wrong'''
 
-    df_tipplist = pd.read_sql(sql,params=[game_id, player_id], con=conn)
+# rank = 1 + number of players of the game with a higher score, players without score are ranked last
+SQL_RANK = '''UPDATE game_leaderboard SET rank = 1 + (SELECT COUNT(*) FROM game_leaderboard AS lb WHERE lb.game_id = game_leaderboard.game_id
+    AND lb.score IS NOT NULL AND (game_leaderboard.score IS NULL OR lb.score > game_leaderboard.score))'''
 
-    df_tipplist['match_start'] = pd.to_datetime(df_tipplist.match_start)
-    df_tipplist['match_day'] = df_tipplist['match_start'].dt.date
 
-    if 'ms_from' in kwargs:
-        df_tipplist = df_tipplist[df_tipplist.match_day >= kwargs['ms_from']]
-
-    if 'ms_to' in kwargs:
-        df_tipplist = df_tipplist[df_tipplist.match_day <= kwargs['ms_to']]
-
-    cur = conn.cursor()
-    sql = sql + ' AND match_start >= ? AND match_start <= ? ORDER BY match_start'
-    cur.execute(sql, (game_id, player_id, kwargs['ms_from'].strftime('%Y-%m-%d'),kwargs['ms_to'].strftime('%Y-%m-%d') ))
-    
-    qs = cur.fetchall()
-
-    return qs
-    # return df_tipplist.sort_values(by=['match_start'])  # using a dataframe in the template did not work.
-
-
-def UpdateGameScores():
+@serialized_write
+def UpdateGameScores(fixture_ids=None):
     # This function is used to update the scores of each player and is called after each refresh of the API data
+    # fixture_ids: only tipps on these fixtures are scored (the fixtures whose goals or status changed in the refresh), None scores all fixtures
     # The score for matches which have finished are marked as final, scores for ongoing matches could still change
-    # A fixture is considered finished if it has a status_short of 'FT','AET','PEN', 'ABD' or 'AWD'
+    # A fixture is considered finished if it has a status_short of 'FT','AET','PEN', 'ABD' or 'AWD' (not if status_short is NULL)
     # Only fixtures which have a "not null" value for home_goals are considered (whenever a match has started, the goals become not null)
     # A Draw will always get scores for the correct goal difference (0 in that case)
-
-    # Get all scores which are not set to final (this includes NULL scores as well)
-    scores = Tipp.objects.all().filter(yn_final=False, fixture__home_goals__isnull=False)
+    # All tipps are scored with one UPDATE statement, the CASE expression follows the order exact result, goal difference, winner, wrong
+    # Returns the number of tipps which have been scored
 
     # List of status codes for a score to be final
     li_status = ['FT','AET','PEN', 'ABD', 'AWD']
 
-    for score in scores:
+    sql_points = SQL_OUTCOME.format(t='game_tipp', exact='g.pts_exact', difference='g.pts_difference', winner='g.pts_winner', wrong='g.pts_wrong')
+    sql = '''UPDATE game_tipp SET (score, yn_final) = (
+            SELECT ''' + sql_points + ''',
+                COALESCE(f.status_short IN (%s), 0)
+            FROM game_fixture AS f
+            JOIN game_game AS g ON g.id = game_tipp.game_id
+            WHERE f.id = game_tipp.fixture_id)
+        WHERE yn_final = 0 AND fixture_id IN (SELECT id FROM game_fixture WHERE home_goals IS NOT NULL AND away_goals IS NOT NULL)''' % ', '.join(['%s'] * len(li_status))
 
-        # Determine winner or draw of fixture
-        if score.fixture.home_goals > score.fixture.away_goals:
-            f_winner = 'H'
-        elif score.fixture.home_goals < score.fixture.away_goals:
-            f_winner = 'A'
+    rescored = 0
+    with connection.cursor() as cursor:
+        if fixture_ids is None:
+            cursor.execute(sql, li_status)
+            rescored = cursor.rowcount
+            if rescored > 0:
+                UpdateLeaderboard()
         else:
-            f_winner = 'D'
+            # the fixture ids are passed in chunks, SQLite limits the number of parameters per statement
+            fixture_ids = list(fixture_ids)
+            players = dict() # players per game whose standings have to be updated
+            for i in range(0, len(fixture_ids), 500):
+                chunk = fixture_ids[i:i + 500]
+                cursor.execute(sql + ' AND fixture_id IN (%s)' % ', '.join(['%s'] * len(chunk)), li_status + chunk)
+                if cursor.rowcount > 0:
+                    rescored += cursor.rowcount
+                    cursor.execute('SELECT DISTINCT game_id, player_id FROM game_tipp WHERE fixture_id IN (%s)' % ', '.join(['%s'] * len(chunk)), chunk)
+                    for game_id, player_id in cursor.fetchall():
+                        players.setdefault(game_id, set()).add(player_id)
 
-        # same for the tipp
-        if score.tipp_home > score.tipp_away:
-            t_winner = 'H'
-        elif score.tipp_home < score.tipp_away:
-            t_winner = 'A'
-        else:
-            t_winner = 'D'
-
-        if (score.tipp_home == score.fixture.home_goals) and (score.tipp_away == score.fixture.away_goals):
-            # Points exact match
-            Tipp.objects.filter(id=score.id).update(score = score.game.pts_exact)
-        elif (score.tipp_home - score.tipp_away) == (score.fixture.home_goals - score.fixture.away_goals):
-            # Points for goal difference
-            Tipp.objects.filter(id=score.id).update(score = score.game.pts_difference)
-        elif f_winner == t_winner:
-            # Points for winner, a draw will never end here, because it would have the correct goal difference (0)
-            Tipp.objects.filter(id=score.id).update(score = score.game.pts_winner)
+            for game_id, player_ids in players.items():
+                UpdateLeaderboard(game_id, player_ids)
+
+    return count_scoring_pass(rescored)
+
+
+@serialized_write
+def UpdateLeaderboard(game_id=None, player_ids=None):
+    # Updates the standings in the table game_leaderboard, called after scores have changed and after tipps have been created or deleted
+    # game_id: only the standings of this game are updated, None updates all games
+    # player_ids: only the rows of these players are aggregated again, the ranks of all players of the game are updated
+    # The counts for exact, difference, winner and wrong are the outcomes of the scored tipps (SQL_OUTCOME), games can give the same points for two outcomes
+
+    filters = list() # (column, values) to restrict the tipps and the standings
+    if game_id is not None:
+        filters.append(('game_id', [game_id]))
+        if player_ids is not None:
+            filters.append(('player_id', list(player_ids)))
+    sql_where = ''.join(' AND %s IN (%s)' % (column, ', '.join(['%s'] * len(values))) for column, values in filters)
+    sql_where_tipps = ''.join(' AND t.%s IN (%s)' % (column, ', '.join(['%s'] * len(values))) for column, values in filters)
+    params = [value for column, values in filters for value in values]
+
+    with connection.cursor() as cursor:
+        # players without tipps are removed from the standings
+        cursor.execute('''DELETE FROM game_leaderboard
+            WHERE NOT EXISTS (SELECT 1 FROM game_tipp AS t WHERE t.game_id = game_leaderboard.game_id AND t.player_id = game_leaderboard.player_id)''' + sql_where, params)
+
+        cursor.execute(SQL_LEADERBOARD.format(where=sql_where_tipps), params)
+
+        if game_id is not None:
+            cursor.execute(SQL_RANK + ' WHERE game_id = %s', [game_id])
         else:
-            # Points for wrong tipp
-            Tipp.objects.filter(id=score.id).update(score=score.game.pts_wrong)
+            cursor.execute(SQL_RANK)
+
+
+def SaveTipps(player_id, tipps):
+    # Creates or changes many tipps of a player at once (bulk tipp form), tipps is a dict {(game_id, fixture_id) : (tipp_home, tipp_away)}
+    # One query checks for all fixtures that the player is active in the game, the fixture belongs to a league of the game and the match has not started,
+    # all tipps are written with one upsert (unique constraint on game, player and fixture) in the same transaction
+    # Returns a dict with the number of tipps saved (new or changed) and the keys of the tipps which were refused: started (match has started) and unknown
+    result = {'saved' : 0, 'started' : list(), 'unknown' : list()}
+    if not tipps:
+        return result
+    fixture_ids = sorted(set(fixture_id for game_id, fixture_id in tipps))
+    placeholders = ', '.join(['%s'] * len(fixture_ids))
 
-        # Set score to final only if match is finished (False is the default value for yn_score )
-        if score.fixture.status_short in li_status:
-            Tipp.objects.filter(id=score.id).update(yn_final=True)
-      
-    return scores.count()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('''SELECT gl.game_id, f.id, f.match_start > %s
+            FROM game_fixture AS f
+            JOIN game_game_leagues AS gl ON gl.league_id = f.league_id
+            JOIN game_player_games AS pg ON pg.game_id = gl.game_id AND pg.player_id = %s AND pg.status_id <= 2
+            WHERE f.id IN (''' + placeholders + ')', [datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'), player_id] + fixture_ids) # Match starts are stored in UTC
+        open_tipps = dict(((game_id, fixture_id), bool(yn_open)) for game_id, fixture_id, yn_open in cursor.fetchall())
 
+        rows = list()
+        for key, (tipp_home, tipp_away) in tipps.items():
+            if key not in open_tipps:
+                result['unknown'].append(key)
+            elif not open_tipps[key]:
+                result['started'].append(key)
+            else:
+                rows.append([key[0], player_id, key[1], tipp_home, tipp_away])
+        if not rows:
+            return result
 
+        # unchanged tipps are not written again
+        cursor.executemany('''INSERT INTO game_tipp (game_id, player_id, fixture_id, tipp_home, tipp_away, yn_final) VALUES (%s, %s, %s, %s, %s, 0)
+            ON CONFLICT (game_id, player_id, fixture_id) DO UPDATE SET tipp_home = excluded.tipp_home, tipp_away = excluded.tipp_away
+            WHERE tipp_home <> excluded.tipp_home OR tipp_away <> excluded.tipp_away''', rows)
+        result['saved'] = max(cursor.rowcount, 0)
+        if result['saved']:
+            for game_id in sorted(set(row[0] for row in rows)):
+                UpdateLeaderboard(game_id, [player_id]) # the number of tipps has changed
 
-def TippQuery(**kwargs):
+    return result
+
+
+def count_scoring_pass(rescored):
+    # Counters for the scoring passes (per process), returns the number of tipps rescored in this pass
+    with _scoring_lock:
+        _scoring_stats['passes'] += 1
+        _scoring_stats['tipps_rescored'] += rescored
+        _scoring_stats['last_pass'] = rescored
+    return rescored
+
+
+def scoring_stats():
+    # Returns a copy of the counters of the scoring passes
+    with _scoring_lock:
+        return dict(_scoring_stats)
+
+
+
+@serialized_write
+def DataChanged():
+    # Called after the data shown on the pages has changed: updates from the API (after the scoring), tipps created, changed or deleted, games joined
+    # The data version is part of the keys of the fragment cache and of the ETag of the JSON API, so nothing rendered from older data is served again
+    # It has to be called after the change is committed: a page reads the version before its data, a fragment stored with the new version is never older
+    UpdateSchedule.objects.update(data_version=F('data_version') + 1, last_data_update=timezone.now())
+
+
+def GetDataVersion(request=None):
+    # Returns data_version and last_data_update, read once per request
+    if request is not None and hasattr(request, 'data_version'):
+        return request.data_version
+    version = UpdateSchedule.objects.values_list('data_version', 'last_data_update').first() or (0, None)
+    if request is not None:
+        request.data_version = version
+    return version
+
+
+def GetFixtureTipps(request=None, **kwargs):
     # This query is used to return details of fixtures and (if available) tipps for specific games and players
     # As this involves going through a multitude of relations in the database, it was implemented using a the "raw" method
+    # The result is a list (the query runs once), it is cached on the request, so the same query is not run twice for one page
     # Optional Parameters are:
-    # integers: player_id, 
-    # date objects: from_date, to_date
-    # returns a RawQuerySet which can be used in templates to render a page
+    # integers: player_id, game_id
+    # date objects: from_date, to_date (including a fixture starting at this time), before_date (only fixtures starting before this time)
+    # order: 'ASC' (default) or 'DESC' by match start
+    # keyset pagination: limit (number of fixtures) and after (id of the last fixture of the previous page),
+    # the next page starts after this fixture in the order of (match_start, fixture id)
+    # returns a list of Fixture objects with the additional fields of the query, which can be used in templates to render a page
+
+    cache_key = tuple(sorted(kwargs.items()))
+    if request is not None:
+        if not hasattr(request, 'fixture_tipps_cache'):
+            request.fixture_tipps_cache = dict()
+        if cache_key in request.fixture_tipps_cache:
+            return request.fixture_tipps_cache[cache_key]
 
     sql = '''SELECT f.id AS id, g.id AS game_id, pg.player_id AS player_id, f.match_start, f.status, f.status_short, f.home_goals, f.away_goals, f.home_odds, f.draw_odds, f.away_odds,
         ht.name AS ht_name, ht.logo AS ht_logo, awt.name AS at_name, awt.logo AS at_logo, l.name AS l_name, l.logo AS l_logo, g.name AS g_name, t.id AS tipp_id, t.tipp_home, t.tipp_away, t.score, t.yn_final
@@ -127,14 +238,41 @@ def TippQuery(**kwargs):
         sql_where = sql_where + ' AND f.match_start <= %s '
         list_where.append(kwargs['to_date'].strftime('%Y-%m-%d %H:%M:%S'))
 
-    if 'order' in kwargs:
-        sql_order = kwargs['order']
+    if 'before_date' in kwargs:
+        sql_where = sql_where + ' AND f.match_start < %s '
+        list_where.append(kwargs['before_date'].strftime('%Y-%m-%d %H:%M:%S'))
+
+    if kwargs.get('order') == 'DESC':
+        sql_order = 'DESC'
+        sql_after = '<'
     else:
         sql_order = 'ASC'
+        sql_after = '>'
 
-    sql = sql + sql_where + ' ORDER BY f.match_start ' + sql_order
+    if kwargs.get('after') is not None:
+        # keyset pagination: (match_start, id) of the last fixture of the previous page, compared with the value as stored in the database
+        last = Fixture.objects.all().filter(id=kwargs['after']).values_list('match_start', 'id').first()
+        if last is not None:
+            sql_where = sql_where + ' AND (f.match_start, f.id) ' + sql_after + ' (%s, %s) '
+            list_where += [connection.ops.adapt_datetimefield_value(last[0]), last[1]]
 
-    fixtures = Fixture.objects.raw(sql, list_where)
+    sql = sql + sql_where + ' ORDER BY f.match_start ' + sql_order + ', f.id ' + sql_order
+
+    if 'limit' in kwargs:
+        sql = sql + ' LIMIT %s'
+        list_where.append(kwargs['limit'])
+
+    fixtures = list(Fixture.objects.raw(sql, list_where))
+
+    if request is not None:
+        request.fixture_tipps_cache[cache_key] = fixtures
 
     return fixtures
 
+
+def SplitStarted(fixtures):
+    # Splits a list of fixtures (e.g. from GetFixtureTipps) in the fixtures which have already started and the fixtures which are still to start
+    now = timezone.now()
+    started = [fixture for fixture in fixtures if fixture.match_start is not None and fixture.match_start <= now]
+    tostart = [fixture for fixture in fixtures if fixture.match_start is None or fixture.match_start > now]
+    return started, tostart
@@ -0,0 +1,100 @@
+import queue
+import atexit
+import functools
+import threading
+from contextlib import ExitStack
+from concurrent.futures import Future
+from django.conf import settings
+from django.db import connection
+
+# Database setup for concurrent use of SQLite by the web server and the background runner (manage.py run_updates)
+# - every connection uses WAL (readers are not blocked by a writer and the writer is not blocked by readers),
+#   synchronous=NORMAL (no fsync per commit in WAL mode) and a busy timeout (a writer waits for the lock instead of failing with "database is locked")
+# - the writes of ingestion and scoring run one after the other in one writer thread (serialized_write), so they never contend with each other
+
+# Default values, can be overwritten in settings.py (or local_settings.py)
+SQLITE_BUSY_TIMEOUT = 20 # seconds, used if DATABASES['default']['OPTIONS'] has no timeout
+SQLITE_SYNCHRONOUS = 'NORMAL'
+SERIALIZED_WRITES = True # False executes the writes in the calling thread
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    # Receiver of the signal connection_created (see GameConfig.ready), sets the pragmas of every new SQLite connection
+    if connection.vendor != 'sqlite':
+        return
+    timeout = connection.settings_dict.get('OPTIONS', {}).get('timeout', getattr(settings, 'SQLITE_BUSY_TIMEOUT', SQLITE_BUSY_TIMEOUT))
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=%s' % getattr(settings, 'SQLITE_SYNCHRONOUS', SQLITE_SYNCHRONOUS))
+        cursor.execute('PRAGMA busy_timeout=%d' % int(timeout * 1000))
+
+
+class DatabaseWriter:
+    # Executes functions which write to the database one after the other in one thread, the caller waits for the result
+    # Functions are executed directly (in the calling thread) if they are called from the writer thread itself (nested writes)
+    # or inside a transaction of the caller (the writer could not see the uncommitted data and would wait for the lock of the caller)
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='database-writer', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        database = None
+        while True:
+            func, args, kwargs, wrappers, future = self.queue.get()
+            if func is None:
+                # stop: the connection is closed when the process ends
+                connection.close()
+                future.set_result(None)
+                return
+            # the connection stays open between the writes (like the connections of the requests, CONN_MAX_AGE), it is only replaced
+            # if it is unusable or obsolete or if the database has been changed meanwhile (e.g. test and benchmark databases)
+            if database != connection.settings_dict['NAME']:
+                connection.close()
+                database = connection.settings_dict['NAME']
+            connection.close_if_unusable_or_obsolete()
+            try:
+                with ExitStack() as stack:
+                    for wrapper in wrappers:
+                        stack.enter_context(connection.execute_wrapper(wrapper))
+                    result = func(*args, **kwargs)
+                future.set_result(result)
+            except BaseException as e:
+                future.set_exception(e)
+
+    def stop(self):
+        # Waits for the writes in the queue and ends the writer thread (at exit of the process)
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                return
+            future = Future()
+            self.queue.put((None, None, None, None, future))
+        future.result()
+        self.thread.join()
+
+    def submit(self, func, *args, **kwargs):
+        if not getattr(settings, 'SERIALIZED_WRITES', SERIALIZED_WRITES) or threading.current_thread() is self.thread or connection.in_atomic_block:
+            return func(*args, **kwargs)
+        self.start()
+        future = Future()
+        # the execute wrappers of the caller (e.g. the SQL metrics of the request, middleware.py) also see the statements of the writer
+        self.queue.put((func, args, kwargs, list(connection.execute_wrappers), future))
+        return future.result()
+
+
+writer = DatabaseWriter()
+atexit.register(writer.stop)
+
+
+def serialized_write(func):
+    # Decorator for functions of ingestion and scoring which write to the database: they are executed by the writer thread
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return writer.submit(func, *args, **kwargs)
+    return wrapper
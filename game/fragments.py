@@ -0,0 +1,76 @@
+import threading
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+from .data_utilities import GetDataVersion
+
+# Cache of rendered page fragments (fixture tables, ranking lists)
+# The key contains the data version (see data_utilities.DataChanged): after an update from the API or a change of tipps the pages use new keys,
+# the old fragments are never read again and expire. Fragments which depend on the time (fixtures move to "started" at kickoff) expire at the next kickoff.
+
+# Default values, can be overwritten in settings.py (or local_settings.py)
+FRAGMENT_CACHE_TTL = 3600 # seconds, the longest time a fragment is kept
+FRAGMENT_CACHE_ENABLED = True
+
+# The fragments are cached for all sessions, the csrf token of the forms in a fragment is replaced by the token of the request when it is served
+CSRF_PLACEHOLDER = 'csrf-token-of-the-request'
+
+# Counters of the fragment cache (per process)
+_stats_lock = threading.Lock()
+_stats = {'hits' : 0, 'misses' : 0}
+
+
+def fragment_stats():
+    # Returns the counters and the hit ratio of this process
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats['hits'] + stats['misses']
+    stats['ratio'] = stats['hits'] / total if total else None
+    return stats
+
+
+def count(request, hit):
+    name = 'hits' if hit else 'misses'
+    with _stats_lock:
+        _stats[name] += 1
+    # the counters of the request are written to the log line and the Server-Timing header by the InstrumentationMiddleware
+    if not hasattr(request, 'fragment_stats'):
+        request.fragment_stats = {'hits' : 0, 'misses' : 0}
+    request.fragment_stats[name] += 1
+
+
+def kickoff_ttl(match_starts):
+    # Seconds until the next of the match starts (a fixture which starts changes how it is shown), at most FRAGMENT_CACHE_TTL
+    ttl = getattr(settings, 'FRAGMENT_CACHE_TTL', FRAGMENT_CACHE_TTL)
+    now = timezone.now()
+    upcoming = [match_start for match_start in match_starts if match_start is not None and match_start > now]
+    if upcoming:
+        ttl = min(ttl, max(1, int((min(upcoming) - now).total_seconds()) + 1))
+    return ttl
+
+
+def render_fragment(template, ctx):
+    # Renders a fragment without the request, forms get the csrf placeholder
+    ctx = dict(ctx, csrf_token=CSRF_PLACEHOLDER)
+    return render_to_string(template, ctx)
+
+
+def cached_fragment(request, name, key, render):
+    # Returns the fragment name for the key parts (e.g. game and player) and a dict of data stored with it (e.g. counts for the page)
+    # render() is only called if the fragment is not in the cache, it returns the html, the ttl in seconds (None: FRAGMENT_CACHE_TTL) and the data dict
+    enabled = getattr(settings, 'FRAGMENT_CACHE_ENABLED', FRAGMENT_CACHE_ENABLED)
+    cache_key = 'fragment:%s:%s:%s' % (name, GetDataVersion(request)[0], ':'.join(str(part) for part in key))
+    cached = cache.get(cache_key) if enabled else None
+    count(request, cached is not None)
+    if cached is None:
+        html, ttl, data = render()
+        cached = (html, data)
+        if enabled:
+            cache.set(cache_key, cached, ttl or getattr(settings, 'FRAGMENT_CACHE_TTL', FRAGMENT_CACHE_TTL))
+    html, data = cached
+    if CSRF_PLACEHOLDER in html:
+        html = html.replace(CSRF_PLACEHOLDER, get_token(request))
+    return mark_safe(html), data
@@ -0,0 +1,63 @@
+from django.db import connection
+
+# Identity map of the ingestion: keys of the API => primary keys of countries (by name), leagues and teams (by api id)
+# A mapping is loaded with one query the first time it is used and kept for the whole run (see scheduled_update), the write functions
+# add the rows they insert, so the upserts and the fixtures resolve the ids in memory without a query per row
+# The maps are only changed by the ingestion, which runs one at a time (update lock) and writes in one thread (serialized_write)
+
+# name : (key column, table)
+TABLES = {
+    'countries' : ('name', 'game_country'),
+    'leagues' : ('api_id', 'game_league'),
+    'teams' : ('api_id', 'game_team'),
+}
+
+
+class IdentityMap:
+    def __init__(self):
+        self.maps = dict()
+        self.hash_maps = dict()
+
+    def get(self, name):
+        # Returns the dict key => id of the table, loaded with the first call
+        if name not in self.maps:
+            column, table = TABLES[name]
+            with connection.cursor() as cursor:
+                # the lowest id wins if a key is in the table more than once (country names are not unique)
+                cursor.execute('SELECT %s, id FROM %s ORDER BY id DESC' % (column, table))
+                self.maps[name] = dict(cursor.fetchall())
+        return self.maps[name]
+
+    def hashes(self, name):
+        # Returns the dict key => content hash of the rows (see api_data.content_hash), loaded with the first call - only leagues and teams have a hash
+        # The write functions update it after their transaction, so a record which is twice in a run is only written once
+        if name not in self.hash_maps:
+            column, table = TABLES[name]
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT %s, content_hash FROM %s' % (column, table))
+                self.hash_maps[name] = dict(cursor.fetchall())
+        return self.hash_maps[name]
+
+    @property
+    def countries(self):
+        return self.get('countries')
+
+    @property
+    def leagues(self):
+        return self.get('leagues')
+
+    @property
+    def teams(self):
+        return self.get('teams')
+
+    def add_inserted(self, name, keys):
+        # Adds the ids of rows inserted with these keys, read with one query per 500 keys (SQLite limits the number of parameters per statement)
+        # Called after the transaction of the insert, the ids of a transaction which was rolled back are never in the map
+        mapping = self.get(name)
+        column, table = TABLES[name]
+        keys = list(keys)
+        with connection.cursor() as cursor:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                cursor.execute('SELECT %s, id FROM %s WHERE %s IN (%s) ORDER BY id DESC' % (column, table, column, ', '.join(['%s'] * len(chunk))), chunk)
+                mapping.update(cursor.fetchall())
@@ -0,0 +1,57 @@
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Live push of fixture changes to the open today and gamedetail pages (see consumers.LiveConsumer)
+# An update sends one message with the changes to the group LIVE_GROUP, every web process has one member in this group (consumers.LiveHub),
+# which passes the goals and status of a fixture to the pages showing it and the scores of the tipps only to the page of their player
+# The messages only contain what changed, the pages patch their table rows instead of reloading
+# The in-memory channel layer only reaches the hub of the same process (updates started with today/refresh). The updates of manage.py run_updates
+# run in their own process: every hub also reads the data version (data_utilities.DataChanged) every LIVE_POLL_INTERVAL seconds while pages are open
+# and sends the fixtures and tipps of its pages which have changed. With a channel layer shared by the processes (channels_redis) the push is immediate.
+
+LIVE_GROUP = 'live'
+LIVE_MAX_FIXTURES = 200 # fixtures a page can subscribe to, a page shows at most 8 days of fixtures
+LIVE_POLL_INTERVAL = 5 # seconds between the reads of the data version by the hub of a web process, can be overwritten in settings.py
+
+
+def fixture_changes(fixture_ids):
+    # Returns the message for the fixtures whose goals or status changed, with the tipps on these fixtures per player
+    fixture_ids = list(fixture_ids)
+    fixtures = list()
+    players = dict()
+    with connection.cursor() as cursor:
+        # the ids are passed in chunks, SQLite limits the number of parameters per statement
+        for i in range(0, len(fixture_ids), 500):
+            chunk = fixture_ids[i:i + 500]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute('SELECT id, home_goals, away_goals, status, status_short FROM game_fixture WHERE id IN (%s)' % placeholders, chunk)
+            for fixture_id, home_goals, away_goals, status, status_short in cursor.fetchall():
+                fixtures.append({'id' : fixture_id, 'home_goals' : home_goals, 'away_goals' : away_goals, 'status' : status, 'status_short' : status_short})
+            cursor.execute('SELECT player_id, game_id, fixture_id, score, yn_final FROM game_tipp WHERE fixture_id IN (%s)' % placeholders, chunk)
+            for player_id, game_id, fixture_id, score, yn_final in cursor.fetchall():
+                players.setdefault(player_id, list()).append({'game_id' : game_id, 'fixture_id' : fixture_id, 'score' : score, 'final' : bool(yn_final)})
+
+    # the players are a list of pairs, not a dict: the message must also pass channel layers which only allow strings as keys
+    return {'type' : 'live.changes', 'fixtures' : fixtures, 'players' : list(players.items())}
+
+
+def publish_changes(fixture_ids):
+    # Called by update_fixtures after the changed fixtures are written and scored
+    # A failing channel layer must not fail the update, the pages still show the new data with the next page view
+    # Returns the number of fixtures sent
+    if not fixture_ids:
+        return 0
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return 0
+    message = fixture_changes(fixture_ids)
+    try:
+        async_to_sync(channel_layer.group_send)(LIVE_GROUP, message)
+    except Exception:
+        logger.exception('Live push of %d fixtures failed', len(fixture_ids))
+        return 0
+    return len(message['fixtures'])
@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+from game.api_client import api_get_many, cache_key
+from game.benchmarks import stub_api
+from game.models import ApiResponse
+
+
+class Command(BaseCommand):
+    help = 'Runs the API fetch layer against a local stub server and shows the wall-clock time for different concurrency caps'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=32, help='Number of API calls per run')
+        parser.add_argument('--delay', type=float, default=0.1, help='Latency of the stub server in seconds')
+        parser.add_argument('--caps', default='1,2,4,8,16', help='Comma separated list of concurrency caps')
+
+    def handle(self, *args, **options):
+        paths = ['fixtures/date/2021-02-%02d' % (i % 28 + 1) for i in range(options['requests'])]
+        try:
+            with stub_api(delay=options['delay']):
+                self.stdout.write('%d calls, %.3fs latency per call' % (len(paths), options['delay']))
+                self.stdout.write('%8s %10s %10s' % ('cap', 'seconds', 'calls/s'))
+                for cap in [int(c) for c in options['caps'].split(',')]:
+                    # every run has to call the stub server, so the cached responses of the previous run are removed
+                    ApiResponse.objects.filter(url__in=[cache_key(path) for path in paths]).delete()
+                    start = time.perf_counter()
+                    results = api_get_many(paths, max_workers=cap)
+                    duration = time.perf_counter() - start
+                    assert len(results) == len(paths)
+                    self.stdout.write('%8d %10.3f %10.1f' % (cap, duration, len(paths) / duration))
+        finally:
+            ApiResponse.objects.filter(url__in=[cache_key(path) for path in paths]).delete()
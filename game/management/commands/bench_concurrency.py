@@ -0,0 +1,117 @@
+import time
+import random
+import logging
+import threading
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, OperationalError
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from game.models import ApiResponse, Fixture, Player_Games
+from game.api_data import update_fixtures
+from game.benchmarks import benchmark_database, generate_data, stub_api, fixture_responses, change_goals
+from game.db import configure_sqlite
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0
+
+
+class Command(BaseCommand):
+    # Columns: tipps / errors of the tippers, runs / failed of the ingestion ("database is locked")
+    help = 'Simultaneous tippers (tipp view) during ingestion runs (update_fixtures against a stub API) on a throwaway database, with the default SQLite setup and with WAL + serialized writes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tippers', type=int, default=8)
+        parser.add_argument('--tipps', type=int, default=50, help='Tipps per tipper')
+        parser.add_argument('--leagues', type=int, default=10)
+        parser.add_argument('--players', type=int, default=200)
+        parser.add_argument('--modes', default='default,wal', help='default: rollback journal, 5s timeout, writes in the calling threads - wal: the setup of game/db.py')
+
+    def handle(self, *args, **options):
+        logging.getLogger('game').setLevel(logging.WARNING)
+        self.stdout.write('%-8s %8s %8s %10s %10s %10s %8s %8s %10s' % ('mode', 'tipps', 'errors', 'p50 ms', 'p95 ms', 'max ms', 'runs', 'failed', 'ingest s'))
+        for mode in options['modes'].split(','):
+            default = mode == 'default'
+            if default:
+                # SQLite as configured by Django without game/db.py: no pragmas, timeout of the sqlite3 module (5 seconds)
+                connection_created.disconnect(configure_sqlite, dispatch_uid='game.configure_sqlite')
+                saved_options = connection.settings_dict.get('OPTIONS', {})
+                connection.settings_dict['OPTIONS'] = {}
+            try:
+                with benchmark_database():
+                    generate_data(leagues=options['leagues'], players=options['players'], seed=1)
+                    with override_settings(SERIALIZED_WRITES=not default):
+                        result = self.run_mode(options)
+            finally:
+                if default:
+                    connection.settings_dict['OPTIONS'] = saved_options
+                    connection_created.connect(configure_sqlite, dispatch_uid='game.configure_sqlite')
+            self.stdout.write('%-8s %8d %8d %10.1f %10.1f %10.1f %8d %8d %10.2f' % (mode, result['tipps'], result['errors'], percentile(result['latencies'], 0.5) * 1000,
+                percentile(result['latencies'], 0.95) * 1000, max(result['latencies'] or [0]) * 1000, result['runs'], result['failed'], result['ingest']))
+
+    def run_mode(self, options):
+        now = timezone.now()
+        upcoming = dict()
+        for pg in Player_Games.objects.filter(status_id=2).select_related('player__user'):
+            fixtures = list(Fixture.objects.filter(league__games=pg.game_id, match_start__gt=now + timedelta(days=1)).values_list('id', flat=True)[:options['tipps']])
+            if fixtures and pg.player.user_id not in upcoming:
+                upcoming[pg.player.user_id] = (pg.player.user, pg.game_id, fixtures)
+        tippers = list(upcoming.values())[:options['tippers']]
+
+        responses = fixture_responses()
+        rnd = random.Random(1)
+        result = {'tipps' : 0, 'errors' : 0, 'latencies' : list(), 'ingest' : 0.0, 'runs' : 0, 'failed' : 0}
+        lock = threading.Lock()
+        tipping = threading.Event()
+        tipping.set()
+
+        def ingest():
+            # ingestion runs one after the other as long as the tippers are busy
+            try:
+                with stub_api(delay=0, responses=responses):
+                    while tipping.is_set():
+                        change_goals(responses, rnd)
+                        ApiResponse.objects.all().delete()
+                        start = time.perf_counter()
+                        try:
+                            update_fixtures('leagues')
+                        except OperationalError:
+                            result['failed'] += 1
+                        result['ingest'] += time.perf_counter() - start
+                        result['runs'] += 1
+            finally:
+                connection.close()
+
+        def tipp(user, game_id, fixtures):
+            client = Client()
+            client.force_login(user)
+            try:
+                for fixture_id in fixtures:
+                    start = time.perf_counter()
+                    try:
+                        response = client.post('/tipp/%d/%d' % (game_id, fixture_id), {'tipp_home' : rnd.randint(0, 3), 'tipp_away' : rnd.randint(0, 3)})
+                        ok = response.status_code == 302
+                    except OperationalError:
+                        ok = False
+                    with lock:
+                        result['latencies'].append(time.perf_counter() - start)
+                        result['tipps' if ok else 'errors'] += 1
+            finally:
+                connection.close()
+
+        with override_settings(ALLOWED_HOSTS=['*']):
+            ingestion = threading.Thread(target=ingest)
+            ingestion.start()
+            threads = [threading.Thread(target=tipp, args=tipper) for tipper in tippers]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            tipping.clear()
+            ingestion.join()
+
+        return result
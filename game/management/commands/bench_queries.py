@@ -0,0 +1,73 @@
+import time
+from datetime import date, datetime, timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q, Count
+from game.models import League, Leaderboard, Player_Games
+from game.data_utilities import GetFixtureTipps, UpdateGameScores
+from game.benchmarks import benchmark_database, generate_data
+
+# Indexes added for the hot query shapes (migration 0006_query_indexes), dropped with --compare to see the plans without them
+QUERY_INDEXES = ['fixture_league_match_start', 'fixture_match_start', 'player_games_player_status', 'tipp_final_fixture']
+
+
+def view_queries(game_id, player_id):
+    # The queries of the views (and of the scorer), every entry is evaluated completely
+    td = date.today()
+    li_status = ['FT','AET','PEN', 'ABD', 'AWD']
+    return [
+        ('GameDetail: fixtures', lambda: GetFixtureTipps(player_id=player_id, game_id=game_id, from_date=td, to_date=td + timedelta(days=8))),
+        ('GameDetail: leagues', lambda: list(League.objects.all().filter(games=game_id).annotate(finished=Count('fixture', filter=Q(fixture__status_short__in=li_status))))),
+        ('GameDetail / RankingView: standings', lambda: list(Leaderboard.objects.all().filter(game_id=game_id).select_related('player__user').order_by('rank', 'id'))),
+        ('TodayView: fixtures today', lambda: GetFixtureTipps(player_id=player_id, from_date=td, to_date=td + timedelta(days=1))),
+        ('RankingDetailView: history (first page)', lambda: GetFixtureTipps(player_id=player_id, game_id=game_id, to_date=datetime.utcnow(), order='DESC', limit=51)),
+        ('UpdateGameScores: open tipps', lambda: UpdateGameScores()),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Prints EXPLAIN QUERY PLAN and timings of the queries of the views on a large synthetic (throwaway) database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=500)
+        parser.add_argument('--leagues', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--compare', action='store_true', help='Run the queries again without the indexes of 0006_query_indexes')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            sizes = generate_data(players=options['players'], leagues=options['leagues'], seed=1)
+            self.stdout.write('Synthetic database: %s' % ', '.join('%d %s' % (n, name) for name, n in sizes.items()))
+            pg = Player_Games.objects.filter(status_id=2).first()
+
+            self.run_queries(view_queries(pg.game_id, pg.player_id), options['repeat'])
+            if options['compare']:
+                with connection.cursor() as cursor:
+                    for index in QUERY_INDEXES:
+                        cursor.execute('DROP INDEX %s' % index)
+                    cursor.execute('ANALYZE')
+                self.stdout.write('\nWithout the indexes of 0006_query_indexes:')
+                self.run_queries(view_queries(pg.game_id, pg.player_id), options['repeat'])
+
+    def run_queries(self, queries, repeat):
+        for name, run in queries:
+            # the statements are captured on the first run, the plans are printed afterwards
+            statements = list()
+            def capture(execute, sql, params, many, context):
+                statements.append((sql, params))
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(capture):
+                run()
+            timings = list()
+            for i in range(repeat):
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+
+            self.stdout.write('\n%s: best %.2f ms, mean %.2f ms' % (name, min(timings) * 1000, sum(timings) / len(timings) * 1000))
+            with connection.cursor() as cursor:
+                for sql, params in statements:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                    for row in cursor.fetchall():
+                        self.stdout.write('    ' + row[-1])
@@ -0,0 +1,111 @@
+import random
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+from game.models import Country, League, Team, Fixture, Game, Player, Tipp
+from game.data_utilities import UpdateGameScores
+from game.benchmarks import benchmark_database, measure, print_results
+
+
+def legacy_update_scores():
+    # The per-tipp scoring loop UpdateGameScores used before the set-based UPDATE, kept for comparison
+    scores = Tipp.objects.all().filter(yn_final=False, fixture__home_goals__isnull=False)
+    li_status = ['FT','AET','PEN', 'ABD', 'AWD']
+    for score in scores:
+        if score.fixture.home_goals > score.fixture.away_goals:
+            f_winner = 'H'
+        elif score.fixture.home_goals < score.fixture.away_goals:
+            f_winner = 'A'
+        else:
+            f_winner = 'D'
+        if score.tipp_home > score.tipp_away:
+            t_winner = 'H'
+        elif score.tipp_home < score.tipp_away:
+            t_winner = 'A'
+        else:
+            t_winner = 'D'
+
+        if (score.tipp_home == score.fixture.home_goals) and (score.tipp_away == score.fixture.away_goals):
+            Tipp.objects.filter(id=score.id).update(score = score.game.pts_exact)
+        elif (score.tipp_home - score.tipp_away) == (score.fixture.home_goals - score.fixture.away_goals):
+            Tipp.objects.filter(id=score.id).update(score = score.game.pts_difference)
+        elif f_winner == t_winner:
+            Tipp.objects.filter(id=score.id).update(score = score.game.pts_winner)
+        else:
+            Tipp.objects.filter(id=score.id).update(score=score.game.pts_wrong)
+        if score.fixture.status_short in li_status:
+            Tipp.objects.filter(id=score.id).update(yn_final=True)
+
+
+def create_tipps(n_tipps, n_games=10, n_fixtures=1000):
+    # Creates n_tipps tipps: every player of a game tipps every fixture, 80% of the fixtures have goals, 3/4 of these are finished
+    country = Country.objects.create(name='Benchmark')
+    league = League.objects.create(api_id=1, name='Benchmark League', country=country)
+    teams = [Team.objects.create(api_id=i, name='Team %d' % i, country=country) for i in range(40)]
+    now = timezone.now()
+    fixtures = list()
+    for i in range(n_fixtures):
+        home, away = random.sample(teams, 2)
+        fixture = Fixture(api_id=i, league=league, home_team=home, away_team=away, match_start=now - timedelta(hours=i), status_short='NS')
+        if i % 5:
+            fixture.home_goals, fixture.away_goals = random.randint(0, 4), random.randint(0, 4)
+            fixture.status_short = '2H' if i % 4 == 0 else 'FT'
+        fixtures.append(fixture)
+    Fixture.objects.bulk_create(fixtures)
+    fixture_ids = list(Fixture.objects.values_list('id', flat=True))
+
+    n_players = max(1, n_tipps // (n_games * n_fixtures))
+    User.objects.bulk_create([User(username='player%d' % i) for i in range(n_players)])
+    Player.objects.bulk_create([Player(user_id=user.id) for user in User.objects.all()])
+    player_ids = list(Player.objects.values_list('id', flat=True))
+    creator = player_ids[0]
+    # different point rules per game, some games give the same points for different results
+    games = [Game.objects.create(name='Game %d' % i, pts_exact=random.choice([3, 4, 5]), pts_difference=random.choice([2, 3]), pts_winner=random.choice([1, 2]),
+        pts_wrong=random.choice([0, -1]), creator_id=creator) for i in range(n_games)]
+
+    rows = ((random.randint(0, 3), random.randint(0, 3), fixture_id, player_id, game.id, 0)
+        for game in games for player_id in player_ids for fixture_id in fixture_ids)
+    with transaction.atomic(), connection.cursor() as cursor:
+        batch = list()
+        for row in rows:
+            batch.append(row)
+            if len(batch) == 10000:
+                cursor.executemany('INSERT INTO game_tipp (tipp_home, tipp_away, fixture_id, player_id, game_id, yn_final) VALUES (%s, %s, %s, %s, %s, %s)', batch)
+                batch = list()
+        if batch:
+            cursor.executemany('INSERT INTO game_tipp (tipp_home, tipp_away, fixture_id, player_id, game_id, yn_final) VALUES (%s, %s, %s, %s, %s, %s)', batch)
+
+
+def tipp_scores():
+    return list(Tipp.objects.order_by('id').values_list('id', 'score', 'yn_final'))
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks UpdateGameScores against the per-tipp loop it replaced on a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tipps', type=int, default=1000000)
+        parser.add_argument('--legacy-max', type=int, default=20000, help='The per-tipp loop only runs up to this number of tipps')
+
+    def handle(self, *args, **options):
+        results = list()
+        with benchmark_database():
+            create_tipps(options['tipps'])
+            n_tipps = Tipp.objects.count()
+
+            with measure(results, 'set based: %d tipps' % n_tipps):
+                UpdateGameScores()
+
+            if n_tipps <= options['legacy_max']:
+                scores = tipp_scores()
+                Tipp.objects.update(score=None, yn_final=False)
+                with measure(results, 'per tipp: %d tipps' % n_tipps):
+                    legacy_update_scores()
+                if scores != tipp_scores():
+                    self.stderr.write('The set based scores differ from the per tipp scores!')
+                else:
+                    self.stdout.write('The scores of both implementations are identical')
+
+        print_results(self.stdout, results)
@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import subprocess
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Default values, can be overwritten in settings.py (or local_settings.py)
+STARTUP_TIME_BUDGET = 1.0 # seconds
+STARTUP_RSS_BUDGET = 80 # MB
+STARTUP_FORBIDDEN_MODULES = ['pandas', 'numpy', 'requests', 'game.api_data']
+
+# Every target runs in a new Python process (nothing is imported yet), the process prints the time, its peak RSS and the forbidden modules it has loaded
+PROBE = '''
+import sys, json, time, resource
+start = time.perf_counter()
+%s
+seconds = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+print(json.dumps({'seconds' : seconds, 'rss' : rss, 'modules' : len(sys.modules), 'forbidden' : [name for name in %r if name in sys.modules]}))
+'''
+
+TARGETS = {
+    # what a web worker loads before its first response: the WSGI application and the urls with the views (Django loads them with the first request)
+    'wsgi' : '''from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns''',
+    'check' : '''import django
+django.setup()
+from django.core.management import call_command
+call_command('check', verbosity=0)''',
+}
+
+
+class Command(BaseCommand):
+    help = 'Import time and peak RSS of a new process loading the WSGI application or running manage.py check, fails if the budget is exceeded or pandas / requests are loaded'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--targets', default='wsgi,check', help='Comma separated list of %s' % ', '.join(TARGETS))
+        parser.add_argument('--repeat', type=int, default=5, help='Processes per target, the fastest run is compared with the budget')
+        parser.add_argument('--max-seconds', type=float, default=None, help='Time budget (default STARTUP_TIME_BUDGET)')
+        parser.add_argument('--max-rss', type=float, default=None, help='RSS budget in MB (default STARTUP_RSS_BUDGET)')
+
+    def handle(self, *args, **options):
+        targets = options['targets'].split(',')
+        for target in targets:
+            if target not in TARGETS:
+                raise CommandError('Unknown target %s, available targets are %s' % (target, ', '.join(TARGETS)))
+        max_seconds = options['max_seconds'] or getattr(settings, 'STARTUP_TIME_BUDGET', STARTUP_TIME_BUDGET)
+        max_rss = options['max_rss'] or getattr(settings, 'STARTUP_RSS_BUDGET', STARTUP_RSS_BUDGET)
+        forbidden = getattr(settings, 'STARTUP_FORBIDDEN_MODULES', STARTUP_FORBIDDEN_MODULES)
+
+        failures = list()
+        self.stdout.write('%-8s %10s %10s %10s %8s  %s' % ('target', 'best s', 'mean s', 'rss MB', 'modules', 'forbidden modules'))
+        for target in targets:
+            runs = [self.probe(TARGETS[target], forbidden) for i in range(options['repeat'])]
+            seconds = [run['seconds'] for run in runs]
+            rss = max(run['rss'] for run in runs)
+            loaded = sorted(set(name for run in runs for name in run['forbidden']))
+            self.stdout.write('%-8s %10.3f %10.3f %10.1f %8d  %s' % (target, min(seconds), sum(seconds) / len(seconds), rss, runs[-1]['modules'], ', '.join(loaded) or '-'))
+            # the fastest run is compared, the others include the noise of the machine
+            if min(seconds) > max_seconds:
+                failures.append('%s: %.3f s > %.3f s' % (target, min(seconds), max_seconds))
+            if rss > max_rss:
+                failures.append('%s: %.1f MB > %.1f MB' % (target, rss, max_rss))
+            if loaded:
+                failures.append('%s: loads %s' % (target, ', '.join(loaded)))
+
+        if failures:
+            raise CommandError('Startup budget exceeded - %s' % '; '.join(failures))
+        self.stdout.write('Startup budget of %.3f s and %.1f MB met' % (max_seconds, max_rss))
+
+    def probe(self, code, forbidden):
+        # The new process gets the settings of this process (DJANGO_SETTINGS_MODULE) and runs in the project directory
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'football_predict.settings'))
+        result = subprocess.run([sys.executable, '-c', PROBE % (code, list(forbidden))], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise CommandError('Startup probe failed:\n%s' % result.stderr)
+        # settings.py prints a line if there are no local settings, the result is the last line
+        return json.loads(result.stdout.strip().splitlines()[-1])
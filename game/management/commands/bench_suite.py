@@ -0,0 +1,140 @@
+import json
+import sqlite3
+import logging
+import platform
+import django
+from datetime import date, datetime, timedelta
+from django.utils import timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.core.cache import cache
+from game.models import ApiResponse, Fixture, Player_Games, Tipp
+from game.data_utilities import GetFixtureTipps, UpdateGameScores
+from game.api_data import update_fixtures, update_countries, update_leagues, update_teams
+from game.benchmarks import benchmark_database, generate_data, measure, stub_api, fixture_responses, reference_responses
+from game.identity import IdentityMap
+from game.fragments import fragment_stats
+
+# Data sizes of the suite (arguments of generate_data), the number of tipps grows with leagues and players
+SIZES = {
+    'small' : {'leagues' : 4, 'players' : 50, 'games' : 10},
+    'medium' : {'leagues' : 10, 'players' : 200, 'games' : 20},
+    'large' : {'leagues' : 20, 'players' : 1000, 'games' : 50},
+}
+
+
+def reset_scores():
+    Tipp.objects.update(score=None, yn_final=False)
+
+
+def reset_api_cache():
+    ApiResponse.objects.all().delete()
+
+
+class Command(BaseCommand):
+    help = 'Times the hot paths of the game app (queries, scoring, API update, views) on throwaway databases of several sizes and writes the results to JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small,medium', help='Comma separated list of %s' % ', '.join(SIZES))
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', default=None, help='JSON file for the results (default bench_suite_<timestamp>.json)')
+        parser.add_argument('--baseline', default=None, help='JSON file of an earlier run, the results are compared with it')
+
+    def handle(self, *args, **options):
+        sizes = options['sizes'].split(',')
+        for size in sizes:
+            if size not in SIZES:
+                raise CommandError('Unknown size %s, available sizes are %s' % (size, ', '.join(SIZES)))
+        if options['verbosity'] < 2:
+            # the log lines of the middleware and of update_fixtures would hide the results
+            logging.getLogger('game').setLevel(logging.WARNING)
+
+        run = {'started' : datetime.now().isoformat(), 'python' : platform.python_version(), 'django' : django.get_version(), 'sqlite' : sqlite3.sqlite_version,
+            'repeat' : options['repeat'], 'results' : list()}
+        for size in sizes:
+            with benchmark_database():
+                data = generate_data(seed=1, **SIZES[size])
+                self.stdout.write('%s: %s' % (size, ', '.join('%d %s' % (n, name) for name, n in data.items())))
+                for name, setup, bench in self.benchmarks():
+                    timings = list()
+                    for i in range(options['repeat']):
+                        setup()
+                        with measure(timings, name):
+                            bench()
+                    seconds = [timing['seconds'] for timing in timings]
+                    result = {'size' : size, 'name' : name, 'best' : min(seconds), 'mean' : sum(seconds) / len(seconds), 'queries' : timings[-1]['queries']}
+                    result.update(data)
+                    run['results'].append(result)
+
+        output = options['output'] or 'bench_suite_%s.json' % datetime.now().strftime('%Y%m%d_%H%M%S')
+        with open(output, 'w') as f:
+            json.dump(run, f, indent=2)
+
+        baseline = dict()
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = {(result['size'], result['name']) : result for result in json.load(f)['results']}
+
+        self.stdout.write('\n%-8s %-36s %10s %10s %8s %8s' % ('size', 'benchmark', 'best ms', 'mean ms', 'queries', 'vs base'))
+        for result in run['results']:
+            base = baseline.get((result['size'], result['name']))
+            ratio = '%7.2fx' % (result['best'] / base['best']) if base else ''
+            self.stdout.write('%-8s %-36s %10.2f %10.2f %8d %8s' % (result['size'], result['name'], result['best'] * 1000, result['mean'] * 1000, result['queries'], ratio))
+        stats = fragment_stats()
+        self.stdout.write('\nFragment cache: %d hits, %d misses, hit ratio %s' % (stats['hits'], stats['misses'], '%.0f%%' % (stats['ratio'] * 100) if stats['ratio'] is not None else '-'))
+        self.stdout.write('Results written to %s' % output)
+
+    def benchmarks(self):
+        # (name, setup, benchmark) - setup runs before every run of the benchmark and is not timed
+        pg = Player_Games.objects.filter(status_id=2).select_related('player__user').first()
+        td = date.today()
+        client = Client()
+        client.force_login(pg.player.user)
+        nothing = lambda: None
+        responses = fixture_responses()
+        responses.update(reference_responses())
+
+        def get(url):
+            with override_settings(ALLOWED_HOSTS=['*']):
+                response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError('%s returned %d' % (url, response.status_code))
+
+        # the bulk tipp form with all open fixtures of the game in the next 8 days, the tipps of the player on these fixtures are removed before every run
+        open_fixtures = list(Fixture.objects.filter(league__games=pg.game_id, match_start__gt=timezone.now(), match_start__lt=td + timedelta(days=8)).values_list('id', flat=True))
+        bulk_form = {'tipp_%s_%d_%d' % (side, pg.game_id, fixture_id) : 1 for fixture_id in open_fixtures for side in ('home', 'away')}
+
+        def remove_open_tipps():
+            Tipp.objects.filter(game_id=pg.game_id, player_id=pg.player_id, fixture_id__in=open_fixtures).delete()
+
+        def bulk_tipps():
+            with override_settings(ALLOWED_HOSTS=['*']):
+                response = client.post('/tipp/bulk?game=%d' % pg.game_id, bulk_form)
+            if response.status_code != 302:
+                raise CommandError('tipp/bulk returned %d' % response.status_code)
+
+        def api_update():
+            with stub_api(delay=0, responses=responses):
+                update_fixtures('leagues')
+
+        def reference_update():
+            # countries, leagues and teams with one identity map, like scheduled_update
+            ids = IdentityMap()
+            with stub_api(delay=0, responses=responses):
+                update_countries(ids)
+                update_leagues(ids)
+                update_teams(ids)
+
+        return [
+            ('GetFixtureTipps: game, 8 days', nothing, lambda: GetFixtureTipps(player_id=pg.player_id, game_id=pg.game_id, from_date=td, to_date=td + timedelta(days=8))),
+            ('GetFixtureTipps: history', nothing, lambda: GetFixtureTipps(player_id=pg.player_id, game_id=pg.game_id, to_date=datetime.utcnow(), order='DESC')),
+            ('UpdateGameScores: all tipps', reset_scores, UpdateGameScores),
+            ('update_fixtures: leagues (stub API)', reset_api_cache, api_update),
+            ('countries, leagues, teams (stub API)', reset_api_cache, reference_update),
+            ('RankingView', nothing, lambda: get('/ranking/%d' % pg.game_id)),
+            ('RankingView: empty fragment cache', cache.clear, lambda: get('/ranking/%d' % pg.game_id)),
+            ('GameDetail', nothing, lambda: get('/gamedetail/%d' % pg.game_id)),
+            ('GameDetail: empty fragment cache', cache.clear, lambda: get('/gamedetail/%d' % pg.game_id)),
+            ('TippBulkView: %d tipps' % len(open_fixtures), remove_open_tipps, bulk_tipps),
+        ]
@@ -0,0 +1,87 @@
+import random
+import pandas as pd
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+from django.utils.timezone import make_aware
+from game.models import Country, League, Team, Fixture
+from game.api_data import write_fixtures
+from game.benchmarks import benchmark_database, measure, print_results
+
+
+def legacy_write_fixtures(df_fixtures, mode):
+    # The per-row write loop update_fixtures used before write_fixtures, kept for comparison
+    for tu_fixture in df_fixtures.itertuples(index=False):
+        fo = Fixture.objects.all().filter(api_id = tu_fixture.fixture_id)
+        if fo.count() == 0:
+            league = League.objects.all().filter(id = tu_fixture.my_league_id).first()
+            h_team = Team.objects.all().filter(id=tu_fixture.my_homeTeam_id).first()
+            a_team = Team.objects.all().filter(id=tu_fixture.my_awayTeam_id).first()
+            fnew = Fixture(api_id=tu_fixture.fixture_id, league=league, match_start=tu_fixture.dt_event_date, status=tu_fixture.status, status_short=tu_fixture.statusShort, home_team=h_team, away_team=a_team)
+            if not pd.isna(tu_fixture.goalsHomeTeam):
+                fnew.home_goals = int(tu_fixture.goalsHomeTeam)
+            if not pd.isna(tu_fixture.goalsAwayTeam):
+                fnew.away_goals = int(tu_fixture.goalsAwayTeam)
+            if not pd.isna(tu_fixture.home_win):
+                fnew.home_odds = tu_fixture.home_win
+            if not pd.isna(tu_fixture.draw):
+                fnew.draw_odds = tu_fixture.draw
+            if not pd.isna(tu_fixture.away_win):
+                fnew.away_odds = tu_fixture.away_win
+            fnew.save()
+        else:
+            fo.update(match_start=tu_fixture.dt_event_date, status=tu_fixture.status, status_short=tu_fixture.statusShort)
+            if not pd.isna(tu_fixture.goalsHomeTeam):
+                fo.update(home_goals = int(tu_fixture.goalsHomeTeam))
+            if not pd.isna(tu_fixture.goalsAwayTeam):
+                fo.update(away_goals = int(tu_fixture.goalsAwayTeam))
+            if mode == 'days':
+                if not pd.isna(tu_fixture.home_win):
+                    fo.update(home_odds = tu_fixture.home_win)
+                if not pd.isna(tu_fixture.draw):
+                    fo.update(draw_odds = tu_fixture.draw)
+                if not pd.isna(tu_fixture.away_win):
+                    fo.update(away_odds = tu_fixture.away_win)
+
+
+def synthetic_fixtures(n, league, teams):
+    # DataFrame in the shape update_fixtures passed to the per row loop (write_fixtures gets its rows as dicts), about half of the fixtures are finished
+    rows = list()
+    start = make_aware(datetime.now()) - timedelta(days=n // 20)
+    for i in range(n):
+        home, away = random.sample(teams, 2)
+        finished = i < n // 2
+        rows.append({'fixture_id' : 100000 + i, 'event_date' : None, 'status' : 'Match Finished' if finished else 'Not Started', 'statusShort' : 'FT' if finished else 'NS',
+            'goalsHomeTeam' : random.randint(0, 4) if finished else None, 'goalsAwayTeam' : random.randint(0, 4) if finished else None,
+            'dt_event_date' : start + timedelta(hours=i), 'my_league_id' : league.id, 'my_homeTeam_id' : home.id, 'my_awayTeam_id' : away.id,
+            'home_win' : round(random.uniform(1.2, 6), 2), 'draw' : round(random.uniform(2.5, 5), 2), 'away_win' : None if i % 10 == 0 else round(random.uniform(1.2, 6), 2)})
+    return pd.DataFrame(rows)
+
+
+class Command(BaseCommand):
+    help = 'Compares SQL statements and time of the fixture write path before (per row) and after (bulk) on a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fixtures', type=int, default=3000)
+        parser.add_argument('--mode', default='days')
+
+    def handle(self, *args, **options):
+        results = list()
+        with benchmark_database():
+            country = Country.objects.create(name='Benchmark')
+            league = League.objects.create(api_id=1, name='Benchmark League', country=country)
+            teams = [Team.objects.create(api_id=i, name='Team %d' % i, country=country) for i in range(40)]
+            df_fixtures = synthetic_fixtures(options['fixtures'], league, teams)
+
+            for name, write in (('per row', legacy_write_fixtures), ('bulk', lambda df, mode: write_fixtures(df.to_dict('records'), mode))):
+                Fixture.objects.all().delete()
+                with measure(results, name + ': insert'):
+                    write(df_fixtures, options['mode'])
+                written = list(Fixture.objects.order_by('api_id').values_list('api_id', 'home_goals', 'away_goals', 'home_odds', 'draw_odds', 'away_odds'))
+                with measure(results, name + ': update'):
+                    write(df_fixtures, options['mode'])
+                if name == 'per row':
+                    expected = written
+                elif expected != written:
+                    self.stderr.write('The bulk write produced different fixtures than the per row write!')
+
+        print_results(self.stdout, results)
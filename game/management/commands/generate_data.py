@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from game.benchmarks import generate_data
+
+
+class Command(BaseCommand):
+    help = 'Fills the database with synthetic countries, leagues, teams, fixtures, games, players and tipps (for load tests and benchmarks, not for production)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--countries', type=int, default=5)
+        parser.add_argument('--leagues', type=int, default=10)
+        parser.add_argument('--teams', type=int, default=18, help='Teams per league')
+        parser.add_argument('--fixtures', type=int, default=306, help='Fixtures per league')
+        parser.add_argument('--games', type=int, default=20)
+        parser.add_argument('--players', type=int, default=200)
+        parser.add_argument('--games-per-player', type=int, default=3)
+        parser.add_argument('--tipp-ratio', type=float, default=0.8, help='Share of the fixtures of a game which a player tipps')
+        parser.add_argument('--seed', type=int, default=None, help='Seed of the random numbers, to generate the same data again')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Generating data in %s' % connection.settings_dict['NAME'])
+        sizes = generate_data(countries=options['countries'], leagues=options['leagues'], teams=options['teams'], fixtures=options['fixtures'],
+            games=options['games'], players=options['players'], games_per_player=options['games_per_player'], tipp_ratio=options['tipp_ratio'], seed=options['seed'])
+        self.stdout.write(self.style.SUCCESS('Generated %s' % ', '.join('%d %s' % (n, name) for name, n in sizes.items())))
@@ -0,0 +1,54 @@
+import time
+import logging
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from game.api_data import run_update, fixtures_in_play, seconds_to_next_kickoff
+
+logger = logging.getLogger(__name__)
+
+# Default values, can be overwritten in settings.py (or local_settings.py)
+UPDATE_LIVE_INTERVAL = 60 # seconds between live updates while matches are played
+UPDATE_IDLE_INTERVAL = 600 # maximum seconds between checks if no match is played (the runner wakes up for the next kickoff)
+
+
+class Command(BaseCommand):
+    help = 'Runs the API updates in the background: leagues and days updates when they are due, live updates while matches are played'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the due updates once and exit (e.g. from cron)')
+        parser.add_argument('--live-interval', type=int, default=getattr(settings, 'UPDATE_LIVE_INTERVAL', UPDATE_LIVE_INTERVAL), help='Seconds between live updates while matches are played')
+        parser.add_argument('--idle-interval', type=int, default=getattr(settings, 'UPDATE_IDLE_INTERVAL', UPDATE_IDLE_INTERVAL), help='Maximum seconds between checks if no match is played, the runner wakes up earlier for the next kickoff')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            try:
+                # the scheduled update only calls the API if the leagues or days update is due (see UpdateSchedule)
+                if not run_update('scheduled'):
+                    logger.info('Another update is running, skipped')
+                in_play = fixtures_in_play()
+                if in_play:
+                    run_update('live')
+            except Exception:
+                # the runner keeps running, the next loop tries again
+                logger.exception('Update failed')
+                in_play = False
+
+            if options['once']:
+                break
+            time.sleep(self.sleep_time(in_play, options))
+
+    def sleep_time(self, in_play, options):
+        # While fixtures are in play the live endpoint is polled every live interval, otherwise the runner sleeps until the next kickoff
+        # (but at most the idle interval, the scheduled updates are checked then - this does not call the API unless they are due)
+        if in_play:
+            return options['live_interval']
+        try:
+            to_kickoff = seconds_to_next_kickoff()
+        except Exception:
+            logger.exception('Next kickoff could not be read')
+            to_kickoff = None
+        if to_kickoff is None:
+            return options['idle_interval']
+        return max(1, min(options['idle_interval'], to_kickoff))
@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import cProfile
+import logging
+import threading
+from datetime import datetime
+from django.conf import settings
+from django.db import connection
+from . import api_client
+
+logger = logging.getLogger(__name__)
+
+# Default values, can be overwritten in settings.py (or local_settings.py)
+INSTRUMENTATION_SLOW_QUERIES = 3 # number of the slowest SQL statements in the log line
+INSTRUMENTATION_SQL_LENGTH = 200 # SQL statements in the log line are cut after this number of characters
+PROFILE_PARAM = 'profile' # staff users can profile a request with ?profile=1
+PROFILE_DIR = os.path.join(settings.BASE_DIR, 'profiles')
+
+# The metrics of the request running in this thread, used by the hook of the API client
+_local = threading.local()
+
+
+class RequestMetrics:
+    # Collects the SQL statements and API calls of one request
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.slowest = list() # (seconds, sql)
+        self.api_count = 0
+        self.api_time = 0.0
+        self.api_calls = list() # (seconds, path, status)
+
+    def record_sql(self, execute, sql, params, many, context):
+        # connection.execute_wrapper - times every statement of the request, also the writes run by the writer thread (see db.DatabaseWriter.submit)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.sql_count += 1
+            self.sql_time += duration
+            self.slowest.append((duration, sql))
+            self.slowest.sort(key=lambda statement: statement[0], reverse=True)
+            del self.slowest[getattr(settings, 'INSTRUMENTATION_SLOW_QUERIES', INSTRUMENTATION_SLOW_QUERIES):]
+
+    def record_api_call(self, path, status, seconds):
+        self.api_count += 1
+        self.api_time += seconds
+        self.api_calls.append((seconds, path, status))
+
+
+def record_api_call(path, status, seconds):
+    # Hook of the API client (api_client.call_hooks), calls outside of a request (e.g. manage.py run_updates) are not recorded
+    metrics = getattr(_local, 'metrics', None)
+    if metrics is not None:
+        metrics.record_api_call(path, status, seconds)
+
+if record_api_call not in api_client.call_hooks:
+    api_client.call_hooks.append(record_api_call)
+
+
+def profile_requested(request):
+    # A request is profiled with ?profile=1 (see PROFILE_PARAM), but only for staff users
+    if request.GET.get(getattr(settings, 'PROFILE_PARAM', PROFILE_PARAM)) in (None, '', '0'):
+        return False
+    return request.user.is_authenticated and request.user.is_staff
+
+
+def save_profile(profiler, request):
+    # Saves the profile as .prof file (e.g. for snakeviz or python -m pstats) and returns the file name
+    profile_dir = getattr(settings, 'PROFILE_DIR', PROFILE_DIR)
+    os.makedirs(profile_dir, exist_ok=True)
+    name = '%s_%s.prof' % (datetime.now().strftime('%Y%m%d_%H%M%S_%f'), request.path.strip('/').replace('/', '_') or 'index')
+    profiler.dump_stats(os.path.join(profile_dir, name))
+    return name
+
+
+class InstrumentationMiddleware:
+    # Records number and time of SQL statements and API calls of each request
+    # The numbers are returned in the Server-Timing header (visible in the network tab of the browser) and logged in one line per request
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        _local.metrics = metrics
+        profiler = cProfile.Profile() if profile_requested(request) else None
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(metrics.record_sql):
+                if profiler is not None:
+                    profiler.enable()
+                    try:
+                        response = self.get_response(request)
+                    finally:
+                        profiler.disable()
+                else:
+                    response = self.get_response(request)
+        finally:
+            _local.metrics = None
+        total = time.perf_counter() - start
+
+        fragments = getattr(request, 'fragment_stats', {'hits' : 0, 'misses' : 0}) # counted by fragments.cached_fragment
+        response['Server-Timing'] = ', '.join([
+            'sql;dur=%.1f;desc="%d queries"' % (metrics.sql_time * 1000, metrics.sql_count),
+            'api;dur=%.1f;desc="%d calls"' % (metrics.api_time * 1000, metrics.api_count),
+            'fragments;desc="%d hits, %d misses"' % (fragments['hits'], fragments['misses']),
+            'total;dur=%.1f' % (total * 1000),
+        ])
+
+        record = {
+            'method' : request.method,
+            'path' : request.path,
+            'status' : response.status_code,
+            'total_ms' : round(total * 1000, 1),
+            'sql_count' : metrics.sql_count,
+            'sql_ms' : round(metrics.sql_time * 1000, 1),
+            'sql_slowest' : [{'ms' : round(seconds * 1000, 1), 'sql' : sql[:getattr(settings, 'INSTRUMENTATION_SQL_LENGTH', INSTRUMENTATION_SQL_LENGTH)]} for seconds, sql in metrics.slowest],
+            'api_count' : metrics.api_count,
+            'api_ms' : round(metrics.api_time * 1000, 1),
+            'api_calls' : [{'ms' : round(seconds * 1000, 1), 'path' : path, 'status' : status} for seconds, path, status in metrics.api_calls],
+            'fragment_hits' : fragments['hits'],
+            'fragment_misses' : fragments['misses'],
+        }
+        if profiler is not None:
+            record['profile'] = save_profile(profiler, request)
+            response['X-Profile'] = record['profile']
+        logger.info('request %s', json.dumps(record), extra={'metrics' : record})
+
+        return response
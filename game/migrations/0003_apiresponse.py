@@ -0,0 +1,27 @@
+# Generated by Django 3.1.5 on 2026-10-18 06:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0002_auto_20210203_2144'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApiResponse',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=512, unique=True)),
+                ('body', models.TextField()),
+                ('etag', models.CharField(max_length=255, null=True)),
+                ('last_modified', models.CharField(max_length=64, null=True)),
+                ('fetched_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+                ('last_used', models.DateTimeField(db_index=True)),
+                ('hits', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
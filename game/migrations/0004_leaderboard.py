@@ -0,0 +1,43 @@
+# Generated by Django 3.1.5 on 2026-10-18 07:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+from game.data_utilities import SQL_LEADERBOARD, SQL_RANK
+
+
+# Fill the standings for the existing tipps (the statements of data_utilities.UpdateLeaderboard for all games)
+fill_leaderboard = [SQL_LEADERBOARD.format(where=''), SQL_RANK]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0003_apiresponse'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Leaderboard',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.IntegerField(null=True)),
+                ('tipps', models.IntegerField(default=0)),
+                ('exact', models.IntegerField(default=0)),
+                ('difference', models.IntegerField(default=0)),
+                ('winner', models.IntegerField(default=0)),
+                ('wrong', models.IntegerField(default=0)),
+                ('rank', models.IntegerField(default=1)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='game.game')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='game.player')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='leaderboard',
+            index=models.Index(fields=['game', 'rank'], name='leaderboard_game_rank'),
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboard',
+            constraint=models.UniqueConstraint(fields=('game', 'player'), name='unique_leaderboard_game_player'),
+        ),
+        migrations.RunSQL(fill_leaderboard, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.5 on 2026-10-18 07:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0004_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='updateschedule',
+            name='last_run_duration',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='updateschedule',
+            name='last_run_end',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='updateschedule',
+            name='last_run_start',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='updateschedule',
+            name='lock_until',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.1.5 on 2026-10-18 07:03
+
+from django.db import migrations, models
+from game.data_utilities import SQL_LEADERBOARD, SQL_RANK
+
+
+# Before the unique constraint is added, duplicate tipps are removed - the latest tipp of a player for a fixture and game is kept
+remove_duplicate_tipps = 'DELETE FROM game_tipp WHERE id NOT IN (SELECT MAX(id) FROM game_tipp GROUP BY game_id, player_id, fixture_id)'
+
+# The number of tipps in the standings may have changed, they are filled again (see 0004_leaderboard)
+refill_leaderboard = ['DELETE FROM game_leaderboard', SQL_LEADERBOARD.format(where=''), SQL_RANK]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0005_update_runs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fixture',
+            index=models.Index(fields=['league', 'match_start'], name='fixture_league_match_start'),
+        ),
+        migrations.AddIndex(
+            model_name='fixture',
+            index=models.Index(fields=['match_start'], name='fixture_match_start'),
+        ),
+        migrations.AddIndex(
+            model_name='player_games',
+            index=models.Index(fields=['player', 'status'], name='player_games_player_status'),
+        ),
+        migrations.AddIndex(
+            model_name='tipp',
+            index=models.Index(fields=['yn_final', 'fixture'], name='tipp_final_fixture'),
+        ),
+        migrations.RunSQL(remove_duplicate_tipps, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='tipp',
+            constraint=models.UniqueConstraint(fields=('game', 'player', 'fixture'), name='unique_tipp_game_player_fixture'),
+        ),
+        migrations.RunSQL(refill_leaderboard, migrations.RunSQL.noop),
+    ]
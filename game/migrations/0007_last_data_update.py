@@ -0,0 +1,18 @@
+# Generated by Django 3.1.5 on 2026-10-18 07:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0006_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='updateschedule',
+            name='last_data_update',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
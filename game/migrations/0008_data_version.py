@@ -0,0 +1,18 @@
+# Generated by Django 3.1.5 on 2026-10-18 07:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0007_last_data_update'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='updateschedule',
+            name='data_version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
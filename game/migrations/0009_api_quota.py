@@ -0,0 +1,31 @@
+# Generated by Django 3.1.5 on 2026-10-18 07:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0008_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApiQuota',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tokens', models.FloatField(default=0)),
+                ('tokens_at', models.FloatField(default=0)),
+                ('minute_limit', models.IntegerField(null=True)),
+                ('day_limit', models.IntegerField(null=True)),
+                ('day_remaining', models.IntegerField(null=True)),
+                ('day_reset_at', models.DateTimeField(null=True)),
+                ('headers_at', models.DateTimeField(null=True)),
+                ('day', models.DateField(null=True)),
+                ('calls', models.IntegerField(default=0)),
+                ('waits', models.IntegerField(default=0)),
+                ('refused', models.IntegerField(default=0)),
+                ('retries', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.5 on 2026-10-18 07:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0009_api_quota'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('synced_at', models.DateTimeField()),
+                ('settled', models.BooleanField(default=False)),
+                ('league', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='game.league')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='syncwatermark',
+            constraint=models.UniqueConstraint(fields=('league', 'date'), name='unique_syncwatermark_league_date'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.5 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0010_sync_watermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fixture',
+            name='content_hash',
+            field=models.CharField(max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='fixture',
+            name='odds_hash',
+            field=models.CharField(max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='league',
+            name='content_hash',
+            field=models.CharField(max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='content_hash',
+            field=models.CharField(max_length=32, null=True),
+        ),
+    ]
@@ -7,6 +7,12 @@ class UpdateSchedule(models.Model):
     next_league_update = models.DateField()  # Date when the next update for leagues and teams should run
     next_fixture_update = models.DateField() # Date when the next scheduled update for fixtures should run
     last_fixture_update = models.DateTimeField() # Date and time when the fixtures were last updated from the API
+    lock_until = models.DateTimeField(null=True) # Set while an update is running (see api_data.run_update), an expired lock can be taken over
+    last_run_start = models.DateTimeField(null=True) # Start, end and duration (seconds) of the last update run
+    last_run_end = models.DateTimeField(null=True)
+    last_run_duration = models.FloatField(null=True)
+    data_version = models.IntegerField(default=0) # Incremented after every change of the data shown on the pages (see data_utilities.DataChanged)
+    last_data_update = models.DateTimeField(null=True) # Date and time of the last increment of data_version
 
 
 class AvailableLeague(models.Model):
@@ -35,6 +41,7 @@ class League(models.Model):
     logo = models.URLField(max_length=255, null=True)
     country = models.ForeignKey(Country, on_delete=models.SET_NULL, null=True)
     games = models.ManyToManyField('Game', through='Game_Leagues')  # Name of the object has to be used since the Game object has not been created yet
+    content_hash = models.CharField(max_length=32, null=True) # hash of the API record last written (see api_data.content_hash), an unchanged record is not written again
 
     def __str__(self):
         return self.name
@@ -47,6 +54,7 @@ class Team(models.Model):
     name = models.CharField(max_length=128)
     logo = models.URLField(max_length=255, null=True)
     country = models.ForeignKey(Country, on_delete=models.SET_NULL, null=True)
+    content_hash = models.CharField(max_length=32, null=True) # hash of the API record last written (see api_data.content_hash)
 
     def __str__(self):
         return self.name
@@ -67,6 +75,14 @@ class Fixture(models.Model):
     home_odds = models.FloatField(blank=True, null=True)
     draw_odds = models.FloatField(blank=True, null=True)
     away_odds = models.FloatField(blank=True, null=True)
+    content_hash = models.CharField(max_length=32, null=True) # hash of the API record last written (see api_data.content_hash), without the odds
+    odds_hash = models.CharField(max_length=32, null=True) # hash of the odds last written (only written in the days update)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['league', 'match_start'], name='fixture_league_match_start'), # fixtures of the leagues of a game in a date range (GetFixtureTipps)
+            models.Index(fields=['match_start'], name='fixture_match_start'), # fixtures in a date range of all leagues (live updates)
+        ]
 
 
 
@@ -120,6 +136,9 @@ class Player_Games(models.Model):
     player = models.ForeignKey(Player, on_delete=models.CASCADE)
     status = models.ForeignKey(PlayerStatus, on_delete=models.CASCADE, default=3)  # 3 is the id of the "invited" status
 
+    class Meta:
+        indexes = [models.Index(fields=['player', 'status'], name='player_games_player_status')] # active games of a player (GetFixtureTipps, GamesView)
+
 
 class Tipp(models.Model):
     # Tipps
@@ -131,5 +150,64 @@ class Tipp(models.Model):
     score = models.IntegerField(blank=True, null=True) # This field is used to keep the score of the tipp after a match has started or is finished
     yn_final = models.BooleanField(default=False) # This is set to True if a match is finished and therefore the score is final and does not change anymore
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['game', 'player', 'fixture'], name='unique_tipp_game_player_fixture')] # one tipp per player, game and fixture, also used for the join in GetFixtureTipps
+        indexes = [models.Index(fields=['yn_final', 'fixture'], name='tipp_final_fixture')] # open tipps to score (UpdateGameScores)
+
+
+class ApiResponse(models.Model):
+    # Cache for responses of the API, the key is the url including the query string
+    url = models.CharField(max_length=512, unique=True)
+    body = models.TextField()
+    etag = models.CharField(max_length=255, null=True) # ETag and Last-Modified header of the response, used to revalidate expired entries
+    last_modified = models.CharField(max_length=64, null=True)
+    fetched_at = models.DateTimeField() # Date and time the response was last received from the API
+    expires_at = models.DateTimeField() # until then the response is used without calling the API
+    last_used = models.DateTimeField(db_index=True) # least recently used entries are removed first if the cache is full
+    hits = models.IntegerField(default=0)
 
 
+class Leaderboard(models.Model):
+    # Standings per game and player, maintained by data_utilities.UpdateLeaderboard whenever scores or tipps change
+    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    player = models.ForeignKey(Player, on_delete=models.CASCADE)
+    score = models.IntegerField(null=True) # Sum of the scores of all tipps (NULL as long as no tipp has a score)
+    tipps = models.IntegerField(default=0) # Number of tipps, including tipps for matches which have not started yet
+    exact = models.IntegerField(default=0) # Number of tipps with the points for exact result, goal difference, winner, wrong prediction
+    difference = models.IntegerField(default=0)
+    winner = models.IntegerField(default=0)
+    wrong = models.IntegerField(default=0)
+    rank = models.IntegerField(default=1) # Players with the same score have the same rank
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['game', 'player'], name='unique_leaderboard_game_player')]
+        indexes = [models.Index(fields=['game', 'rank'], name='leaderboard_game_rank')]
+
+
+class ApiQuota(models.Model):
+    # Quota of the API plan, one row shared by all processes (see api_client.take_tokens)
+    # Token bucket for the calls per minute: tokens are refilled at minute_limit per minute up to minute_limit, every call takes one
+    # The limits and the remaining daily calls are taken from the rate limit headers of the responses
+    tokens = models.FloatField(default=0)
+    tokens_at = models.FloatField(default=0) # time of the last refill (seconds since the epoch)
+    minute_limit = models.IntegerField(null=True) # calls per minute of the plan (X-RateLimit-Limit), API_RATE_PER_MINUTE until the API has sent it
+    day_limit = models.IntegerField(null=True) # calls per day of the plan (X-RateLimit-requests-Limit), NULL if unknown
+    day_remaining = models.IntegerField(null=True) # calls left today (X-RateLimit-requests-Remaining)
+    day_reset_at = models.DateTimeField(null=True) # the daily quota is reset then (X-RateLimit-requests-Reset)
+    headers_at = models.DateTimeField(null=True) # last response with rate limit headers
+    day = models.DateField(null=True) # day (UTC) of the counters below
+    calls = models.IntegerField(default=0) # calls made
+    waits = models.IntegerField(default=0) # calls which had to wait for a token
+    refused = models.IntegerField(default=0) # calls refused, the rest of the daily quota is kept for calls of a higher priority
+    retries = models.IntegerField(default=0) # calls repeated after 429, 5xx or a connection error
+
+
+class SyncWatermark(models.Model):
+    # Last sync of the fixtures of a league on a match day (days mode of api_data.update_fixtures), the date is in the time zone of the API calls
+    league = models.ForeignKey(League, on_delete=models.CASCADE)
+    date = models.DateField()
+    synced_at = models.DateTimeField() # start of the update which fetched the fixtures of the date
+    settled = models.BooleanField(default=False) # the date is past and all fixtures are finished (or postponed / cancelled), it is never fetched again
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['league', 'date'], name='unique_syncwatermark_league_date')]
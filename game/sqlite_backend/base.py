@@ -0,0 +1,19 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # The SQLite backend of Django with the option transaction_mode (like in later Django versions)
+    # With 'IMMEDIATE' a transaction (transaction.atomic) takes the write lock when it begins, so it waits for other writers (busy timeout)
+    # instead of failing with "database is locked" when it changes from reading to writing while another connection has written
+    transaction_mode = None
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.transaction_mode = kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute('BEGIN ' + self.transaction_mode)
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,75 @@
+// Live push of the today and gamedetail pages: the rows of the fixtures table are patched with the changes sent over the WebSocket ws/live
+// Without a WebSocket (e.g. served by WSGI or runserver without the channels app) the page works as before with the refresh button,
+// the socket is only opened again after it has been connected once (a server which has no ws/live is not asked again)
+(function () {
+    var table = document.querySelector('table.live-fixtures');
+    if (!table || !window.WebSocket) {
+        return;
+    }
+    var ids = {};
+    table.querySelectorAll('tr[data-fixture]').forEach(function (row) {
+        ids[row.dataset.fixture] = true;
+    });
+    var fixtures = Object.keys(ids);
+    if (fixtures.length === 0) {
+        return;
+    }
+    var scheme = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+    var url = scheme + window.location.host + '/ws/live?fixtures=' + fixtures.join(',');
+    var retry = 1000;
+    var connected = false;
+
+    function setCell(row, name, value) {
+        var cell = row.querySelector('.' + name);
+        var text = value === null || value === undefined ? 'None' : String(value);
+        if (cell && cell.textContent !== text) {
+            cell.textContent = text;
+            cell.classList.add('live-changed');
+        }
+    }
+
+    function updateFixture(fixture) {
+        table.querySelectorAll('tr[data-fixture="' + fixture.id + '"]').forEach(function (row) {
+            setCell(row, 'live-status', fixture.status);
+            setCell(row, 'live-home-goals', fixture.home_goals);
+            setCell(row, 'live-away-goals', fixture.away_goals);
+        });
+    }
+
+    function updateTipp(tipp) {
+        table.querySelectorAll('tr[data-fixture="' + tipp.fixture_id + '"][data-game="' + tipp.game_id + '"]').forEach(function (row) {
+            setCell(row, 'live-score', tipp.score);
+            var cell = row.querySelector('.live-score');
+            if (cell) {
+                cell.classList.toggle('text-muted', !tipp.final);
+            }
+        });
+    }
+
+    function connect() {
+        var socket = new WebSocket(url);
+        socket.onopen = function () {
+            connected = true;
+            retry = 1000;
+        };
+        socket.onmessage = function (event) {
+            var data = JSON.parse(event.data);
+            if (data.fixture) {
+                updateFixture(data.fixture);
+            }
+            if (data.tipps) {
+                data.tipps.forEach(updateTipp);
+            }
+        };
+        socket.onclose = function () {
+            if (!connected) {
+                return; // the first connection failed, the server does not serve the live push
+            }
+            // reconnect with a growing delay (e.g. server restart), at most one attempt per minute
+            retry = Math.min(retry * 2, 60000);
+            setTimeout(connect, retry);
+        };
+    }
+
+    connect();
+})();
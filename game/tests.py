@@ -1,3 +1,561 @@
-from django.test import TestCase
+import copy
+import importlib
+import time
+import asyncio
+import random
+import logging
+import threading
+from datetime import datetime, timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.db import connection, OperationalError
+from django.db.models import Q
+from django.test import TestCase, TransactionTestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from channels.db import database_sync_to_async
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.timezone import utc
+from .models import UpdateSchedule, ApiResponse, ApiQuota, Country, League, Team, Fixture, Game, Game_Leagues, Player, PlayerStatus, Player_Games, Tipp, Leaderboard
+from .api_client import api_get_many
+from .benchmarks import stub_api, generate_data, fixture_responses, change_goals
+from .api_data import update_fixtures, normalize_fixtures, resolve_ids, write_fixtures
+from .identity import IdentityMap
+from .data_utilities import UpdateGameScores, UpdateLeaderboard, DataChanged
+from .live import publish_changes
+from .views import api_etag
+from .db import serialized_write
+from . import api_client, consumers
 
-# Create your tests here.
+logging.getLogger('game').setLevel(logging.WARNING) # no log lines of the requests and updates in the output of the tests
+
+
+def create_game(pts=(5, 3, 1, 0), players=1, name='Game'):
+    # A game with one league, two teams and active players, pts are the points for exact result, goal difference, winner and wrong
+    for status_id, status in enumerate(['Creator', 'Active', 'Invited', 'Declined'], 1):
+        PlayerStatus.objects.get_or_create(id=status_id, defaults={'name' : status})
+    country = Country.objects.create(name='Country')
+    league = League.objects.create(api_id=League.objects.count() + 1, name='League', country=country)
+    home = Team.objects.create(api_id=Team.objects.count() + 1, name='Home', country=country)
+    away = Team.objects.create(api_id=Team.objects.count() + 1, name='Away', country=country)
+    player_list = list()
+    for i in range(players):
+        user = User.objects.create(username='%s player %d' % (name, i))
+        player_list.append(Player.objects.create(user=user, pic=''))
+    game = Game.objects.create(name=name, pts_exact=pts[0], pts_difference=pts[1], pts_winner=pts[2], pts_wrong=pts[3], creator=player_list[0])
+    Game_Leagues.objects.create(game=game, league=league)
+    for player in player_list:
+        Player_Games.objects.create(game=game, player=player, status_id=2)
+    return game, league, home, away, player_list
+
+
+def create_fixture(league, home, away, goals=None, status_short='NS', hours=-2):
+    # A fixture which started hours ago (in the future for hours > 0)
+    home_goals, away_goals = goals if goals is not None else (None, None)
+    return Fixture.objects.create(api_id=Fixture.objects.count() + 1, league=league, home_team=home, away_team=away, match_start=timezone.now() + timedelta(hours=hours),
+        status_short=status_short, home_goals=home_goals, away_goals=away_goals)
+
+
+class ApiFetchTests(TestCase):
+    # api_get_many against the local stub server of the API (benchmarks.stub_api), every call takes delay seconds
+
+    def test_concurrency_cap(self):
+        # the calls run concurrently up to the cap, the results are the same and in the order of the paths
+        paths = ['teams/league/%d' % i for i in range(12)]
+        responses = {path : {'api' : {'results' : 1, 'teams' : [{'team_id' : i, 'name' : 'Team %d' % i}]}} for i, path in enumerate(paths)}
+        timings = dict()
+        results = dict()
+        with stub_api(delay=0.1, responses=responses):
+            for cap in (1, 8):
+                ApiResponse.objects.all().delete() # no responses from the cache
+                start = time.perf_counter()
+                results[cap] = api_get_many(paths, max_workers=cap)
+                timings[cap] = time.perf_counter() - start
+
+        self.assertEqual(results[1], [responses[path] for path in paths])
+        self.assertEqual(results[8], results[1])
+        self.assertGreater(timings[1], 1.2)
+        self.assertLess(timings[8], timings[1] / 3)
+
+    def test_fetch_while_waiting_for_tokens(self):
+        # a quota which grants one token at a time: the granted calls run while the next tokens are waited for
+        paths = ['teams/league/%d' % i for i in range(6)]
+        responses = {path : {'api' : {'results' : 1, 'teams' : [{'team_id' : i}]}} for i, path in enumerate(paths)}
+        granted, requested = list(), list()
+
+        def take_tokens(paths, waited=False):
+            granted.append(time.perf_counter())
+            return [0], [], 0.05
+
+        def timed_request(*args):
+            requested.append(time.perf_counter())
+            return request(*args)
+
+        request = api_client.timed_request
+        with stub_api(delay=0.1, responses=responses), mock.patch.object(api_client, 'take_tokens', take_tokens), mock.patch.object(api_client, 'timed_request', timed_request):
+            results = api_get_many(paths, max_workers=8)
+
+        self.assertEqual(results, [responses[path] for path in paths])
+        self.assertEqual(len(granted), 6)
+        self.assertLess(min(requested), max(granted))
+
+    @override_settings(API_RATE_PER_MINUTE=60)
+    def test_take_tokens(self):
+        # one transaction grants the tokens in the bucket in the order of the paths, the daily quota reserved for higher priorities is refused
+        ApiQuota.objects.create(id=1, tokens=2.5, tokens_at=time.time(), day_limit=100, day_remaining=20)
+        granted, refused, wait = api_client.take_tokens(['fixtures/live', 'teams/league/1', 'fixtures/live', 'teams/league/2'])
+        self.assertEqual((granted, refused), ([0, 2], [1, 3])) # reference calls leave 30 of the 100 calls of the day to higher priorities
+        granted, refused, wait = api_client.take_tokens(['fixtures/live', 'fixtures/live'])
+        self.assertEqual((granted, refused), ([], []))
+        self.assertGreater(wait, 0.4)
+        quota = ApiQuota.objects.get(id=1)
+        self.assertEqual((quota.calls, quota.refused, quota.waits, quota.day_remaining), (2, 2, 2, 18))
+
+
+class ScoringTests(TestCase):
+    # UpdateGameScores: points of the open tipps for exact result, goal difference, winner and wrong prediction (game with 5, 3, 1 and 0 points)
+
+    def setUp(self):
+        self.game, self.league, self.home, self.away, players = create_game()
+        self.player = players[0]
+
+    def tipp(self, fixture, tipp_home, tipp_away, **fields):
+        return Tipp.objects.create(game=self.game, player=self.player, fixture=fixture, tipp_home=tipp_home, tipp_away=tipp_away, **fields)
+
+    def scores(self, tipps):
+        return [Tipp.objects.get(id=tipp.id).score for tipp in tipps]
+
+    def test_points(self):
+        # result => [(tipp, points)]
+        cases = {
+            (2, 1) : [((2, 1), 5), ((3, 2), 3), ((1, 0), 3), ((3, 0), 1), ((1, 1), 0), ((0, 1), 0), ((0, 0), 0)],
+            (0, 2) : [((0, 2), 5), ((1, 3), 3), ((0, 1), 1), ((2, 0), 0), ((1, 1), 0)],
+            (1, 1) : [((1, 1), 5), ((0, 0), 3), ((3, 3), 3), ((2, 1), 0), ((0, 1), 0)], # a draw gets the points for the goal difference
+            (0, 0) : [((0, 0), 5), ((2, 2), 3), ((1, 0), 0)],
+        }
+        tipps = list()
+        expected = list()
+        for goals, tipp_points in cases.items():
+            for (tipp_home, tipp_away), points in tipp_points:
+                # one tipp per player and fixture
+                tipps.append(self.tipp(create_fixture(self.league, self.home, self.away, goals, 'FT'), tipp_home, tipp_away))
+                expected.append(points)
+
+        self.assertEqual(UpdateGameScores(), len(tipps))
+        self.assertEqual(self.scores(tipps), expected)
+        self.assertTrue(all(Tipp.objects.get(id=tipp.id).yn_final for tipp in tipps))
+
+    def test_status_missing(self):
+        # a fixture with goals but without status is scored, the score is not final
+        tipp = self.tipp(create_fixture(self.league, self.home, self.away, (1, 0), None), 1, 0)
+        self.assertEqual(UpdateGameScores(), 1)
+        tipp.refresh_from_db()
+        self.assertEqual((tipp.score, tipp.yn_final), (5, False))
+
+    def test_points_of_game(self):
+        # the points are taken from the game of the tipp
+        game, league, home, away, players = create_game(pts=(10, 4, 2, -1), name='Other')
+        tipps = [Tipp.objects.create(game=game, player=players[0], fixture=create_fixture(league, home, away, (3, 1), 'FT'), tipp_home=tipp_home, tipp_away=tipp_away)
+            for tipp_home, tipp_away in [(3, 1), (2, 0), (1, 0), (0, 0)]]
+        UpdateGameScores()
+        self.assertEqual(self.scores(tipps), [10, 4, 2, -1])
+
+    def test_only_open_tipps(self):
+        # final tipps are not scored again, tipps on fixtures without goals are not scored, running fixtures are scored but not final
+        finished = create_fixture(self.league, self.home, self.away, (1, 0), 'FT')
+        running = create_fixture(self.league, self.home, self.away, (0, 0), '2H')
+        upcoming = create_fixture(self.league, self.home, self.away, hours=2)
+        final = self.tipp(finished, 0, 3, score=99, yn_final=True)
+        live = self.tipp(running, 0, 0)
+        future = self.tipp(upcoming, 1, 1)
+
+        self.assertEqual(UpdateGameScores(), 1)
+        self.assertEqual(self.scores([final, live, future]), [99, 5, None])
+        self.assertEqual([Tipp.objects.get(id=tipp.id).yn_final for tipp in [final, live, future]], [True, False, False])
+
+        # the score of a running fixture changes with its goals until it is finished
+        Fixture.objects.filter(id=running.id).update(home_goals=1, status_short='FT')
+        self.assertEqual(UpdateGameScores(fixture_ids=[running.id]), 1)
+        self.assertEqual(self.scores([live]), [0])
+        self.assertTrue(Tipp.objects.get(id=live.id).yn_final)
+
+    def test_fixture_ids(self):
+        # only the tipps on the fixtures passed are scored
+        first = create_fixture(self.league, self.home, self.away, (1, 0), 'FT')
+        second = create_fixture(self.league, self.home, self.away, (1, 0), 'FT')
+        tipps = [self.tipp(first, 1, 0), self.tipp(second, 1, 0)]
+        self.assertEqual(UpdateGameScores(fixture_ids=[second.id]), 1)
+        self.assertEqual(self.scores(tipps), [None, 5])
+
+
+class LeaderboardTests(TestCase):
+    # UpdateLeaderboard: standings per game and player
+
+    def standings(self, game):
+        return {row.player_id : (row.score, row.tipps, row.exact, row.difference, row.winner, row.wrong, row.rank) for row in Leaderboard.objects.filter(game=game)}
+
+    def test_counts_by_outcome(self):
+        # the game gives the same points for exact result and goal difference and for winner and wrong, the counts follow the outcome and not the points
+        game, league, home, away, players = create_game(pts=(3, 3, 0, 0))
+        player = players[0]
+        for goals, tipp in [((2, 1), (2, 1)), ((2, 1), (1, 0)), ((0, 0), (1, 1)), ((3, 1), (1, 0)), ((1, 0), (0, 2))]:
+            Tipp.objects.create(game=game, player=player, fixture=create_fixture(league, home, away, goals, 'FT'), tipp_home=tipp[0], tipp_away=tipp[1])
+        Tipp.objects.create(game=game, player=player, fixture=create_fixture(league, home, away, hours=2), tipp_home=1, tipp_away=0) # not scored yet
+        UpdateGameScores()
+        # score, tipps, exact, difference, winner, wrong, rank
+        self.assertEqual(self.standings(game), {player.id : (9, 6, 1, 2, 1, 1, 1)})
+
+    def test_rank_ties(self):
+        # players with the same score have the same rank, the next player is ranked after all of them, players without score are last
+        game, league, home, away, players = create_game(players=5)
+        fixture = create_fixture(league, home, away, (2, 0), 'FT')
+        for player, tipp in zip(players, [(2, 0), (2, 0), (1, 0), (0, 1)]):
+            Tipp.objects.create(game=game, player=player, fixture=fixture, tipp_home=tipp[0], tipp_away=tipp[1])
+        Tipp.objects.create(game=game, player=players[4], fixture=create_fixture(league, home, away, hours=2), tipp_home=1, tipp_away=0)
+        UpdateGameScores()
+        ranks = {player_id : standing[6] for player_id, standing in self.standings(game).items()}
+        self.assertEqual([ranks[player.id] for player in players], [1, 1, 3, 4, 5])
+        self.assertIsNone(self.standings(game)[players[4].id][0])
+
+    def test_remove_player(self):
+        # a player whose tipps are deleted is removed from the standings, the players ranked below move up
+        game, league, home, away, players = create_game(players=3)
+        fixture = create_fixture(league, home, away, (1, 0), 'FT')
+        for player, tipp in zip(players, [(1, 0), (2, 0), (0, 0)]):
+            Tipp.objects.create(game=game, player=player, fixture=fixture, tipp_home=tipp[0], tipp_away=tipp[1])
+        UpdateGameScores()
+        self.assertEqual([self.standings(game)[player.id][6] for player in players], [1, 2, 3])
+
+        Tipp.objects.filter(game=game, player=players[0]).delete()
+        UpdateLeaderboard(game.id, [players[0].id])
+        standings = self.standings(game)
+        self.assertNotIn(players[0].id, standings)
+        self.assertEqual([standings[player.id][6] for player in players[1:]], [1, 2])
+
+    def test_migrations_fill_like_update(self):
+        # the migrations which fill the standings for existing tipps count by outcome like UpdateLeaderboard
+        game, league, home, away, players = create_game(pts=(3, 3, 0, 0), players=2)
+        for player, tipps in zip(players, [[(2, 1), (1, 1)], [(1, 0), (0, 3)]]):
+            for goals, tipp in zip([(2, 1), (1, 1)], tipps):
+                Tipp.objects.create(game=game, player=player, fixture=create_fixture(league, home, away, goals, 'FT'), tipp_home=tipp[0], tipp_away=tipp[1])
+        UpdateGameScores()
+        expected = self.standings(game)
+        for migration in ['0004_leaderboard', '0006_query_indexes']:
+            module = importlib.import_module('game.migrations.' + migration)
+            Leaderboard.objects.all().delete()
+            with connection.cursor() as cursor:
+                for sql in getattr(module, 'fill_leaderboard', None) or module.refill_leaderboard:
+                    cursor.execute(sql)
+            self.assertEqual(self.standings(game), expected)
+
+
+class JsonApiTests(TestCase):
+    # api/games/<game_id>/fixtures and ranking: date range, keyset pagination and conditional GET
+
+    def setUp(self):
+        now = timezone.now()
+        UpdateSchedule.objects.create(next_league_update=now.date(), next_fixture_update=now.date(), last_fixture_update=now)
+        self.game, league, home, away, players = create_game(players=3)
+        self.user = players[0].user
+        self.client.force_login(self.user)
+        start = datetime(2030, 1, 1, tzinfo=utc) # match starts are stored in UTC
+        self.fixtures = [Fixture.objects.create(api_id=i + 1, league=league, home_team=home, away_team=away, match_start=start + timedelta(hours=hours), status_short='NS')
+            for i, hours in enumerate([10, 10, 14, 18, 24])] # the last one starts at midnight of the next day
+        for player in players:
+            Tipp.objects.create(game=self.game, player=player, fixture=self.fixtures[0], tipp_home=1, tipp_away=0)
+        UpdateLeaderboard(self.game.id)
+        DataChanged()
+        self.url = reverse('api_fixtures', args=[self.game.id])
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()['results']]
+
+    def test_to_date_excludes_next_day(self):
+        fixtures = self.fixtures
+        self.assertEqual(self.ids(self.client.get(self.url, {'from' : '2030-01-01', 'to' : '2030-01-01'})), [fixture.id for fixture in fixtures[:4]])
+        self.assertEqual(self.ids(self.client.get(self.url, {'from' : '2030-01-02', 'to' : '2030-01-02'})), [fixtures[4].id])
+
+    def test_paging(self):
+        # following next returns every fixture once in the order of (match_start, id), also with equal match starts on the border of a page
+        ids, url, pages = list(), self.url + '?limit=2', 0
+        while url is not None:
+            response = self.client.get(url)
+            ids += self.ids(response)
+            url, pages = response.json()['next'], pages + 1
+        self.assertEqual(ids, [fixture.id for fixture in self.fixtures])
+        self.assertEqual(pages, 3)
+
+        ranking = self.client.get(reverse('api_ranking', args=[self.game.id]), {'limit' : 2})
+        self.assertEqual(len(self.ids(ranking)), 2)
+        self.assertEqual(len(self.ids(self.client.get(ranking.json()['next']))), 1)
+
+    def test_unknown_cursor(self):
+        # a cursor which is not an item of the list is refused instead of starting again with the first page
+        other = create_game(name='Other')[1]
+        unknown = create_fixture(other, *Team.objects.all()[:2])
+        for cursor in [unknown.id, 9999]:
+            response = self.client.get(self.url, {'after' : cursor})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.json())
+        self.assertEqual(self.client.get(reverse('api_ranking', args=[self.game.id]), {'after' : 9999}).status_code, 400)
+
+    def test_conditional_get(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        # another url and another user have other ETags
+        self.assertEqual(self.client.get(self.url + '?limit=2', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.client.force_login(User.objects.exclude(id=self.user.id).first())
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.client.force_login(self.user)
+        # a bad parameter is refused even if the client sends the ETag of this url, the error has no validators
+        bad = RequestFactory().get(self.url, {'after' : 9999})
+        bad.user = self.user
+        response = self.client.get(bad.get_full_path(), HTTP_IF_NONE_MATCH='"%s"' % api_etag(bad))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.has_header('ETag') or response.has_header('Last-Modified'))
+        # a change of the data (update or tipps) changes the ETag
+        DataChanged()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class TestPagesTests(TestCase):
+    # test_api and test_days are only for staff users, the days update runs with the lock of the updates (api_data.run_update)
+
+    def setUp(self):
+        now = timezone.now()
+        UpdateSchedule.objects.create(next_league_update=now.date(), next_fixture_update=now.date(), last_fixture_update=now)
+        self.user = User.objects.create_user('player', password='secret')
+        self.staff = User.objects.create_user('staff', password='secret', is_staff=True)
+
+    def test_staff_only(self):
+        for user in (None, self.user):
+            if user is not None:
+                self.client.force_login(user)
+            with mock.patch('game.api_data.update_fixtures') as update_fixtures:
+                self.assertEqual(self.client.get(reverse('test_api')).status_code, 302)
+                self.assertEqual(self.client.post(reverse('test_days')).status_code, 302)
+            update_fixtures.assert_not_called()
+
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse('test_api')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('test_days')).status_code, 405)
+
+    def test_days_update_with_lock(self):
+        self.client.force_login(self.staff)
+        with mock.patch('game.api_data.update_fixtures') as update_fixtures:
+            self.client.post(reverse('test_days'))
+            update_fixtures.assert_called_once_with(mode='days')
+
+            # an update is running (e.g. manage.py run_updates)
+            UpdateSchedule.objects.update(lock_until=timezone.now() + timedelta(minutes=10))
+            self.client.post(reverse('test_days'))
+            self.assertEqual(update_fixtures.call_count, 1)
+
+
+class ContentHashTests(TestCase):
+    # write_fixtures skips the fixtures whose stored hashes match the record, the odds only count in the days update which writes them
+
+    def setUp(self):
+        generate_data(countries=1, leagues=1, teams=4, fixtures=12, games=1, players=2, games_per_player=1, seed=1)
+        self.payload = [fixture for data in fixture_responses().values() for fixture in data['api']['fixtures']]
+        for fixture in self.payload:
+            fixture['status'] = 'changed' # the first run writes every fixture
+
+    def rows(self, odds=None):
+        rows = list(resolve_ids(normalize_fixtures(copy.deepcopy(self.payload)), IdentityMap()))
+        if odds is not None:
+            for row in rows:
+                row.update(home_win=odds[0], draw=odds[1], away_win=odds[2])
+        return rows
+
+    def test_days_then_leagues(self):
+        total = len(self.payload)
+        self.assertEqual(write_fixtures(self.rows((1.5, 3.2, 4.1)), 'days')['updated'], total)
+        # the leagues update gets the same fixtures without odds
+        written = write_fixtures(self.rows(), 'leagues')
+        self.assertEqual((written['updated'], written['skipped']), (0, total))
+        self.assertEqual(write_fixtures(self.rows((1.5, 3.2, 4.1)), 'days')['skipped'], total)
+        # new odds are written by the days update only
+        self.assertEqual(write_fixtures(self.rows((1.6, 3.2, 4.1)), 'leagues')['skipped'], total)
+        self.assertEqual(write_fixtures(self.rows((1.6, 3.2, 4.1)), 'days')['updated'], total)
+        self.assertEqual(set(Fixture.objects.values_list('home_odds', flat=True)), {1.6})
+
+    def test_days_update_scores_missed_tipps(self):
+        # tipps of fixtures written by a run which failed before the scoring are not scored by runs which skip the fixtures, but by the next days update
+        missed = Tipp.objects.filter(fixture__status_short='FT')
+        count = missed.update(score=None, yn_final=False)
+        self.assertGreater(count, 0)
+        with stub_api(delay=0, responses={}):
+            update_fixtures('leagues')
+            self.assertEqual(missed.filter(score__isnull=True).count(), count)
+            self.assertGreaterEqual(update_fixtures('days')['rescored'], count)
+        self.assertFalse(missed.filter(Q(score__isnull=True) | Q(yn_final=False)).exists())
+
+
+class ConcurrencyTests(TransactionTestCase):
+    # Tippers (tipp view) while update_fixtures writes and scores: WAL, the busy timeout and the writer thread (game/db.py) prevent "database is locked"
+
+    def test_writer_keeps_connection(self):
+        # the writer thread opens its connection once and uses it for the following writes (a temporary table lives as long as its connection)
+        def execute(sql):
+            with connection.cursor() as cursor:
+                cursor.execute(sql)
+                return threading.current_thread().name, cursor.fetchall()
+
+        self.assertEqual(serialized_write(execute)('CREATE TEMP TABLE writer_connection (id INTEGER)'), ('database-writer', []))
+        DataChanged()
+        self.assertEqual(serialized_write(execute)('SELECT COUNT(*) FROM writer_connection'), ('database-writer', [(0,)]))
+
+    def test_writer_statements_seen_by_caller(self):
+        # the execute wrappers of the caller (SQL metrics of the request, middleware.py) see the statements run by the writer thread
+        statements = list()
+
+        def record(execute, sql, params, many, context):
+            statements.append((threading.current_thread().name, sql))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            DataChanged()
+        self.assertTrue(any(name == 'database-writer' and 'game_updateschedule' in sql for name, sql in statements))
+
+    def test_tipps_during_ingestion(self):
+        generate_data(countries=2, leagues=3, players=20, games=4, games_per_player=2, seed=1)
+        now = timezone.now()
+        tippers = dict()
+        for pg in Player_Games.objects.filter(status_id=2).select_related('player__user'):
+            fixtures = list(Fixture.objects.filter(league__games=pg.game_id, match_start__gt=now + timedelta(days=1)).values_list('id', flat=True)[:15])
+            if fixtures and pg.player.user_id not in tippers:
+                tippers[pg.player.user_id] = (pg.player.user, pg.game_id, fixtures)
+        tippers = list(tippers.values())[:4]
+        self.assertEqual(len(tippers), 4)
+
+        responses = fixture_responses()
+        rnd = random.Random(1)
+        errors = list()
+        statuses = list()
+        runs = list()
+        tipping = threading.Event()
+        tipping.set()
+
+        def ingest():
+            try:
+                while tipping.is_set() or not runs:
+                    change_goals(responses, rnd)
+                    ApiResponse.objects.all().delete()
+                    runs.append(update_fixtures('leagues'))
+            except OperationalError as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        def tipp(user, game_id, fixtures):
+            client = self.client_class()
+            client.force_login(user)
+            try:
+                for fixture_id in fixtures:
+                    response = client.post('/tipp/%d/%d' % (game_id, fixture_id), {'tipp_home' : rnd.randint(0, 3), 'tipp_away' : rnd.randint(0, 3)})
+                    statuses.append(response.status_code)
+            except OperationalError as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        with stub_api(delay=0, responses=responses):
+            ingestion = threading.Thread(target=ingest)
+            ingestion.start()
+            threads = [threading.Thread(target=tipp, args=tipper) for tipper in tippers]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            tipping.clear()
+            ingestion.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(statuses, [302] * sum(len(fixtures) for user, game_id, fixtures in tippers))
+        self.assertTrue(runs)
+        self.assertTrue(all(run['updated'] for run in runs))
+
+
+@override_settings(LIVE_POLL_INTERVAL=0.1)
+class LiveConsumerTests(TransactionTestCase):
+    # The WebSocket of the today and gamedetail pages (consumers.LiveConsumer), the database is used by the threads of database_sync_to_async
+
+    def setUp(self):
+        now = timezone.now()
+        UpdateSchedule.objects.create(next_league_update=now.date(), next_fixture_update=now.date(), last_fixture_update=now)
+        game, league, home, away, players = create_game()
+        self.player = players[0]
+        self.fixture = create_fixture(league, home, away, (0, 0), '1H')
+        self.other = create_fixture(league, home, away, (0, 0), '1H')
+        self.tipp = Tipp.objects.create(game=game, player=self.player, fixture=self.fixture, tipp_home=1, tipp_away=0)
+        # every test gets its own hub, the tasks of the hub belong to the event loop of the test
+        patcher = mock.patch.object(consumers, 'hub', consumers.LiveHub())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def communicator(self, user, fixtures):
+        communicator = WebsocketCommunicator(consumers.LiveConsumer.as_asgi(), '/ws/live?fixtures=' + ','.join(str(fixture.id) for fixture in fixtures))
+        communicator.scope['user'] = user
+        return communicator
+
+    def score(self, home_goals):
+        # a goal like an update writes it: goals and status, scoring and the new data version
+        Fixture.objects.filter(id=self.fixture.id).update(home_goals=home_goals, status='Second Half', status_short='2H')
+        UpdateGameScores(fixture_ids=[self.fixture.id])
+        DataChanged()
+
+    def test_anonymous_refused(self):
+        async def run():
+            from django.contrib.auth.models import AnonymousUser
+            communicator = self.communicator(AnonymousUser(), [self.fixture])
+            connected, code = await communicator.connect()
+            self.assertFalse(connected)
+        async_to_sync(run)()
+
+    def test_update_of_other_process(self):
+        # the update of manage.py run_updates does not reach the channel layer of this process, the hub finds it with the data version
+        async def run():
+            communicator = self.communicator(self.player.user, [self.fixture])
+            connected, code = await communicator.connect()
+            self.assertTrue(connected)
+            await database_sync_to_async(self.score)(1)
+            messages = [await communicator.receive_json_from(timeout=2), await communicator.receive_json_from(timeout=2)]
+            self.assertEqual(messages[0]['fixture']['id'], self.fixture.id)
+            self.assertEqual((messages[0]['fixture']['home_goals'], messages[0]['fixture']['status_short']), (1, '2H'))
+            self.assertEqual(messages[1]['tipps'], [{'game_id' : self.tipp.game_id, 'fixture_id' : self.fixture.id, 'score' : 5, 'final' : False}])
+            # nothing is sent again as long as nothing changes, the other fixture is not on the page
+            await database_sync_to_async(DataChanged)()
+            self.assertTrue(await communicator.receive_nothing(timeout=0.5))
+            await communicator.disconnect()
+        async_to_sync(run)()
+
+    def test_publish_in_process(self):
+        # an update of the same process (today/refresh) is pushed through the channel layer, the poll does not send it a second time
+        async def run():
+            communicator = self.communicator(self.player.user, [self.fixture, self.other])
+            connected, code = await communicator.connect()
+            self.assertTrue(connected)
+            def update():
+                self.score(2)
+                return publish_changes([self.fixture.id])
+            self.assertEqual(await database_sync_to_async(update)(), 1)
+            fixture = await communicator.receive_json_from(timeout=2)
+            tipps = await communicator.receive_json_from(timeout=2)
+            self.assertEqual(fixture['fixture']['home_goals'], 2)
+            self.assertEqual(tipps['tipps'][0]['score'], 1) # tipp 1:0, result 2:0
+            # the poll sends the other fixture of the page (not sent yet), but the changes are not sent again
+            await asyncio.sleep(0.5)
+            while not await communicator.receive_nothing(timeout=0.1):
+                message = await communicator.receive_json_from()
+                self.assertEqual(message.get('fixture', {}).get('id'), self.other.id)
+            await communicator.disconnect()
+        async_to_sync(run)()
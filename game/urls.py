@@ -1,6 +1,5 @@
 from django.urls import path
 from . import views
-from django.views.generic import TemplateView
 
 urlpatterns = [ 
     path('', views.LoginView.as_view(), name='login'),
@@ -34,12 +33,18 @@ urlpatterns = [
     path('info/fixture/<int:game_id>/<int:fixture_id>', views.InfoFixtureView.as_view(), name='info_fixture'),
 
     # Tipp
+    path('tipp/bulk', views.TippBulkView.as_view(), name='tipp_bulk'), # all open fixtures of a game (?game=) or a day (?day=)
     path('tipp/<int:game_id>/<int:fixture_id>', views.TippCreateView.as_view(), name='tipp_create'),
     path('tipp/<int:tipp_id>/update', views.TippUpdateView.as_view(), name='tipp_update'),
     path('tipp/<int:tipp_id>/delete', views.TippDeleteView.as_view(), name='tipp_delete'),
 
+    # JSON API (read only)
+    path('api/games/<int:game_id>/fixtures', views.ApiFixturesView.as_view(), name='api_fixtures'),
+    path('api/games/<int:game_id>/fixtures/<int:fixture_id>', views.ApiFixtureDetailView.as_view(), name='api_fixture_detail'),
+    path('api/games/<int:game_id>/ranking', views.ApiRankingView.as_view(), name='api_ranking'),
+
     # Tests
-    path('test_api', TemplateView.as_view(template_name='game/test_api.html'), name='test_api'),
+    path('test_api', views.TestApiView.as_view(), name='test_api'),
     path('test_days', views.TestDay, name='test_days'),
 #    path('profile', views.ProfileView.as_view(), name='profile'),
 ]
\ No newline at end of file
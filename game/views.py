@@ -4,17 +4,23 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.db import IntegrityError
-from django.db.models import Q, F, Count, Sum
+from django.db.models import Q, Count
 from django.utils.timezone import make_aware
-import requests
-from .models import League, Fixture, UpdateSchedule, Player, Player_Games, Game, Tipp
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition, require_POST
+from django.http import JsonResponse, Http404
+from .models import League, Fixture, UpdateSchedule, Player, Player_Games, Game, Tipp, Leaderboard
 from .forms import SignUpForm, GameForm, TippForm, InviteForm, ProfileForm
-from .api_data import scheduled_update, update_fixtures
-from .data_utilities import GetTippList, TippQuery
+from .data_utilities import GetFixtureTipps, SplitStarted, UpdateLeaderboard, DataChanged, GetDataVersion, SaveTipps
+from .fragments import cached_fragment, render_fragment, kickoff_ttl
+from .api_client import quota_status
 from datetime import date, timedelta, datetime
-import pandas as pd
+import hashlib
+import re
 
 # testing 
 class LeagueView(LoginRequiredMixin, View):
@@ -69,8 +75,7 @@ class LoginView(View):
             messages.error(request, 'Incorrect username or password!')
             return render(request, 'game/login.html')
         else:
-            login(request, user)
-            scheduled_update()
+            login(request, user) # the API updates are run by the background runner (manage.py run_updates), not on login
             return redirect('games')
 
 # Logout is very simple 
@@ -103,6 +108,7 @@ class CreateGameView(LoginRequiredMixin, View):
         # The creator of the game set as an active player in the table Player_Games
         activatecreator = Player_Games.objects.all().filter(game = newgame, player=creator)
         activatecreator.update(status=2) # status = 2 means active player
+        DataChanged()
         return redirect('games')
 
 # This is the main view shown after login, showing all games of the active player
@@ -123,6 +129,7 @@ class GameAccept(LoginRequiredMixin, View):
         # Accept invitation to game
         accept = Player_Games.objects.all().filter(player__user__username=request.user, game_id=pk)
         accept.update(status=2)
+        DataChanged() # the fixtures of the game are shown on the today page of the player
 
         return redirect('games')
 
@@ -131,6 +138,7 @@ class GameDecline(LoginRequiredMixin, View):
         # Decline invitation to game
         decline = Player_Games.objects.all().filter(player__user__username=request.user, game_id=pk)
         decline.update(status=4)
+        DataChanged()
 
         return redirect('games')
 
@@ -150,6 +158,7 @@ class InviteView(LoginRequiredMixin, View):
         
         form = InviteForm(request.POST, instance=game)  
         form.save()
+        DataChanged()
 
         return redirect('games')
 
@@ -197,7 +206,6 @@ class GameDetail(LoginRequiredMixin, View):
     def get(self, request, pk):
         # Get info about the game
         game = Game.objects.all().filter(id=pk).get()
-        rankings = Player.objects.all().filter(tipp__game_id = game.id).annotate(t_score = Sum('tipp__score'), t_tipps = Count('tipp__id')).order_by('-t_score')
         li_status = ['FT','AET','PEN', 'ABD', 'AWD']
         finished = Count('fixture', filter=Q(fixture__status_short__in=li_status))
         toplay = Count('fixture', filter=(~Q(fixture__status_short__in=li_status)))
@@ -205,13 +213,24 @@ class GameDetail(LoginRequiredMixin, View):
         td = date.today()
         includedays = 8
         player = Player.objects.all().filter(user__username = request.user).get()
-        fixtures_started = TippQuery(player_id=player.id, game_id=game.id, from_date=td, to_date=datetime.utcnow()) # Match starts are stored in UTC in database, therefore utcnow has to be used.
-        fixtures_tostart = TippQuery(player_id=player.id, game_id=game.id, from_date=datetime.utcnow(), to_date=td+timedelta(days=includedays))
-        fcnt = len(list(fixtures_started)) + len(list(fixtures_tostart))
+
+        # The ranking list and the fixtures table are cached fragments, the queries only run if the data has changed (see fragments.cached_fragment)
+        def render_rankings():
+            rankings = Leaderboard.objects.all().filter(game_id = game.id).select_related('player__user').order_by('rank', 'id') # Standings are maintained by UpdateLeaderboard
+            return render_fragment('game/ranking_summary.html', {'game' : game, 'rankings' : rankings}), None, {}
+
+        def render_fixtures():
+            fixtures = GetFixtureTipps(request, player_id=player.id, game_id=game.id, from_date=td, to_date=td+timedelta(days=includedays)) # one query for the page, split in started / to start
+            fixtures_started, fixtures_tostart = SplitStarted(fixtures)
+            ctx = {'fixtures_started' : fixtures_started, 'fixtures_tostart' : fixtures_tostart, 'days' : includedays-1}
+            return render_fragment('game/fixtures_table.html', ctx), kickoff_ttl(fixture.match_start for fixture in fixtures_tostart), {'fcnt' : len(fixtures)}
+
+        ranking_summary, _ = cached_fragment(request, 'ranking_summary', [game.id], render_rankings)
+        fixtures_table, fixtures_data = cached_fragment(request, 'gamedetail_fixtures', [game.id, player.id, td], render_fixtures)
         lu = UpdateSchedule.objects.all().first()
 
         request.session['redirect_tipp'] = 'gamedetail'
-        ctx = {'game' : game, 'leagues' : leagues, 'rankings' : rankings, 'fcnt' : fcnt, 'lupdate' : lu, 'fixtures_started' : fixtures_started, 'fixtures_tostart' : fixtures_tostart, 'days' : includedays-1 }
+        ctx = {'game' : game, 'leagues' : leagues, 'ranking_summary' : ranking_summary, 'fcnt' : fixtures_data['fcnt'], 'lupdate' : lu, 'fixtures_table' : fixtures_table}
         return render(request, self.template, ctx)
 
 class TodayView(LoginRequiredMixin, View):
@@ -220,19 +239,29 @@ class TodayView(LoginRequiredMixin, View):
         td = date.today()
         includedays = 1
         player = Player.objects.all().filter(user__username = request.user).get()
-        fixtures_started = TippQuery(player_id=player.id, from_date=td, to_date=datetime.utcnow()) # Match starts are stored in UTC in database, therefore utcnow has to be used.
-        fixtures_tostart = TippQuery(player_id=player.id, from_date=datetime.utcnow(), to_date=td+timedelta(days=includedays))
-        fcnt = len(list(fixtures_started)) + len(list(fixtures_tostart))
+
+        def render_fixtures():
+            fixtures = GetFixtureTipps(request, player_id=player.id, from_date=td, to_date=td+timedelta(days=includedays)) # one query for the page, split in started / to start
+            fixtures_started, fixtures_tostart = SplitStarted(fixtures)
+            ctx = {'fixtures_started' : fixtures_started, 'fixtures_tostart' : fixtures_tostart, 'days' : includedays-1}
+            return render_fragment('game/fixtures_table.html', ctx), kickoff_ttl(fixture.match_start for fixture in fixtures_tostart), {'fcnt' : len(fixtures)}
+
+        fixtures_table, fixtures_data = cached_fragment(request, 'today_fixtures', [player.id, td], render_fixtures)
         lu = UpdateSchedule.objects.all().first()
 
-        ctx = {'fixtures_started' : fixtures_started, 'fixtures_tostart' : fixtures_tostart, 'fcnt' : fcnt, 'lupdate' : lu, 'days' : includedays-1}
+        ctx = {'fixtures_table' : fixtures_table, 'fcnt' : fixtures_data['fcnt'], 'lupdate' : lu, 'days' : includedays-1}
         request.session['redirect_tipp'] = 'today'
         return render(request, 'game/today.html', ctx)
 
 class TodayRefreshView(LoginRequiredMixin, View):
     def post(self, request):
-        # Refresh Data on Today page via API
-        update_fixtures(mode='live')
+        # Refresh Data on Today page via API - concurrent and repeated refreshes are coalesced, see refresh_live
+        from .api_data import refresh_live # the ingestion code (pandas, requests) is only loaded when an update runs, not when a worker starts
+        updated, age = refresh_live()
+        if updated:
+            messages.success(request, 'Live scores have been updated.')
+        else:
+            messages.info(request, 'Live scores are from %d seconds ago, an update is already running or has just finished.' % age)
         returnto = request.POST.get('next', '/')
         return redirect(returnto)
 
@@ -265,15 +294,17 @@ class TippCreateView(LoginRequiredMixin, View):
         if fixture.match_start < make_aware(datetime.now()):
             messages.error(request, 'Tipps can not be captured if the match has already started!')
         else:
-            form = TippForm(request.POST)
+            player = Player.objects.all().filter(user__username = request.user).get()
+            # There is only one tipp per player, game and fixture (unique constraint) - an existing tipp is changed instead (e.g. form sent twice)
+            form = TippForm(request.POST, instance=Tipp.objects.all().filter(game_id=game_id, fixture_id=fixture_id, player=player).first())
 
             newtipp = form.save(commit=False)
-            newtipp.player = Player.objects.all().filter(user__username = request.user).get()
+            newtipp.player = player
             newtipp.fixture_id = fixture_id
             newtipp.game_id = game_id
             newtipp.save()
-
-            form.save()
+            UpdateLeaderboard(game_id, [newtipp.player_id]) # the number of tipps has changed
+            DataChanged()
 
         if 'redirect_tipp' in request.session:
             if request.session['redirect_tipp'] == 'today':
@@ -311,6 +342,7 @@ class TippUpdateView(LoginRequiredMixin, View):
         else:
             form = TippForm(request.POST, instance=tipp)
             form.save()
+            DataChanged()
 
         if 'redirect_tipp' in request.session:
             if request.session['redirect_tipp'] == 'today':
@@ -319,6 +351,94 @@ class TippUpdateView(LoginRequiredMixin, View):
     
         return redirect('gamedetail', tipp.game_id)
 
+class TippBulkView(LoginRequiredMixin, View):
+    # View to tipp all open fixtures at once: tipp/bulk?game=<game_id> (the fixtures of a game in the next days, like gamedetail)
+    # or tipp/bulk?day=YYYY-MM-DD (the fixtures of all games of the player on a day, today if no day is given), game and day can be combined
+    # The form is sent once, the tipps are validated and saved together (see SaveTipps), fields left empty are not changed
+    template = 'game/tipp_bulk.html'
+    includedays = 8
+    max_fixtures = 500
+    field = re.compile(r'^tipp_(home|away)_(\d+)_(\d+)$') # tipp_home_<game_id>_<fixture_id>
+
+    def fixtures(self, request, player):
+        # The fixtures of the form (only fixtures which have not started) and the game, if the form is for one game
+        game = None
+        kwargs = {'player_id' : player.id}
+        game_id = request.GET.get('game', '')
+        if game_id:
+            if not game_id.isdigit():
+                raise Http404
+            pg = get_object_or_404(Player_Games.objects.select_related('game'), game_id=game_id, player=player, status_id__lte=2)
+            game = pg.game
+            kwargs['game_id'] = game.id
+        try:
+            day = datetime.strptime(request.GET['day'], '%Y-%m-%d').date() if request.GET.get('day') else None
+        except ValueError:
+            raise Http404
+        if day is not None:
+            kwargs['from_date'], kwargs['before_date'] = day, day + timedelta(days=1)
+        else:
+            day = date.today()
+            kwargs['from_date'], kwargs['to_date'] = day, day + timedelta(days=self.includedays if game else 1)
+        fixtures_started, fixtures_tostart = SplitStarted(GetFixtureTipps(request, **kwargs))
+        return game, day, fixtures_tostart[:self.max_fixtures]
+
+    def render_form(self, request, game, day, fixtures, posted=None, invalid=()):
+        # posted: the values sent with the form, shown again if the form has errors
+        for fixture in fixtures:
+            key = (fixture.game_id, fixture.id)
+            if posted is not None and key in posted:
+                fixture.form_home, fixture.form_away = posted[key]
+            else:
+                fixture.form_home, fixture.form_away = fixture.tipp_home, fixture.tipp_away
+            fixture.form_invalid = key in invalid
+        ctx = {'game' : game, 'day' : day, 'fixtures' : fixtures, 'days' : 0 if game is None else 1}
+        return render(request, self.template, ctx)
+
+    def get(self, request):
+        player = Player.objects.all().filter(user__username = request.user).get()
+        game, day, fixtures = self.fixtures(request, player)
+        return self.render_form(request, game, day, fixtures)
+
+    def post(self, request):
+        player = Player.objects.all().filter(user__username = request.user).get()
+
+        posted = dict() # (game_id, fixture_id) : [tipp_home, tipp_away] as sent
+        for name, value in request.POST.items():
+            match = self.field.match(name)
+            if match:
+                values = posted.setdefault((int(match.group(2)), int(match.group(3))), ['', ''])
+                values[0 if match.group(1) == 'home' else 1] = value.strip()
+
+        tipps = dict()
+        invalid = list()
+        for key, (tipp_home, tipp_away) in posted.items():
+            if tipp_home == '' and tipp_away == '':
+                continue
+            if tipp_home.isdigit() and tipp_away.isdigit():
+                tipps[key] = (int(tipp_home), int(tipp_away))
+            else:
+                invalid.append(key)
+
+        if invalid or len(tipps) > self.max_fixtures:
+            # nothing is saved, the form is shown again with the values sent
+            messages.error(request, 'Please enter both goals as numbers of 0 or more for the marked fixtures.' if invalid else 'Too many tipps in one form.')
+            game, day, fixtures = self.fixtures(request, player)
+            return self.render_form(request, game, day, fixtures, posted, invalid)
+
+        result = SaveTipps(player.id, tipps)
+        if result['saved']:
+            DataChanged()
+        messages.success(request, '%d tipps saved.' % result['saved'] if result['saved'] else 'No tipps changed.')
+        if result['started']:
+            messages.error(request, '%d tipps were not saved, the match has already started!' % len(result['started']))
+        if result['unknown']:
+            messages.error(request, '%d tipps were not saved, the fixtures are not part of your games.' % len(result['unknown']))
+
+        if request.GET.get('game', '').isdigit():
+            return redirect('gamedetail', int(request.GET['game']))
+        return redirect('today')
+
 # View to delete Tipps
 class TippDeleteView(LoginRequiredMixin, View):
     def post(self, request, tipp_id):
@@ -326,6 +446,8 @@ class TippDeleteView(LoginRequiredMixin, View):
         tipp = get_object_or_404(Tipp, pk=tipp_id, player=player.id)
 
         tipp.delete()
+        UpdateLeaderboard(tipp.game_id, [player.id])
+        DataChanged()
 
         if 'redirect_tipp' in request.session:
             if request.session['redirect_tipp'] == 'today':
@@ -342,27 +464,240 @@ class RankingView(LoginRequiredMixin, View):
     def get(self, request, pk):
         player = Player.objects.all().filter(user__username = request.user).get()
         game = Game.objects.all().filter(id=pk).get()
-        rankings = Tipp.objects.all().filter(game_id = game.id).values('player_id', 'player__user__username').annotate(t_score = Sum('score'), t_total = Count('id'), 
-            t_exact = Count('id', filter=Q(score = F('game__pts_exact'))), t_difference = Count('id', filter=Q(score = F('game__pts_difference'))),
-            t_winner = Count('id', filter=Q(score = F('game__pts_winner'))), t_wrong = Count('id', filter=Q(score = F('game__pts_wrong')))).order_by('-t_score')
-        tipps = Tipp.objects.all().filter(player=player)
-        ctx = {'game' : game, 'rankings' : rankings}   
+
+        def render_rankings():
+            rankings = Leaderboard.objects.all().filter(game_id = game.id).select_related('player__user').order_by('rank', 'id') # Standings are maintained by UpdateLeaderboard
+            return render_fragment('game/ranking_table.html', {'game' : game, 'rankings' : rankings}), None, {}
+
+        ranking_table, _ = cached_fragment(request, 'ranking_table', [game.id], render_rankings)
+        ctx = {'game' : game, 'ranking_table' : ranking_table}
         return render(request, self.template, ctx)
 
 class RankingDetailView(LoginRequiredMixin, View):
     template = 'game/ranking_detail.html'
+    paginate_by = 50
     def get(self, request, game_id, player_id):
         player = Player.objects.all().filter(pk=player_id).get()
         game = Game.objects.all().filter(id=game_id).get()
-        results = TippQuery(player_id=player_id, game_id=game_id, to_date=datetime.utcnow(), order='DESC') 
-        ctx = {'game' : game, 'results' : results, 'player' : player}
+        # Keyset pagination: ?after=<fixture id> continues with the fixtures before the last fixture of the previous page
+        after = request.GET.get('after')
+        after = int(after) if after and after.isdigit() else None
+
+        def render_results():
+            results = GetFixtureTipps(request, player_id=player_id, game_id=game_id, to_date=datetime.utcnow(), order='DESC', limit=self.paginate_by+1, after=after) # Match starts are stored in UTC in database, therefore utcnow has to be used.
+            next_after = None
+            if len(results) > self.paginate_by:
+                results = results[:self.paginate_by]
+                next_after = results[-1].id
+            # the list grows with the next kickoff of the game
+            next_kickoff = Fixture.objects.all().filter(league__games=game_id, match_start__gt=make_aware(datetime.now())).order_by('match_start').values_list('match_start', flat=True)[:1]
+            return render_fragment('game/ranking_detail_results.html', {'game' : game, 'results' : results}), kickoff_ttl(next_kickoff), {'next_after' : next_after}
+
+        ranking_detail_results, results_data = cached_fragment(request, 'ranking_detail_results', [game_id, player_id, after], render_results)
+        ctx = {'game' : game, 'ranking_detail_results' : ranking_detail_results, 'player' : player, 'next_after' : results_data['next_after'], 'first_page' : after is None}
         return render(request, self.template, ctx)
 
+# JSON API (read only) for mobile clients and dashboards: fixtures with tipps and rankings of a game, details of a fixture
+# - keyset pagination: ?after=<id of the last item of the previous page>&limit=<n>, the response contains the url of the next page
+# - sparse fields: ?fields=id,home_goals,away_goals returns only these fields of each item
+# - conditional GET: ETag and Last-Modified change with every update from the API and every change of tipps (data version),
+#   a request with If-None-Match / If-Modified-Since is answered with 304 after the checks of its parameters (get_query of the views) and one query,
+#   without running the query of the endpoint (get_data) - errors are answered without ETag and Last-Modified
+
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
+API_FIXTURE_FIELDS = ['id', 'game_id', 'game', 'league', 'league_logo', 'match_start', 'status', 'status_short', 'home_team', 'home_logo', 'away_team', 'away_logo',
+    'home_goals', 'away_goals', 'home_odds', 'draw_odds', 'away_odds', 'tipp_id', 'tipp_home', 'tipp_away', 'score', 'final']
+API_RANKING_FIELDS = ['id', 'player_id', 'player', 'rank', 'score', 'tipps', 'exact', 'difference', 'winner', 'wrong']
+API_TIPP_FIELDS = ['id', 'player_id', 'player', 'tipp_home', 'tipp_away', 'score', 'final']
+
+
+class ApiError(Exception):
+    # Returned to the client as {'error' : message} with the status code
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def api_etag(request, *args, **kwargs):
+    # The responses depend on the data (version, see DataChanged), the user (own tipps) and the url (parameters)
+    version, last_update = GetDataVersion(request)
+    key = '%s|%s|%s' % (version, request.user.pk, request.get_full_path())
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def api_last_modified(request, *args, **kwargs):
+    version, last_update = GetDataVersion(request)
+    return last_update
+
+
+def api_fields(request, available):
+    # Fields selected with ?fields=, all fields by default
+    fields = request.GET.get('fields')
+    if not fields:
+        return available
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise ApiError('Unknown fields: %s, available fields are: %s' % (', '.join(unknown), ', '.join(available)))
+    return fields
+
+
+def api_int(request, name, default=None, maximum=None):
+    value = request.GET.get(name)
+    if value is None or value == '':
+        return default
+    if not value.isdigit():
+        raise ApiError('%s must be a positive integer' % name)
+    value = int(value)
+    return min(value, maximum) if maximum is not None else value
+
+
+def api_date(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ApiError('%s must be a date (YYYY-MM-DD)' % name)
+
+
+def api_page(request, items, limit, fields):
+    # Response of a list endpoint: items holds up to limit + 1 rows (as dicts), the additional row shows that there is a next page
+    next_url = None
+    if len(items) > limit:
+        items = items[:limit]
+        params = request.GET.copy()
+        params['after'] = items[-1]['id']
+        next_url = request.build_absolute_uri(request.path + '?' + params.urlencode())
+    return {'results' : [{field : item[field] for field in fields} for item in items], 'next' : next_url}
+
+
+def api_player_in_game(request, game_id):
+    # The player of the request, if the player is the creator of the game or active in the game
+    player = Player.objects.all().filter(user=request.user).first()
+    if player is None or not Player_Games.objects.all().filter(game_id=game_id, player=player, status_id__lte=2).exists():
+        raise ApiError('Game not found', status=404)
+    return player
+
+
+def fixture_item(fixture):
+    # A row of GetFixtureTipps as dict of API_FIXTURE_FIELDS
+    return {'id' : fixture.id, 'game_id' : fixture.game_id, 'game' : fixture.g_name, 'league' : fixture.l_name, 'league_logo' : fixture.l_logo,
+        'match_start' : fixture.match_start, 'status' : fixture.status, 'status_short' : fixture.status_short,
+        'home_team' : fixture.ht_name, 'home_logo' : fixture.ht_logo, 'away_team' : fixture.at_name, 'away_logo' : fixture.at_logo,
+        'home_goals' : fixture.home_goals, 'away_goals' : fixture.away_goals, 'home_odds' : fixture.home_odds, 'draw_odds' : fixture.draw_odds, 'away_odds' : fixture.away_odds,
+        'tipp_id' : fixture.tipp_id, 'tipp_home' : fixture.tipp_home, 'tipp_away' : fixture.tipp_away, 'score' : fixture.score,
+        'final' : None if fixture.tipp_id is None else bool(fixture.yn_final)}
+
+
+class ApiView(LoginRequiredMixin, View):
+    # Base view of the JSON API: login required (session), conditional GET, errors as JSON
+
+    def handle_no_permission(self):
+        # no redirect to the login page
+        return JsonResponse({'error' : 'Authentication required'}, status=401)
+
+    def get(self, request, *args, **kwargs):
+        # The parameters are checked before the conditional GET, a bad request is answered with the error (and without ETag) even if the client has a matching ETag
+        try:
+            query = self.get_query(request, *args, **kwargs)
+            response = self.get_conditional(request, query)
+        except ApiError as e:
+            response = JsonResponse({'error' : str(e)}, status=e.status)
+        patch_cache_control(response, private=True, no_cache=True) # clients keep the response, but revalidate it with every request
+        return response
+
+    @method_decorator(condition(etag_func=api_etag, last_modified_func=api_last_modified))
+    def get_conditional(self, request, query):
+        return JsonResponse(self.get_data(request, query))
+
+
+class ApiFixturesView(ApiView):
+    # api/games/<game_id>/fixtures?from=YYYY-MM-DD&to=YYYY-MM-DD - the fixtures of a game with the tipps of the player (like gamedetail)
+    def get_query(self, request, game_id):
+        player = api_player_in_game(request, game_id)
+        fields = api_fields(request, API_FIXTURE_FIELDS)
+        limit = api_int(request, 'limit', API_PAGE_SIZE, API_MAX_PAGE_SIZE)
+        after = api_int(request, 'after')
+        if after is not None and not Fixture.objects.all().filter(id=after, league__games=game_id).exists():
+            raise ApiError('after must be the id of a fixture of the game (next of the previous page)')
+        kwargs = {'player_id' : player.id, 'game_id' : game_id, 'limit' : limit + 1, 'after' : after}
+        from_date, to_date = api_date(request, 'from'), api_date(request, 'to')
+        if from_date is not None:
+            kwargs['from_date'] = from_date
+        if to_date is not None:
+            kwargs['before_date'] = to_date + timedelta(days=1) # all fixtures of this day, but not the ones at midnight of the next day
+        return {'fields' : fields, 'limit' : limit, 'kwargs' : kwargs}
+
+    def get_data(self, request, query):
+        fixtures = GetFixtureTipps(request, **query['kwargs'])
+        return api_page(request, [fixture_item(fixture) for fixture in fixtures], query['limit'], query['fields'])
+
+
+class ApiRankingView(ApiView):
+    # api/games/<game_id>/ranking - the standings of a game in the order of the ranking
+    def get_query(self, request, game_id):
+        api_player_in_game(request, game_id)
+        fields = api_fields(request, API_RANKING_FIELDS)
+        limit = api_int(request, 'limit', API_PAGE_SIZE, API_MAX_PAGE_SIZE)
+        rankings = Leaderboard.objects.all().filter(game_id=game_id).order_by('rank', 'id')
+        after = api_int(request, 'after')
+        if after is not None:
+            # keyset pagination on (rank, id), the same order as the ranking page
+            last = Leaderboard.objects.all().filter(game_id=game_id, id=after).values_list('rank', flat=True).first()
+            if last is None:
+                raise ApiError('after must be the id of a ranking of the game (next of the previous page)')
+            rankings = rankings.filter(Q(rank__gt=last) | Q(rank=last, id__gt=after))
+        return {'fields' : fields, 'limit' : limit, 'rankings' : rankings}
+
+    def get_data(self, request, query):
+        items = [{'id' : row.id, 'player_id' : row.player_id, 'player' : row.player.user.username, 'rank' : row.rank, 'score' : row.score, 'tipps' : row.tipps,
+            'exact' : row.exact, 'difference' : row.difference, 'winner' : row.winner, 'wrong' : row.wrong} for row in query['rankings'].select_related('player__user')[:query['limit'] + 1]]
+        return api_page(request, items, query['limit'], query['fields'])
+
+
+class ApiFixtureDetailView(ApiView):
+    # api/games/<game_id>/fixtures/<fixture_id> - a fixture of a game with the tipps of all players of the game (like info_fixture)
+    def get_query(self, request, game_id, fixture_id):
+        player = api_player_in_game(request, game_id)
+        fields = api_fields(request, API_FIXTURE_FIELDS + ['tipps'])
+        fixture = Fixture.objects.all().filter(id=fixture_id, league__games=game_id).select_related('league', 'home_team', 'away_team').first()
+        if fixture is None:
+            raise ApiError('Fixture not found', status=404)
+        return {'fields' : fields, 'player' : player, 'game_id' : game_id, 'fixture' : fixture}
+
+    def get_data(self, request, query):
+        fixture, game_id = query['fixture'], query['game_id']
+        tipps = list(Tipp.objects.all().filter(game_id=game_id, fixture_id=fixture.id).select_related('player__user').order_by('id'))
+        mytipp = next((tipp for tipp in tipps if tipp.player_id == query['player'].id), None)
+        item = {'id' : fixture.id, 'game_id' : game_id, 'game' : Game.objects.all().filter(id=game_id).values_list('name', flat=True).first(),
+            'league' : fixture.league.name, 'league_logo' : fixture.league.logo, 'match_start' : fixture.match_start, 'status' : fixture.status, 'status_short' : fixture.status_short,
+            'home_team' : fixture.home_team.name, 'home_logo' : fixture.home_team.logo, 'away_team' : fixture.away_team.name, 'away_logo' : fixture.away_team.logo,
+            'home_goals' : fixture.home_goals, 'away_goals' : fixture.away_goals, 'home_odds' : fixture.home_odds, 'draw_odds' : fixture.draw_odds, 'away_odds' : fixture.away_odds,
+            'tipp_id' : mytipp.id if mytipp else None, 'tipp_home' : mytipp.tipp_home if mytipp else None, 'tipp_away' : mytipp.tipp_away if mytipp else None,
+            'score' : mytipp.score if mytipp else None, 'final' : mytipp.yn_final if mytipp else None,
+            'tipps' : [{'id' : tipp.id, 'player_id' : tipp.player_id, 'player' : tipp.player.user.username, 'tipp_home' : tipp.tipp_home, 'tipp_away' : tipp.tipp_away,
+                'score' : tipp.score, 'final' : tipp.yn_final} for tipp in tipps]}
+        return {field : item[field] for field in query['fields']}
+
 # Test Functions
 
-# API Call in mode days
+@method_decorator(staff_member_required, name='dispatch')
+class TestApiView(View):
+    # Test buttons and the quota of the API (see api_client.take_tokens), only for staff users
+    def get(self, request):
+        return render(request, 'game/test_api.html', {'quota' : quota_status()})
+
+# API Call in mode days, with the lock of the updates (it never runs at the same time as manage.py run_updates)
+@staff_member_required
+@require_POST
 def TestDay(request):
-    if request.method == 'POST':
-        update_fixtures(mode='days')
+    from .api_data import run_update
+    if run_update('days'):
         messages.success(request, 'Daily update of API Data completed')
-        return redirect('test_api')
+    else:
+        messages.info(request, 'Another update is running, try again later')
+    return redirect('test_api')